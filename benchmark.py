@@ -0,0 +1,247 @@
+"""Benchmark de ponta a ponta com o Domínio simulado e serviços HTTP locais.
+
+Executa ``script.py``, ``consulta_societaria.py``, ``pipeline.py`` ou as três
+fases de ``phases.py`` contra o :class:`~simulator.SimulatedDominio` e o
+:class:`~simulator.FakeServices` (ReceitaWS, BrasilAPI e 2Captcha), com todos
+os tempos multiplicados por ``--escala``, e informa a vazão equivalente em
+empresas por hora. Sai com código 1 se a cota simulada de um provedor de CNPJ
+for excedida ou se a vazão ficar abaixo do mínimo.
+
+Exemplo::
+
+    python benchmark.py --empresas 50 --escala 0.01 --min-empresas-hora 40
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from functools import partial
+
+from rate_limit import TokenBucket
+from simulator import (
+    FakeServices,
+    SimulatedDominio,
+    SimulatedDriver,
+    generate_portfolio,
+    parse_failure_rates,
+    write_open_data_dump,
+)
+
+
+def _scale_captcha(scale: float, runner) -> None:
+    """Aplica a escala de tempo às consultas do 2Captcha."""
+    solver = runner.captcha_solver
+    solver.first_poll *= scale
+    solver.min_poll *= scale
+    solver.max_poll *= scale
+    solver.timeout *= scale
+    solver.breaker.reset_timeout *= scale
+    runner.captcha_recapture_interval *= scale
+
+
+def _make_driver(args, portfolio) -> SimulatedDriver:
+    return SimulatedDriver(
+        SimulatedDominio(
+            portfolio,
+            failure_rates=parse_failure_rates(args.falha or []),
+            time_scale=args.escala,
+        )
+    )
+
+
+def _scale_breakers(scale: float, runner) -> None:
+    """Escala a pausa dos disjuntores dos provedores de CNPJ e a espera das novas tentativas."""
+    for provider in runner.lookup_worker.providers:
+        provider.breaker.reset_timeout *= scale
+    if hasattr(runner, "retries"):
+        policies = runner.retries.policies
+        for kind, (attempts, delay) in policies.items():
+            policies[kind] = (attempts, delay * scale)
+
+
+def _scale_lookup(scale: float, runner) -> None:
+    """Aplica a escala de tempo aos limitadores e disjuntores dos provedores de CNPJ."""
+    for provider in runner.lookup_worker.providers:
+        provider.limiter = TokenBucket(provider.limiter.rate, per=provider.limiter.per * scale)
+    _scale_breakers(scale, runner)
+
+
+def _scale_session(scale: float, runner) -> None:
+    """Escala de tempo de uma sessão do orquestrador (os limitadores são compartilhados)."""
+    _scale_captcha(scale, runner)
+    _scale_breakers(scale, runner)
+
+
+class _PhasedRun:
+    """Executa colheita, resolução e aplicação em sequência, como um só runner."""
+
+    def __init__(self, args, portfolio) -> None:
+        self.args = args
+        self.portfolio = portfolio
+        self.journal = None
+
+    def run(self) -> None:
+        from phases import ApplyPhase, HarvestPhase, ResolvePhase
+
+        HarvestPhase(driver=_make_driver(self.args, self.portfolio)).run()
+        resolver = ResolvePhase()
+        _scale_lookup(self.args.escala, resolver)
+        resolver.run()
+        apply = ApplyPhase(driver=_make_driver(self.args, self.portfolio))
+        _scale_captcha(self.args.escala, apply)
+        _scale_lookup(self.args.escala, apply)
+        apply.run()
+        self.journal = apply.journal
+
+
+def _make_runner(args, portfolio, differential: bool = False):
+    if args.modo == "fases":
+        return _PhasedRun(args, portfolio)
+    driver = _make_driver(args, portfolio)
+    if args.modo == "atualizacao" and args.sessoes > 1:
+        from orchestrator import SessionOrchestrator
+
+        return SessionOrchestrator(
+            args.sessoes,
+            time_scale=args.escala,
+            setup=partial(_scale_session, args.escala),
+            differential=differential,
+        )
+    if args.modo == "atualizacao":
+        from script import DominioAutomation
+
+        runner = DominioAutomation(driver=driver, differential=differential)
+        _scale_captcha(args.escala, runner)
+    elif args.modo == "completo":
+        from pipeline import DominioPipeline
+
+        runner = DominioPipeline(driver=driver, differential=differential)
+        _scale_captcha(args.escala, runner)
+    else:
+        from consulta_societaria import DominioConsultaSocietaria
+
+        runner = DominioConsultaSocietaria(driver=driver)
+    _scale_lookup(args.escala, runner)
+    return runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--modo", choices=("atualizacao", "consulta", "completo", "fases"), default="atualizacao"
+    )
+    parser.add_argument("--empresas", type=int, default=20)
+    parser.add_argument(
+        "--escala", type=float, default=0.01, help="fator aplicado a todas as latências"
+    )
+    parser.add_argument(
+        "--falha",
+        action="append",
+        metavar="ACAO=TAXA",
+        help="taxa de falha de uma ação do simulador (ex.: importar=0.05)",
+    )
+    parser.add_argument(
+        "--sessoes",
+        type=int,
+        default=1,
+        help="sessões paralelas do Domínio (somente no modo atualizacao)",
+    )
+    parser.add_argument(
+        "--dados-abertos",
+        action="store_true",
+        help="responde o quadro societário por um índice sintético dos Dados Abertos",
+    )
+    parser.add_argument(
+        "--diferencial",
+        action="store_true",
+        help="faz uma execução completa e mede a seguinte no modo diferencial",
+    )
+    parser.add_argument(
+        "--alteradas",
+        type=float,
+        default=0.1,
+        help="fração das empresas com cadastro alterado entre as execuções (--diferencial)",
+    )
+    parser.add_argument(
+        "--provedores",
+        default="receitaws",
+        help="provedores de CNPJ simulados, em ordem de preferência (receitaws,brasilapi)",
+    )
+    parser.add_argument(
+        "--fora",
+        action="append",
+        choices=("receita", "brasilapi", "captcha"),
+        default=[],
+        help="serviço simulado fora do ar durante toda a execução",
+    )
+    parser.add_argument("--min-empresas-hora", type=float, default=0.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_dominio_")
+    os.chdir(workdir)
+
+    portfolio = generate_portfolio(args.empresas)
+    services = FakeServices(portfolio, time_scale=args.escala).start()
+    services.outages.update(args.fora)
+    os.environ.update(
+        {
+            "RECEITAWS_URL": services.base_url + "/v1/cnpj/{cnpj}",
+            "BRASILAPI_URL": services.base_url + "/api/cnpj/v1/{cnpj}",
+            "CNPJ_PROVEDORES": args.provedores,
+            "CAPTCHA_API_URL": services.base_url,
+            "CNPJ_CACHE": "false",
+            "TEST_MODE": "false",
+            "MANUAL_LOGIN": "false",
+            # usados pelas sessões do orquestrador, que criam o próprio driver
+            "DOMINIO_DRIVER": "simulado",
+            "SIMULADOR_EMPRESAS": str(args.empresas),
+            "SIMULADOR_ESCALA": str(args.escala),
+            "SIMULADOR_FALHAS": ",".join(args.falha or []),
+            "OPEN_DATA_DIR": "",
+        }
+    )
+    if args.dados_abertos:
+        from open_data import import_dump
+
+        import_dump(write_open_data_dump(portfolio, "dump"), "dados_abertos")
+        os.environ["OPEN_DATA_DIR"] = "dados_abertos"
+    if args.diferencial:
+        # primeira execução completa, que grava os hashes dos cadastros
+        _make_runner(args, portfolio).run()
+        changed = random.Random(1).sample(portfolio, round(len(portfolio) * args.alteradas))
+        for entry in changed:
+            entry["socios"].append(f"NOVO SOCIO {entry['nome']}")
+    runner = _make_runner(args, portfolio, differential=args.diferencial)
+
+    start = time.monotonic()
+    runner.run()
+    elapsed = (time.monotonic() - start) / args.escala
+    services.stop()
+
+    statuses = Counter(entry["status"] for entry in runner.journal.iter_results())
+    throughput = args.empresas / elapsed * 3600 if elapsed else 0.0
+
+    print(f"Diretório de trabalho: {workdir}")
+    print(f"Empresas: {args.empresas}  tempo equivalente: {elapsed / 60:.1f} min")
+    print(f"Vazão: {throughput:.1f} empresas/hora")
+    for status, count in statuses.most_common():
+        print(f"  {status}: {count}")
+    print(f"Chamadas: {services.counters}")
+
+    failed = False
+    for name in services.quotas:
+        if services.counters[f"{name}_429"]:
+            print(f"ERRO: cota simulada de {name} excedida")
+            failed = True
+    if throughput < args.min_empresas_hora:
+        print(f"ERRO: vazão abaixo do mínimo de {args.min_empresas_hora:.1f} empresas/hora")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
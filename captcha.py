@@ -0,0 +1,294 @@
+import base64
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limit import CircuitBreaker
+from tracing import Tracer
+from waits import percentile
+
+# API do 2Captcha (pode apontar para um servidor de testes)
+CAPTCHA_API_URL = "http://2captcha.com"
+
+# respostas de in.php que indicam falta de capacidade momentânea
+_RETRYABLE_SUBMIT_ERRORS = ("ERROR_NO_SLOT_AVAILABLE",)
+
+
+class CaptchaError(RuntimeError):
+    """Captcha não resolvido pelo serviço."""
+
+
+class CaptchaPaused(CaptchaError):
+    """O disjuntor do 2Captcha está aberto após falhas seguidas."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"2Captcha pausado por {retry_after:.0f}s após falhas seguidas")
+        self.retry_after = retry_after
+
+
+class CaptchaCancelled(CaptchaError):
+    """Consulta abandonada porque outra cópia do mesmo captcha já foi resolvida."""
+
+
+class CaptchaAnswer(NamedTuple):
+    captcha_id: str
+    text: str
+    elapsed: float
+
+
+class CaptchaSolver:
+    """Cliente do 2Captcha com conexões reaproveitadas e consulta adaptativa.
+
+    O envio é assíncrono (:meth:`submit` devolve um ``Future``), então a
+    imagem pode ser entregue ao serviço assim que aparece na tela. As
+    consultas a ``res.php`` seguem os percentis dos tempos de resolução já
+    observados: a primeira acontece cedo e as seguintes se concentram onde as
+    respostas costumam chegar, com backoff depois disso.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = CAPTCHA_API_URL,
+        max_attempts: int = 3,
+        parallel_resubmits: int = 2,
+        first_poll: float = 5.0,
+        min_poll: float = 1.0,
+        max_poll: float = 10.0,
+        timeout: float = 150.0,
+        slots=None,
+        breaker: Optional[CircuitBreaker] = None,
+        session: Optional[requests.Session] = None,
+        tracer: Optional[Tracer] = None,
+        logger: Optional[logging.Logger] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_attempts = max_attempts
+        self.parallel_resubmits = parallel_resubmits
+        self.first_poll = first_poll
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.timeout = timeout
+        # semáforo opcional que limita os captchas em andamento (entre processos)
+        self.slots = slots
+        # pausa o envio após falhas seguidas, em vez de esperar o tempo
+        # esgotado de cada empresa enquanto o serviço está fora do ar
+        self.breaker = breaker or CircuitBreaker(failure_threshold=3, reset_timeout=300.0)
+        self.tracer = tracer or Tracer()
+        self.logger = logger or logging.getLogger(__name__)
+        self._sleep = sleep
+        self.session = session or self._new_session()
+        self.solve_times: deque = deque(maxlen=100)
+        # chamadas ao 2Captcha por tipo (envio, consulta, reportbad)
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="captcha")
+
+    @classmethod
+    def from_env(
+        cls, tracer: Optional[Tracer] = None, logger: Optional[logging.Logger] = None
+    ) -> "CaptchaSolver":
+        return cls(
+            api_key=os.getenv("CAPTCHA_2CAPTCHA_KEY", ""),
+            base_url=os.getenv("CAPTCHA_API_URL", CAPTCHA_API_URL),
+            max_attempts=int(os.getenv("CAPTCHA_TENTATIVAS", "3")),
+            parallel_resubmits=int(os.getenv("CAPTCHA_REENVIOS_PARALELOS", "2")),
+            breaker=CircuitBreaker(
+                int(os.getenv("CAPTCHA_FALHAS_PARA_PAUSAR", "3")),
+                float(os.getenv("CAPTCHA_PAUSA", "300")),
+            ),
+            tracer=tracer,
+            logger=logger,
+        )
+
+    @staticmethod
+    def _new_session() -> requests.Session:
+        session = requests.Session()
+        # só as consultas (GET res.php) são repetidas automaticamente: um envio
+        # (POST in.php) pode ter sido aceito e cobrado antes da falha
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # ------------------------------------------------------------------
+    # Agenda de consultas
+    # ------------------------------------------------------------------
+    def poll_schedule(self) -> List[float]:
+        """Instantes (segundos após o envio) das consultas guiadas pelo histórico."""
+        with self._lock:
+            history = list(self.solve_times)
+        if not history:
+            return [self.first_poll]
+        checkpoints = [percentile(history, q) for q in (10, 25, 50, 75, 90)]
+        first = max(self.min_poll, min(self.first_poll, checkpoints[0]))
+        schedule = [first]
+        for point in checkpoints[1:]:
+            if point - schedule[-1] >= self.min_poll:
+                schedule.append(point)
+        return schedule
+
+    def _wait_answer(
+        self, captcha_id: str, started: float, cancel: threading.Event
+    ) -> CaptchaAnswer:
+        schedule = self.poll_schedule()
+        interval = self.min_poll
+        while True:
+            elapsed = time.monotonic() - started
+            if schedule:
+                delay = schedule.pop(0) - elapsed
+            else:
+                delay = interval
+                interval = min(interval * 1.5, self.max_poll)
+            if elapsed + max(delay, 0) > self.timeout:
+                raise CaptchaError(f"Tempo esgotado ({self.timeout:g}s) aguardando o captcha")
+            # a espera termina antes se outra cópia do captcha for resolvida
+            if cancel.wait(max(delay, 0)):
+                raise CaptchaCancelled(f"Captcha {captcha_id} abandonado")
+            self._count("consulta")
+            check = self.session.get(
+                f"{self.base_url}/res.php",
+                params={"key": self.api_key, "action": "get", "id": captcha_id, "json": 1},
+                timeout=30,
+            ).json()
+            if check.get("status") == 1:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self.solve_times.append(elapsed)
+                return CaptchaAnswer(captcha_id, check["request"], elapsed)
+            if check.get("request") != "CAPCHA_NOT_READY":
+                raise CaptchaError(f"2Captcha: {check.get('request')}")
+
+    # ------------------------------------------------------------------
+    # Envio e resolução
+    # ------------------------------------------------------------------
+    def _count(self, call: str) -> None:
+        with self._lock:
+            self.calls[call] += 1
+
+    def _solve_one(
+        self, image: bytes, empresa: Optional[str], cancel: threading.Event
+    ) -> CaptchaAnswer:
+        with self.slots or nullcontext():
+            if cancel.is_set():
+                raise CaptchaCancelled("Captcha abandonado antes do envio")
+            return self._submit_and_wait(image, empresa, cancel)
+
+    def _post_image(self, data: dict, empresa: Optional[str]) -> dict:
+        """Envia a imagem a ``in.php`` uma única vez.
+
+        Falhas de rede e erros HTTP não são repetidos aqui nem pelo adaptador:
+        o 2Captcha pode ter recebido (e cobrado) a imagem antes da falha. A
+        empresa segue para a fila de novas tentativas (``retry_queue.py``).
+        """
+        self._count("envio")
+        try:
+            with self.tracer.span("captcha_envio", empresa):
+                response = self.session.post(f"{self.base_url}/in.php", data=data, timeout=30)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise CaptchaError(f"Falha no envio ao 2Captcha: {exc}") from exc
+
+    def _submit_and_wait(
+        self, image: bytes, empresa: Optional[str], cancel: threading.Event
+    ) -> CaptchaAnswer:
+        data = {
+            "key": self.api_key,
+            "method": "base64",
+            "body": base64.b64encode(image).decode("ascii"),
+            "json": 1,
+        }
+        for attempt in range(self.max_attempts):
+            # ERROR_NO_SLOT_AVAILABLE é recusado sem cobrança e pode ser repetido
+            result = self._post_image(data, empresa)
+            if result.get("status") == 1:
+                break
+            if result.get("request") not in _RETRYABLE_SUBMIT_ERRORS:
+                raise CaptchaError(f"2Captcha: {result.get('request')}")
+            self._sleep(self.first_poll)
+        else:
+            raise CaptchaError("2Captcha sem capacidade disponível")
+        started = time.monotonic()
+        with self.tracer.span("captcha_espera", empresa):
+            return self._wait_answer(result["request"], started, cancel)
+
+    def submit(
+        self,
+        image: bytes,
+        empresa: Optional[str] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Future:
+        """Envia a imagem em segundo plano; o futuro resulta em :class:`CaptchaAnswer`.
+
+        Com ``cancel`` sinalizado a consulta é abandonada na próxima espera.
+        """
+        return self._executor.submit(self._solve_one, image, empresa, cancel or threading.Event())
+
+    def solve(
+        self, image: bytes, copies: int = 1, empresa: Optional[str] = None
+    ) -> CaptchaAnswer:
+        """Resolve a imagem; com ``copies > 1`` envia em paralelo e usa a primeira resposta.
+
+        As cópias restantes são canceladas assim que uma resposta chega: as que
+        não começaram não são enviadas, e as que aguardam param de consultar e
+        liberam o executor e o semáforo. Elas não são reportadas com
+        ``reportbad``, pois a resposta delas não foi recusada.
+
+        Com o disjuntor aberto levanta :class:`CaptchaPaused` sem enviar nada.
+        """
+        pause = self.breaker.retry_after()
+        if pause > 0:
+            raise CaptchaPaused(pause)
+        self.breaker.begin()
+        cancel = threading.Event()
+        pending = {self.submit(image, empresa, cancel) for _ in range(max(1, copies))}
+        error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    answer = future.result()
+                except Exception as exc:
+                    error = exc
+                    continue
+                self.breaker.record_success()
+                cancel.set()
+                for loser in pending:
+                    loser.cancel()
+                return answer
+        self.breaker.record_failure()
+        raise CaptchaError(str(error))
+
+    def report_bad(self, answer: CaptchaAnswer) -> None:
+        """Informa ao 2Captcha que a resposta foi recusada pelo Domínio."""
+        self._count("reportbad")
+        try:
+            self.session.get(
+                f"{self.base_url}/res.php",
+                params={"key": self.api_key, "action": "reportbad", "id": answer.captcha_id, "json": 1},
+                timeout=30,
+            )
+        except requests.RequestException as exc:
+            self.logger.warning("Falha ao reportar captcha %s: %s", answer.captcha_id, exc)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,96 @@
+"""Preparo das imagens de captcha antes do envio ao 2Captcha.
+
+A captura é recortada rente ao conteúdo, convertida para tons de cinza e
+codificada como PNG otimizado, tudo em memória. O :class:`CaptureGuard`
+descarta, antes de pagar pelo envio, capturas em branco (imagem ainda não
+carregada) e repetidas (captcha ainda não renovado após uma recusa),
+comparando um hash perceptual (dHash) das imagens.
+"""
+
+import io
+import os
+from collections import deque
+from typing import Optional, Union
+
+from PIL import Image, ImageChops, ImageStat
+
+# diferença mínima de tom para um pixel contar como conteúdo no recorte
+_TRIM_THRESHOLD = 24
+
+# desvio padrão abaixo do qual a imagem é considerada em branco
+BLANK_STDDEV = 4.0
+
+# bits diferentes (de 64) até os quais duas capturas são a mesma imagem
+DUPLICATE_DISTANCE = 4
+
+
+def _open(image: Union[bytes, Image.Image]) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image
+    return Image.open(io.BytesIO(image))
+
+
+def trim(image: Image.Image) -> Image.Image:
+    """Remove a moldura de cor uniforme (a cor do canto superior esquerdo)."""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    mask = ImageChops.difference(image, background).point(
+        lambda value: 255 if value > _TRIM_THRESHOLD else 0
+    )
+    box = mask.getbbox()
+    return image.crop(box) if box else image
+
+
+def compact_png(image: Union[bytes, Image.Image]) -> bytes:
+    """Recorta, converte para tons de cinza e codifica como PNG otimizado."""
+    gray = trim(_open(image).convert("L"))
+    buffer = io.BytesIO()
+    gray.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def image_hash(image: Union[bytes, Image.Image]) -> int:
+    """dHash de 64 bits: compara cada pixel com o vizinho numa miniatura 9x8."""
+    small = _open(image).convert("L").resize((9, 8), Image.LANCZOS)
+    # modo L: um byte por pixel, linha a linha
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def is_blank(image: Union[bytes, Image.Image]) -> bool:
+    return ImageStat.Stat(_open(image).convert("L")).stddev[0] < BLANK_STDDEV
+
+
+class CaptureGuard:
+    """Rejeita capturas em branco ou iguais a um captcha enviado recentemente."""
+
+    def __init__(self, history: int = 50, max_distance: int = DUPLICATE_DISTANCE) -> None:
+        self.max_distance = max_distance
+        self.recent: deque = deque(maxlen=history)
+        self.rejected = {"em_branco": 0, "repetida": 0}
+
+    @classmethod
+    def from_env(cls) -> "CaptureGuard":
+        return cls(max_distance=int(os.getenv("CAPTCHA_DISTANCIA_REPETIDA", DUPLICATE_DISTANCE)))
+
+    def check(self, image: bytes) -> Optional[str]:
+        """Motivo da rejeição (``em_branco`` ou ``repetida``) ou ``None`` se aceita.
+
+        Imagens aceitas entram no histórico de comparação.
+        """
+        if is_blank(image):
+            reason = "em_branco"
+        else:
+            digest = image_hash(image)
+            if any(bin(digest ^ seen).count("1") <= self.max_distance for seen in self.recent):
+                reason = "repetida"
+            else:
+                self.recent.append(digest)
+                return None
+        self.rejected[reason] += 1
+        return reason
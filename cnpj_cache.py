@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = "cnpj_cache.sqlite3"
+
+
+class CnpjCache:
+    """Cache persistente em SQLite das respostas de consulta de CNPJ.
+
+    Cada entrada guarda o JSON bruto, o horário da consulta e um hash do
+    conteúdo. Entradas mais antigas que ``ttl_days`` são ignoradas (exceto com
+    ``allow_stale``) e, acima de ``max_entries``, as menos acessadas são
+    removidas.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_days: float = 30,
+        max_entries: int = 5000,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cnpj_cache (
+                cnpj TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "CnpjCache":
+        """Cria o cache a partir das variáveis ``CNPJ_CACHE_*`` do ``.env``."""
+        return cls(
+            path=os.getenv("CNPJ_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_days=float(os.getenv("CNPJ_CACHE_TTL_DAYS", "30")),
+            max_entries=int(os.getenv("CNPJ_CACHE_MAX_ENTRIES", "5000")),
+        )
+
+    def get(self, cnpj: str, allow_stale: bool = False) -> Optional[Dict]:
+        """Retorna a resposta armazenada ou ``None`` se ausente/expirada."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM cnpj_cache WHERE cnpj = ?", (cnpj,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, fetched_at = row
+            if not allow_stale and now - fetched_at > self.ttl:
+                return None
+            self._conn.execute(
+                "UPDATE cnpj_cache SET last_access = ? WHERE cnpj = ?", (now, cnpj)
+            )
+            self._conn.commit()
+        return json.loads(payload)
+
+    def put(self, cnpj: str, data: Dict) -> str:
+        """Grava a resposta de um CNPJ e retorna o hash do conteúdo."""
+        payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        content_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO cnpj_cache (cnpj, payload, content_hash, fetched_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(cnpj) DO UPDATE SET
+                    payload = excluded.payload,
+                    content_hash = excluded.content_hash,
+                    fetched_at = excluded.fetched_at,
+                    last_access = excluded.last_access
+                """,
+                (cnpj, payload, content_hash, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+        return content_hash
+
+    def _evict(self) -> None:
+        # remove as entradas menos acessadas acima do limite configurado
+        self._conn.execute(
+            """
+            DELETE FROM cnpj_cache WHERE cnpj IN (
+                SELECT cnpj FROM cnpj_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,101 @@
+import re
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from unidecode import unidecode
+
+# nomes na lista da Troca de empresas podem vir precedidos do código da empresa,
+# separado por um traço ("12 - EMPRESA") ou pela coluna do código, alinhada com
+# dois ou mais espaços ("12   EMPRESA"); um número seguido de um só espaço faz
+# parte do nome ("3 IRMÃOS LTDA")
+_CODE_RE = re.compile(r"^\s*(\d+)(?:\s*[-–]\s*|\s{2,})(\S.*)$")
+
+
+def normalize_name(name: str) -> str:
+    """Normaliza o nome da empresa para comparação (sem acentos, maiúsculo)."""
+    return " ".join(unidecode(name).upper().split())
+
+
+class CompanyEntry(NamedTuple):
+    position: int
+    code: str
+    name: str
+
+
+class CompanyIndex:
+    """Índice das empresas da Troca de empresas (F8), montado uma única vez.
+
+    Mapeia o nome normalizado (com ou sem o código) para a posição do item no
+    controle ``auto_id="1011"``, evitando reler o texto de todos os itens a
+    cada seleção.
+    """
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.entries: List[CompanyEntry] = []
+        self._by_key: Dict[str, CompanyEntry] = {}
+        for position, raw in enumerate(names):
+            match = _CODE_RE.match(raw)
+            code, name = (match.group(1), match.group(2)) if match else ("", raw.strip())
+            entry = CompanyEntry(position, code, name)
+            self.entries.append(entry)
+            self._by_key.setdefault(normalize_name(raw), entry)
+            self._by_key.setdefault(normalize_name(name), entry)
+            if code:
+                self._by_key.setdefault(code, entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, name: str) -> Optional[CompanyEntry]:
+        return self._by_key.get(normalize_name(name))
+
+    def pick(self, list_box, search_edit, name: str, click=None) -> bool:
+        """Clica no item da empresa dentro da janela de Troca de empresas aberta.
+
+        Vai direto à posição indexada e confere apenas aquele item; se a lista
+        tiver mudado desde a indexação, usa o CAMPO PESQUISAR para filtrá-la.
+        ``click`` recebe o item a clicar (padrão: ``click_input``, com o mouse).
+        """
+        click = click or (lambda item: item.click_input())
+        entry = self.lookup(name)
+        if entry is None:
+            return False
+        wanted = {normalize_name(name), normalize_name(entry.name)}
+
+        item = self._item_at(list_box, entry.position)
+        if item is not None and self._matches(item.window_text(), wanted):
+            click(item)
+            return True
+
+        if search_edit is None:
+            return False
+        search_edit.set_edit_text(entry.code or entry.name)
+        # filtrada, a lista fica com poucos itens
+        for item in list_box.children():
+            if self._matches(item.window_text(), wanted):
+                click(item)
+                return True
+        return False
+
+    @staticmethod
+    def _item_at(list_box, position: int):
+        """Item na posição indexada, sem montar a lista de todos os itens.
+
+        Usa ``get_item`` quando o controle o oferece (listas UIA); senão
+        percorre os filhos só até a posição, sem ler o texto de nenhum.
+        """
+        get_item = getattr(list_box, "get_item", None)
+        if get_item is not None:
+            try:
+                return get_item(position)
+            except (IndexError, ValueError):
+                return None
+        return next(islice(list_box.iter_children(), position, None), None)
+
+    @staticmethod
+    def _matches(text: str, wanted: set) -> bool:
+        key = normalize_name(text)
+        if key in wanted:
+            return True
+        match = _CODE_RE.match(text)
+        return bool(match) and normalize_name(match.group(2)) in wanted
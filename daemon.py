@@ -0,0 +1,211 @@
+"""Sessão do Domínio mantida aberta para processar lotes de empresas.
+
+O daemon abre o Domínio (ou conecta a um já logado, com ``DOMINIO_ANEXAR``),
+faz o login e lê a lista de empresas uma única vez; depois recebe lotes por
+um socket local e os executa, um de cada vez, na mesma sessão. Um lote
+pequeno começa em menos de um segundo, sem abertura nem login.
+
+Cada lote gera o diário e os logs do modo escolhido, como numa execução
+normal. Os pedidos são autenticados com ``DAEMON_CHAVE``; sem ela, o daemon
+gera uma chave aleatória na primeira vez e a grava em ``DAEMON_CHAVE_ARQUIVO``
+(padrão ``~/.dominio_daemon_chave``), legível só pelo usuário, de onde
+``enviar`` e ``parar`` a leem.
+
+Exemplo::
+
+    python daemon.py iniciar
+    python daemon.py enviar consulta "EMPRESA A LTDA" "EMPRESA B LTDA"
+    python daemon.py parar
+"""
+
+import argparse
+import logging
+import os
+import secrets
+import time
+from collections import Counter
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from consulta_societaria import DominioConsultaSocietaria
+from dominio_core import DominioSession
+from drivers import DominioDriver, create_driver
+from pipeline import DominioPipeline
+from script import DominioAutomation
+
+DEFAULT_PORT = 47800
+
+# chave gerada pelo daemon quando DAEMON_CHAVE não está definida
+DEFAULT_KEY_PATH = os.path.join("~", ".dominio_daemon_chave")
+
+# diário da sessão do daemon (abertura, login e lista de empresas)
+JOURNAL_PATH = "journal_daemon.jsonl"
+
+MODES = {
+    "atualizacao": DominioAutomation,
+    "consulta": DominioConsultaSocietaria,
+    "completo": DominioPipeline,
+}
+
+
+def daemon_address() -> Tuple[str, int]:
+    return ("127.0.0.1", int(os.getenv("DAEMON_PORTA", DEFAULT_PORT)))
+
+
+def daemon_authkey(create: bool = False) -> bytes:
+    """Chave dos pedidos: ``DAEMON_CHAVE`` ou a do arquivo gerado pelo daemon.
+
+    Com ``create`` (ao iniciar o daemon) o arquivo é criado com uma chave
+    aleatória se ainda não existir, com permissão só para o usuário.
+    """
+    key = os.getenv("DAEMON_CHAVE", "")
+    if key:
+        return key.encode("utf-8")
+    path = os.path.expanduser(os.getenv("DAEMON_CHAVE_ARQUIVO", DEFAULT_KEY_PATH))
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as key_file:
+            key_file.write(secrets.token_hex(32))
+    try:
+        with open(path, encoding="utf-8") as key_file:
+            return key_file.read().strip().encode("utf-8")
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"Chave do daemon não encontrada em {path}: inicie o daemon ou defina DAEMON_CHAVE"
+        ) from None
+
+
+class _WarmUpSession(DominioSession):
+    """Sessão que só abre o Domínio, faz o login e lê a lista de empresas."""
+
+    run_mode = "aquecimento"
+
+    def process_company(self, company: str) -> None:
+        pass
+
+    def is_completed(self, result: Dict) -> bool:
+        return False
+
+    def save_logs(self) -> None:
+        pass
+
+
+class SessionDaemon:
+    """Mantém um driver logado e executa os lotes recebidos em sequência."""
+
+    def __init__(
+        self,
+        driver: Optional[DominioDriver] = None,
+        address: Optional[Tuple[str, int]] = None,
+        authkey: Optional[bytes] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.logger = logger or logging.getLogger(__name__)
+        self.driver = driver or create_driver(logger=self.logger)
+        self.address = address or daemon_address()
+        self.authkey = authkey or daemon_authkey(create=True)
+
+    def warm_up(self) -> bool:
+        """Abre (ou conecta ao) Domínio, faz o login e lê a lista de empresas."""
+        session = _WarmUpSession(JOURNAL_PATH, driver=self.driver)
+        try:
+            if not session.start_session():
+                return False
+            session.get_companies_list()
+            return True
+        finally:
+            session.lookup_worker.stop()
+            session.journal.close()
+
+    def run_job(self, job: Dict) -> Dict:
+        """Executa um lote ``{"modo", "empresas", "resume"}`` e devolve os resultados."""
+        mode = job.get("modo", "consulta")
+        if mode not in MODES:
+            return {"ok": False, "erro": f"Modo desconhecido: {mode}"}
+        start = time.monotonic()
+        runner = MODES[mode](resume=job.get("resume", False), driver=self.driver)
+        runner.keep_app_open = True
+        try:
+            runner.run(companies=job.get("empresas") or None)
+        except Exception as exc:
+            self.logger.exception("Falha no lote %s", mode)
+            # o Domínio pode ter ficado num estado desconhecido; o próximo
+            # lote abre uma sessão nova
+            self.driver.close()
+            return {"ok": False, "erro": str(exc)}
+        results = list(runner.journal.iter_results())
+        return {
+            "ok": True,
+            "modo": mode,
+            "segundos": round(time.monotonic() - start, 1),
+            "status": dict(Counter(result["status"] for result in results)),
+            "resultados": results,
+        }
+
+    def serve(self) -> None:
+        if not self.warm_up():
+            self.logger.error("Falha ao iniciar a sessão do Domínio")
+            return
+        with Listener(self.address, authkey=self.authkey) as listener:
+            self.logger.info("Aguardando lotes em %s:%d", *self.address)
+            try:
+                while True:
+                    with listener.accept() as conn:
+                        request = conn.recv()
+                        if request.get("acao") == "parar":
+                            conn.send({"ok": True})
+                            break
+                        conn.send(self.run_job(request))
+            finally:
+                self.driver.close()
+
+
+def submit_job(
+    mode: str,
+    companies: List[str],
+    resume: bool = False,
+    address: Optional[Tuple[str, int]] = None,
+    authkey: Optional[bytes] = None,
+) -> Dict:
+    """Envia um lote ao daemon e aguarda o resultado."""
+    with Client(address or daemon_address(), authkey=authkey or daemon_authkey()) as conn:
+        conn.send({"acao": "executar", "modo": mode, "empresas": companies, "resume": resume})
+        return conn.recv()
+
+
+def stop_daemon(address: Optional[Tuple[str, int]] = None, authkey: Optional[bytes] = None) -> None:
+    with Client(address or daemon_address(), authkey=authkey or daemon_authkey()) as conn:
+        conn.send({"acao": "parar"})
+        conn.recv()
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Sessão do Domínio mantida aberta")
+    commands = parser.add_subparsers(dest="comando", required=True)
+    commands.add_parser("iniciar", help="abre a sessão e aguarda lotes")
+    enviar = commands.add_parser("enviar", help="envia um lote ao daemon")
+    enviar.add_argument("modo", choices=sorted(MODES))
+    enviar.add_argument("empresas", nargs="*", help="empresas do lote (padrão: todas)")
+    enviar.add_argument("--resume", action="store_true", help="pula empresas já concluídas")
+    commands.add_parser("parar", help="encerra o daemon e o Domínio aberto por ele")
+    args = parser.parse_args()
+
+    if args.comando == "iniciar":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+        SessionDaemon().serve()
+    elif args.comando == "enviar":
+        reply = submit_job(args.modo, args.empresas, resume=args.resume)
+        if not reply["ok"]:
+            raise SystemExit(f"Erro: {reply['erro']}")
+        print(f"Lote concluído em {reply['segundos']:.1f}s")
+        for status, count in reply["status"].items():
+            print(f"  {status}: {count}")
+    else:
+        stop_daemon()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Base comum das automações do Domínio.
+
+Reúne o que todos os modos de execução fazem da mesma forma: abrir o
+Domínio, fazer login, ler a lista de empresas, selecionar uma empresa, ler o
+CNPJ, registrar os resultados no diário e encerrar a sessão. O que cada modo
+faz com a empresa fica em :meth:`DominioSession.process_company`.
+"""
+
+import abc
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from colorama import Fore, Style, init as colorama_init
+from dotenv import load_dotenv
+
+from drivers import DominioDriver, create_driver
+from journal import ResultJournal
+from metrics import MetricsServer, RunProgress
+from receita_lookup import ReceitaLookupWorker
+from retry_queue import RetryQueue
+from run_history import RunHistory, run_source
+from scheduler import CompanyScheduler
+from tracing import Tracer
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    """Lê uma variável booleana do ``.env`` (``1``, ``true`` ou ``yes``)."""
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class DominioSession(abc.ABC):
+    """Sessão do Domínio com o fluxo comum a todos os modos.
+
+    A interação com a interface passa pelo ``driver`` (pywinauto por padrão ou
+    o Domínio simulado de ``simulator.py``); as consultas de CNPJ passam pelo
+    ``lookup_worker``, uma única vez por empresa.
+    """
+
+    # nome do modo nos logs e no histórico de execuções
+    run_mode = ""
+
+    def __init__(
+        self,
+        journal_path: str,
+        resume: bool = False,
+        driver: Optional[DominioDriver] = None,
+    ) -> None:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+        colorama_init(autoreset=True)
+        self.logger = logging.getLogger(type(self).__module__)
+
+        load_dotenv()
+        self.password = os.getenv("DOMINIO_PASSWORD", "")
+        self.test_mode = env_flag("TEST_MODE")
+        self.manual_login = env_flag("MANUAL_LOGIN")
+        # conecta a um Domínio já aberto e logado em vez de abrir outro
+        self.attach = env_flag("DOMINIO_ANEXAR")
+        # mantém o Domínio aberto ao final (sessão do daemon.py)
+        self.keep_app_open = False
+        self.driver = driver or create_driver(logger=self.logger)
+        self.resume = resume
+        self.journal = ResultJournal(journal_path, resume=resume)
+        self.tracer = Tracer()
+        self.started_at = datetime.now()
+        self.scheduler = CompanyScheduler.from_env(logger=self.logger)
+        self.retries = RetryQueue.from_env()
+        self.current_company: Optional[str] = None
+        # empresas concluídas e vazão, expostas por metrics.py
+        self.progress = RunProgress()
+        self.lookup_worker = ReceitaLookupWorker.from_env(logger=self.logger, tracer=self.tracer)
+
+    # ------------------------------------------------------------------
+    # Inicialização e login
+    # ------------------------------------------------------------------
+    def _span(self, name: str, **args):
+        return self.tracer.span(name, self.current_company, **args)
+
+    def init_app(self) -> None:
+        """Abre o aplicativo Domínio a partir do atalho."""
+        self.logger.info(Fore.YELLOW + "Abrindo aplicativo Domínio" + Style.RESET_ALL)
+        with self._span("abrir_app"):
+            self.driver.open_app()
+        self.logger.info(Fore.GREEN + "Aplicativo aberto" + Style.RESET_ALL)
+
+    def login(self) -> bool:
+        """Realiza login automático ou aguarda login manual."""
+        self.logger.info(Fore.YELLOW + "Realizando login" + Style.RESET_ALL)
+        try:
+            if self.manual_login:
+                self.logger.info("Aguardando login manual")
+            with self._span("login"):
+                self.driver.login(self.password, manual=self.manual_login)
+            self.logger.info(Fore.GREEN + "Login realizado" + Style.RESET_ALL)
+            return True
+        except Exception as exc:  # pragma: no cover - interação de UI
+            screenshot = "login_error.png"
+            try:
+                self.driver.screenshot(screenshot)
+            except Exception as scr_exc:  # pragma: no cover - captura opcional
+                self.logger.error("Falha ao salvar screenshot: %s", scr_exc)
+            self.logger.error("Erro no login: %s. Screenshot salvo em %s", exc, screenshot)
+            return False
+
+    def attach_app(self) -> bool:
+        """Conecta ao Domínio já aberto e logado, se houver."""
+        try:
+            with self._span("anexar"):
+                self.driver.attach()
+        except LookupError as exc:
+            self.logger.warning("%s; abrindo o Domínio", exc)
+            return False
+        self.logger.info(Fore.GREEN + "Conectado ao Domínio já aberto" + Style.RESET_ALL)
+        return True
+
+    def start_session(self) -> bool:
+        """Abre o Domínio e faz o login (ou conecta a um já logado, com ``attach``)."""
+        if self.attach and self.attach_app():
+            return True
+        self.init_app()
+        if not self.login():
+            print("Falha no login")
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Empresas
+    # ------------------------------------------------------------------
+    def get_companies_list(self) -> List[str]:
+        """Obtém a lista de empresas através da janela de troca de empresas."""
+        try:
+            with self._span("lista_empresas"):
+                companies = self.driver.list_companies()
+            self.logger.info("%d empresas encontradas", len(companies))
+            return companies
+        except Exception as exc:  # pragma: no cover - interação de UI
+            self.logger.error("Falha ao obter empresas: %s", exc)
+            return []
+
+    def pending_companies(self, companies: List[str], done: Set[str]) -> List[str]:
+        """Aplica o ``--resume`` (pula ``done``), a agenda e o modo teste à lista."""
+        if self.resume:
+            companies = [c for c in companies if c not in done]
+            print(f"Retomando execução: {len(done)} empresas já concluídas")
+        companies = self.scheduler.plan(companies, self.run_mode)
+        if self.test_mode:
+            companies = companies[:3]
+            print("Modo teste ativo: processando apenas as 3 primeiras empresas")
+        return companies
+
+    def select_company(self, name: str) -> bool:
+        """Troca para a empresa (F8 + Alt+O).
+
+        Retorna ``False`` se a empresa não está na lista; falhas da interface
+        são propagadas, para que quem chama as registre e adie a empresa.
+        """
+        try:
+            with self._span("selecionar_empresa"):
+                self.driver.select_company(name)
+            return True
+        except LookupError:
+            self.logger.warning("Empresa %s não encontrada", name)
+            return False
+
+    def read_company_cnpj(self) -> str:
+        """Abre os dados da empresa ativa (Alt+D) e lê o CNPJ."""
+        with self._span("dados"):
+            self.driver.open_company_data()
+            return self.driver.read_cnpj()
+
+    @abc.abstractmethod
+    def process_company(self, company: str) -> None:
+        """Processa uma empresa e registra o resultado no diário."""
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+    @abc.abstractmethod
+    def is_completed(self, result: Dict) -> bool:
+        """Indica se a empresa pode ser pulada por um ``--resume``."""
+
+    def _record(self, result: Dict) -> None:
+        result["tempos"] = self.tracer.company_totals(result["empresa"])
+        self.journal.record(result, concluida=self.is_completed(result))
+        self.progress.record(result)
+
+    @abc.abstractmethod
+    def save_logs(self) -> None:
+        """Gera os arquivos de log a partir do diário de resultados."""
+
+    def record_history(self, timestamp: str) -> None:
+        """Grava a execução em ``historico.sqlite3`` (ver ``run_history.py``).
+
+        ``timestamp`` é o carimbo dos arquivos de log, para que uma importação
+        posterior dos mesmos logs não duplique a execução.
+        """
+        try:
+            history = RunHistory.from_env()
+            try:
+                history.record_run(
+                    run_source(self.run_mode, timestamp),
+                    self.run_mode,
+                    self.started_at,
+                    (datetime.now() - self.started_at).total_seconds(),
+                    self.journal.iter_results(),
+                    resumed=self.resume,
+                )
+            finally:
+                history.close()
+        except sqlite3.Error as exc:
+            self.logger.warning("Falha ao gravar o histórico da execução: %s", exc)
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+    def close_resources(self) -> None:
+        """Libera recursos próprios do modo (chamado após as consultas terminarem)."""
+
+    def finish(self, save_logs: bool = True) -> None:
+        """Aguarda as consultas pendentes, gera os logs e encerra o Domínio."""
+        self.logger.info("Aguardando consultas pendentes na ReceitaWS")
+        self.lookup_worker.drain()
+        self.lookup_worker.stop()
+        self.close_resources()
+        if save_logs:
+            self.save_logs()
+        self.journal.close()
+        if not self.keep_app_open:
+            self.driver.close()
+
+    # ------------------------------------------------------------------
+    # Novas tentativas
+    # ------------------------------------------------------------------
+    def defer(self, company: str, kind: str, payload=None, delay: float = 0.0) -> None:
+        """Agenda uma nova tentativa da empresa ao final da passada (``retry_queue.py``)."""
+        if self.retries.push(company, kind, payload, delay):
+            self.logger.warning("%s adiada (%s); nova tentativa ao final da passada", company, kind)
+
+    def retry_company(self, company: str, kind: str, payload) -> None:
+        """Repete uma empresa adiada; por padrão, processa a empresa de novo."""
+        self.process_company(company)
+
+    def drain_retries(self) -> None:
+        """Repete as empresas adiadas, aguardando a espera de cada tentativa."""
+        while True:
+            entry = self.retries.pop()
+            if entry is None:
+                # consultas ainda em andamento podem adiar mais empresas
+                self.lookup_worker.drain()
+                entry = self.retries.pop()
+                if entry is None:
+                    break
+            company, kind, payload, wait = entry
+            if self.scheduler.out_of_time(company, wait):
+                self.logger.warning(
+                    "Prazo atingido: %d novas tentativas descartadas", 1 + len(self.retries)
+                )
+                break
+            if wait > 0:
+                self.logger.info("Aguardando %.0fs para repetir %s (%s)", wait, company, kind)
+                time.sleep(wait)
+            self.retry_company(company, kind, payload)
+        if self.retries.exhausted:
+            self.logger.warning("Tentativas esgotadas: %s", dict(self.retries.exhausted))
+
+    def before_companies(self, companies: List[str]) -> None:
+        """Gancho executado com a lista final de empresas, antes da primeira."""
+
+    def run(self, companies: Optional[List[str]] = None) -> None:
+        """Processa ``companies`` (padrão: todas as da Troca de empresas).
+
+        Com o driver já logado (sessão do ``daemon.py``) a abertura e o login
+        são pulados, e a lista só é relida se alguma empresa pedida não
+        estiver no índice.
+        """
+        self.logger.info(Fore.GREEN + "Iniciando script" + Style.RESET_ALL)
+        self.logger.info(
+            "Configurações: test_mode=%s manual_login=%s", self.test_mode, self.manual_login
+        )
+        if not self.driver.logged_in and not self.start_session():
+            return
+
+        index = self.driver.company_index
+        if companies is None:
+            companies = self.get_companies_list()
+        elif any(index.lookup(company) is None for company in companies):
+            self.get_companies_list()
+        done = self.journal.completed() if self.resume else set()
+        companies = self.pending_companies(companies, done)
+
+        print(f"Processando {len(companies)} empresas")
+        self.progress.start(len(companies))
+        metrics = MetricsServer.from_env(self)
+        if metrics:
+            metrics.start()
+        try:
+            self.lookup_worker.start()
+            self.before_companies(companies)
+            processed = []
+            for company in companies:
+                if self.scheduler.out_of_time(company):
+                    self.logger.warning(
+                        "Prazo atingido: %d empresas ficam para a próxima execução",
+                        len(companies) - len(processed),
+                    )
+                    break
+                self.process_company(company)
+                processed.append(company)
+            self.drain_retries()
+            self.scheduler.save_carryover(processed)
+            self.finish()
+        finally:
+            if metrics:
+                metrics.stop()
@@ -0,0 +1,538 @@
+import abc
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+from captcha_image import compact_png
+from company_index import CompanyIndex
+from locators import ControlCache, LocatorRegistry
+from ui_input import ControlInput
+from waits import Waiter, app_idle, dialog_opened, window_closed
+
+try:  # pragma: no cover - dependências disponíveis apenas no Windows
+    import ctypes
+
+    import pyautogui
+    import pyperclip
+    import win32con
+    import win32gui
+    import win32ui
+    from PIL import Image
+    from pywinauto import Application, keyboard
+except ImportError:  # pragma: no cover - permite usar o simulador fora do Windows
+    pyautogui = pyperclip = Application = keyboard = None
+
+# caminho padrão do atalho do Domínio Registro
+APP_SHORTCUT = r"C:\Contabil\contabil.exe /registro"
+
+# PrintWindow também para janelas atrás de outras (Windows 8.1 ou superior)
+PW_RENDERFULLCONTENT = 0x2
+
+# caracteres com significado especial em send_keys, enviados entre chaves
+_SPECIAL_KEYS_RE = re.compile(r"([{}+^%~()])")
+
+# classes de controle próprias para imagens; um Static só vale com estilo de imagem
+CAPTCHA_IMAGE_CLASS_RE = re.compile(r"Picture|Image", re.I)
+
+# tipos de Static que exibem imagem (SS_ICON, SS_BITMAP, SS_ENHMETAFILE); os
+# demais (SS_LEFT, SS_CENTER...) são rótulos de texto
+SS_TYPEMASK = 0x1F
+STATIC_IMAGE_STYLES = (0x3, 0xE, 0xF)
+
+# texto do aviso exibido pelo Domínio quando o captcha é recusado
+CAPTCHA_REJECTED_RE = re.compile(r"captcha.*(inv[aá]lid|n[aã]o (foi )?validad|incorret)", re.I)
+
+
+class DominioDriver(abc.ABC):
+    """Operações de interface do Domínio usadas pelos scripts.
+
+    Cada método executa uma ação e só retorna quando a tela resultante está
+    pronta; falhas são sinalizadas com exceções.
+    """
+
+    def __init__(self) -> None:
+        self.company_index = CompanyIndex([])
+        # sessão logada pronta para uso (após login ou attach)
+        self.logged_in = False
+        # conectado a um Domínio aberto por fora, que não é encerrado no close
+        self.attached = False
+
+    @abc.abstractmethod
+    def open_app(self) -> None:
+        """Abre o Domínio e aguarda a janela de login."""
+
+    @abc.abstractmethod
+    def attach(self) -> None:
+        """Conecta a um Domínio já aberto e logado (``LookupError`` se não houver)."""
+
+    @abc.abstractmethod
+    def login(self, password: str, manual: bool = False) -> None:
+        """Autentica (ou aguarda o login manual) e aguarda a janela principal."""
+
+    @abc.abstractmethod
+    def list_companies(self) -> List[str]:
+        """Lê a lista da Troca de empresas (F8) e monta ``company_index``."""
+
+    @abc.abstractmethod
+    def select_company(self, name: str) -> None:
+        """Troca para a empresa via F8 e confirma (Alt+O)."""
+
+    @abc.abstractmethod
+    def open_switcher_data(self, name: str) -> None:
+        """Abre a Troca de empresas, marca a empresa e abre ``Dados...``."""
+
+    @abc.abstractmethod
+    def open_company_data(self) -> None:
+        """Abre os dados da empresa ativa (Alt+D)."""
+
+    @abc.abstractmethod
+    def read_cnpj(self) -> str:
+        """Retorna o CNPJ (somente dígitos) da janela de dados aberta."""
+
+    @abc.abstractmethod
+    def read_company_fields(self) -> Dict[str, object]:
+        """Lê ``capital_social`` e ``socios`` (nomes) da janela de dados aberta."""
+
+    @abc.abstractmethod
+    def close_company_data(self) -> None:
+        """Fecha a janela de dados (ESC)."""
+
+    @abc.abstractmethod
+    def close_switcher(self) -> None:
+        """Fecha a Troca de empresas (ESC)."""
+
+    def close_data_and_switcher(self) -> None:
+        """Fecha a janela de dados aberta pela Troca de empresas e a própria Troca."""
+        self.close_company_data()
+        self.close_switcher()
+
+    @abc.abstractmethod
+    def open_update(self) -> None:
+        """Abre a atualização cadastral (Alt+U)."""
+
+    @abc.abstractmethod
+    def capture_captcha(self) -> bytes:
+        """Captura a imagem do captcha em PNG compacto, em tons de cinza."""
+
+    @abc.abstractmethod
+    def type_captcha(self, text: str) -> None:
+        """Preenche a resposta do captcha."""
+
+    @abc.abstractmethod
+    def import_data(self) -> None:
+        """Importa os dados da Receita (Alt+I)."""
+
+    @abc.abstractmethod
+    def captcha_rejected(self) -> bool:
+        """Indica (e dispensa) o aviso de captcha recusado após a importação."""
+
+    @abc.abstractmethod
+    def save(self) -> None:
+        """Grava as alterações (Alt+G)."""
+
+    @abc.abstractmethod
+    def close_update(self) -> None:
+        """Fecha a atualização cadastral (ESC)."""
+
+    @abc.abstractmethod
+    def escape(self) -> None:
+        """Envia ESC sem aguardar, para recuperação após erros."""
+
+    @abc.abstractmethod
+    def screenshot(self, path: str) -> None:
+        """Salva uma captura da tela para depuração."""
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """Encerra o Domínio (ou só se desconecta, se foi usado :meth:`attach`)."""
+
+
+class PywinautoDriver(DominioDriver):
+    """Driver real, que controla o Domínio instalado via pywinauto.
+
+    Os controles são localizados pelo registro compilado de ``Elementos.txt``
+    e os wrappers ficam em cache até a janela que os contém fechar
+    (``locators.py``). Cliques, textos e atalhos são enviados sem trocar o
+    foco sempre que surtem efeito (``ui_input.py``).
+    """
+
+    def __init__(
+        self,
+        app_shortcut: str = APP_SHORTCUT,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        super().__init__()
+        if Application is None:
+            raise RuntimeError("pywinauto não está disponível neste sistema")
+        self.app_shortcut = app_shortcut
+        self.logger = logger or logging.getLogger(__name__)
+        self.app: Application | None = None
+        self.main_window = None
+        self.waiter = Waiter()
+        self.controls = ControlCache(
+            LocatorRegistry.from_file(), root=lambda: self.main_window, app=lambda: self.app
+        )
+        self.input = ControlInput.from_env(self.waiter, self.logger)
+        self._update_dialog = None
+        # auto_id do controle do captcha informado no .env
+        self._captcha_auto_id = os.getenv("CAPTCHA_AUTO_ID", "")
+        # auto_id escolhido pelas propriedades da imagem: descartado quando o
+        # captcha é recusado e só mantido depois de um captcha aceito
+        self._captcha_guess = ""
+        self._captcha_confirmed = False
+
+    def _keys(self, keys: str) -> None:
+        self.main_window.set_focus()
+        keyboard.send_keys(keys)
+
+    def _focused(self):
+        # controle com foco na thread da interface, sem trazer a janela para a frente
+        window = self.app.top_window()
+        return window.get_focus() or window
+
+    def _send(self, keys: str, step: str, done):
+        """Envia ``keys`` sem foco e aguarda ``done``; se o envio falhar, usa o teclado."""
+        return self.input.send(self._focused, keys, step, done, lambda: self._keys(keys))
+
+    def _open_switcher(self):
+        return self._send("{F8}", "lista_empresas", lambda: self.controls.enabled("empresas"))
+
+    def _search_edit(self):
+        # CAMPO PESQUISAR da janela Troca de empresas
+        return self.controls.find("pesquisar")
+
+    def _close(self, *windows: str) -> None:
+        """Fecha ``windows`` com um ESC para cada uma, enviados numa única chamada."""
+        self._send(
+            "{ESC}" * len(windows),
+            "janela_fechada",
+            lambda: all(self.controls.gone(window) for window in windows),
+        )
+        for window in windows:
+            self.controls.invalidate(window)
+
+    def open_app(self) -> None:
+        # inicia o Domínio sem aguardar ocioso para evitar travamentos
+        self.app = Application(backend="win32").start(self.app_shortcut, wait_for_idle=False)
+        # aguarda a janela principal, que pode demorar alguns segundos para surgir;
+        # a busca fica restrita ao processo iniciado, pois outras sessões podem
+        # ter o Domínio aberto ao mesmo tempo
+        self.waiter.until(
+            "app_aberto", lambda: self.app.window(title_re=".*Domínio.*").exists(timeout=0)
+        )
+        self.main_window = self.app.window(title_re=".*Domínio.*")
+        self.main_window.wait("visible", timeout=60)
+
+    def attach(self) -> None:
+        # DOMINIO_PID escolhe a instância quando há mais de um Domínio aberto
+        pid = os.getenv("DOMINIO_PID")
+        try:
+            if pid:
+                self.app = Application(backend="win32").connect(process=int(pid))
+            else:
+                self.app = Application(backend="win32").connect(
+                    title_re=".*Domínio.*", class_name="FNWND3190", timeout=5
+                )
+            self.main_window = self.app.window(title_re=".*Domínio.*", class_name="FNWND3190")
+            self.main_window.wait("ready", timeout=10)
+            self.controls.clear()
+        except Exception as exc:
+            self.app = None
+            raise LookupError(f"Nenhum Domínio logado encontrado: {exc}") from exc
+        if not self.input.enabled:
+            self.main_window.set_focus()
+        self.logged_in = self.attached = True
+
+    def login(self, password: str, manual: bool = False) -> None:
+        self.main_window.wait("ready", timeout=30)
+
+        if manual:
+            print("Aguardando login manual. Realize o login e pressione Enter...")
+            input()
+            self.logged_in = True
+            return
+
+        # a janela de login usa a classe FNWNS3190 e a principal FNWND3190
+        def logged_in() -> bool:
+            return self.app.window(title_re=".*Domínio.*", class_name="FNWND3190").exists(
+                timeout=0
+            )
+
+        if not self._login_without_focus(password, logged_in):
+            self.main_window.set_focus()
+            try:
+                senha = self.controls.registry["senha"]
+                password_edit = self.main_window.child_window(**senha.criteria)
+                password_edit.wait("ready", timeout=5)
+                password_edit.click_input()
+                pyperclip.copy(password)
+                # o Ctrl+V e o Alt+O entram na mesma fila de entrada, em ordem
+                pyautogui.hotkey("ctrl", "v")
+            except Exception as exc:  # pragma: no cover - depende da UI
+                self.logger.error("Erro ao inserir senha: %s", exc)
+                self._keys(password)
+
+            self._keys("%o")  # Alt+O
+            self.waiter.until("login_concluido", logged_in)
+
+        self.main_window = self.app.window(title_re=".*Domínio.*")
+        self.main_window.wait("ready")
+        if not self.input.enabled:
+            self.main_window.set_focus()
+        self.controls.clear()
+        self.logged_in = True
+
+    def _login_without_focus(self, password: str, logged_in) -> bool:
+        """Grava a senha no campo e clica OK por mensagens, sem área de transferência."""
+        if not self.input.enabled:
+            return False
+        window = self.main_window
+        password_edit = window.child_window(**self.controls.registry["senha"].criteria)
+        try:
+            password_edit.wait("ready", timeout=5)
+            # campos de senha não devolvem o texto a outro processo: sem conferência
+            password_edit.wrapper_object().set_edit_text(password)
+            ok = window.child_window(**self.controls.registry["ok"].criteria)
+            ok.wrapper_object().click()
+            self.waiter.until("login_concluido", logged_in)
+            return True
+        except Exception as exc:  # pragma: no cover - depende da UI
+            if logged_in():
+                return True
+            self.input.fallbacks["login"] += 1
+            self.logger.warning("Login sem foco não concluído (%s); usando o teclado", exc)
+            try:
+                # o teclado cola a senha de novo no campo
+                password_edit.wrapper_object().set_edit_text("")
+            except Exception:
+                pass
+            return False
+
+    def list_companies(self) -> List[str]:
+        # the list of empresas is hosted inside a custom control identified
+        # by auto_id 1011 (class_name "pbdw190"), so we iterate over its
+        # children to read the names
+        companies = [child.window_text() for child in self._open_switcher().children()]
+        self.company_index = CompanyIndex(companies)
+        self.close_switcher()
+        return companies
+
+    def _pick(self, name: str) -> None:
+        list_box = self._open_switcher()
+        if not self.company_index.pick(list_box, self._search_edit(), name, self.input.click):
+            self.close_switcher()
+            raise LookupError(f"Empresa {name} não encontrada")
+
+    def select_company(self, name: str) -> None:
+        self._pick(name)
+        # confirmar (Alt+O)
+        self._send("%o", "empresa_selecionada", lambda: self.controls.gone("troca_empresas"))
+        self.controls.invalidate("troca_empresas")
+
+    def open_switcher_data(self, name: str) -> None:
+        self._pick(name)
+        try:
+            dados_btn = self.waiter.until(
+                "botao_dados", lambda: self.controls.enabled("botao_dados"), timeout=1
+            )
+            self.input.click(dados_btn)
+        except Exception:
+            self._keys("%d")  # alternativa via atalho
+
+    def open_company_data(self) -> None:
+        # abre aba Dados (Alt+D); o CNPJ preenchido indica a janela pronta
+        self._send("%d", "dados_abertos", lambda: self.controls.text("cnpj"))
+
+    def read_cnpj(self) -> str:
+        # o campo Edit é buscado só dentro da janela de dados
+        cnpj_raw = self.waiter.until("dados_abertos", lambda: self.controls.text("cnpj"))
+        return re.sub(r"[^0-9]", "", cnpj_raw)
+
+    def read_company_fields(self) -> Dict[str, object]:
+        # CAMPO CAPITAL SOCIAL e CAMPO SÓCIOS da janela de dados (Elementos.txt)
+        capital = self.controls.find("capital_social")
+        socios = self.controls.find("socios")
+        return {
+            "capital_social": capital.window_text() if capital is not None else "",
+            "socios": [child.window_text() for child in socios.children()] if socios else [],
+        }
+
+    def close_company_data(self) -> None:
+        self._close("dados")
+
+    def close_switcher(self) -> None:
+        self._close("troca_empresas")
+
+    def close_data_and_switcher(self) -> None:
+        self._close("dados", "troca_empresas")
+
+    def open_update(self) -> None:
+        previous = self.app.top_window().handle
+        # Alt+U - Atualizar Cadastro
+        self._update_dialog = self._send(
+            "%u", "atualizacao_aberta", dialog_opened(self.app, previous)
+        )
+
+    @staticmethod
+    def _is_image(control) -> bool:
+        """Controle que exibe uma imagem com proporções de captcha."""
+        class_name = control.class_name()
+        if class_name.lower() == "static":
+            if control.style() & SS_TYPEMASK not in STATIC_IMAGE_STYLES:
+                return False
+        elif not CAPTCHA_IMAGE_CLASS_RE.search(class_name):
+            return False
+        rect = control.rectangle()
+        width, height = rect.width(), max(rect.height(), 1)
+        return 60 <= width <= 400 and 2 <= width / height <= 6
+
+    def _captcha_control(self):
+        """Controle da imagem do captcha na atualização cadastral.
+
+        Pela ordem: ``CAPTCHA_AUTO_ID``, a seção ``IMAGEM DO CAPTCHA`` de
+        ``Elementos.txt`` ou o controle de imagem com proporções de captcha.
+        Sem nenhum deles a captura falha, em vez de enviar ao 2Captcha (e pagar
+        por) uma imagem que pode não ser o captcha.
+        """
+        dialog = self._update_dialog or self.main_window
+        locator = self.controls.registry.get("captcha")
+        if self._captcha_auto_id:
+            return dialog.child_window(auto_id=self._captcha_auto_id).wrapper_object()
+        if locator is not None:
+            return dialog.child_window(**locator.criteria).wrapper_object()
+        if self._captcha_guess:
+            return dialog.child_window(auto_id=self._captcha_guess).wrapper_object()
+        for control in dialog.descendants():
+            if self._is_image(control):
+                self._captcha_guess = str(control.control_id())
+                self._captcha_confirmed = False
+                self.logger.info(
+                    "Controle do captcha (a confirmar): auto_id=%s", self._captcha_guess
+                )
+                return control
+        raise LookupError(
+            "Controle do captcha não encontrado; informe CAPTCHA_AUTO_ID "
+            "ou a seção IMAGEM DO CAPTCHA em Elementos.txt"
+        )
+
+    def _window_image(self, window):
+        """Imagem da janela de nível superior copiada com ``PrintWindow``.
+
+        A cópia vem do próprio desenho da janela, e não da tela: funciona com o
+        Domínio atrás de outras janelas. Uma janela minimizada não tem o que
+        desenhar e é restaurada antes, sem ativação (não rouba o foco).
+        """
+        hwnd = window.handle
+        if win32gui.IsIconic(hwnd):
+            win32gui.ShowWindow(hwnd, win32con.SW_SHOWNOACTIVATE)
+            self.waiter.until("janela_restaurada", lambda: not win32gui.IsIconic(hwnd))
+        left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+        width, height = right - left, bottom - top
+        window_dc = win32gui.GetWindowDC(hwnd)
+        source = win32ui.CreateDCFromHandle(window_dc)
+        memory = source.CreateCompatibleDC()
+        bitmap = win32ui.CreateBitmap()
+        try:
+            bitmap.CreateCompatibleBitmap(source, width, height)
+            memory.SelectObject(bitmap)
+            if not ctypes.windll.user32.PrintWindow(
+                hwnd, memory.GetSafeHdc(), PW_RENDERFULLCONTENT
+            ):
+                raise RuntimeError("PrintWindow não copiou a janela")
+            bits = bitmap.GetBitmapBits(True)
+        finally:
+            win32gui.DeleteObject(bitmap.GetHandle())
+            memory.DeleteDC()
+            source.DeleteDC()
+            win32gui.ReleaseDC(hwnd, window_dc)
+        image = Image.frombuffer("RGB", (width, height), bits, "raw", "BGRX", 0, 1)
+        return image, (left, top)
+
+    def capture_captcha(self) -> bytes:
+        # recorta pelo retângulo do controle na imagem da própria janela
+        control = self._captcha_control()
+        image, (left, top) = self._window_image(control.top_level_parent())
+        # o retângulo é lido após uma eventual restauração da janela
+        rect = control.rectangle()
+        box = (rect.left - left, rect.top - top, rect.right - left, rect.bottom - top)
+        return compact_png(image.crop(box))
+
+    def type_captcha(self, text: str) -> None:
+        # o campo da resposta recebe o foco quando a atualização abre; sem o
+        # WM_SETTEXT os caracteres são postados no campo, e só então digitados
+        if self.input.set_text(self._focused(), text):
+            return
+        keys = _SPECIAL_KEYS_RE.sub(r"{\1}", text)
+        if not self.input.post_keys(self._focused, keys):
+            self._keys(keys)
+
+    def import_data(self) -> None:
+        # Alt+I - Importar; o término é visto pelo aplicativo ocioso
+        self._send("%i", "importacao_concluida", app_idle(self.app))
+
+    def captcha_rejected(self) -> bool:
+        for window in self.app.windows():
+            # avisos do Domínio são caixas de diálogo padrão do Windows
+            if window.class_name() != "#32770":
+                continue
+            if any(CAPTCHA_REJECTED_RE.search(text) for text in window.texts()):
+                if self._captcha_guess and not self._captcha_confirmed:
+                    # a imagem enviada pode não ter sido o captcha: escolhe de novo
+                    self.logger.warning(
+                        "Captcha recusado; controle auto_id=%s descartado", self._captcha_guess
+                    )
+                    self._captcha_guess = ""
+                self.input.send(
+                    lambda: window,
+                    "{ENTER}",
+                    "janela_fechada",
+                    window_closed(self.app, window.handle),
+                    lambda: window.type_keys("{ENTER}"),
+                )
+                return True
+        if self._captcha_guess and not self._captcha_confirmed:
+            self._captcha_confirmed = True
+            self.logger.info(
+                "Controle do captcha confirmado: auto_id=%s (CAPTCHA_AUTO_ID)", self._captcha_guess
+            )
+        return False
+
+    def save(self) -> None:
+        # Alt+G - Gravar
+        self._send("%g", "gravacao_concluida", app_idle(self.app))
+
+    def close_update(self) -> None:
+        if self._update_dialog is None:
+            self._keys("{ESC}")
+            return
+        self._send("{ESC}", "janela_fechada", window_closed(self.app, self._update_dialog.handle))
+        self._update_dialog = None
+
+    def escape(self) -> None:
+        if not self.input.post_keys(self._focused, "{ESC}"):
+            self._keys("{ESC}")
+
+    def screenshot(self, path: str) -> None:
+        pyautogui.screenshot(path)
+
+    def close(self) -> None:
+        self.waiter.save()
+        self.logger.info("Localizadores de controles: %s", dict(self.controls.stats))
+        if self.input.fallbacks:
+            self.logger.info("Ações que precisaram do teclado: %s", dict(self.input.fallbacks))
+        self.controls.clear()
+        if self.app and not self.attached:
+            self.app.kill()
+        self.app = None
+        self.logged_in = self.attached = False
+
+
+def create_driver(logger: Optional[logging.Logger] = None) -> DominioDriver:
+    """Cria o driver indicado por ``DOMINIO_DRIVER`` (``pywinauto`` ou ``simulado``)."""
+    kind = os.getenv("DOMINIO_DRIVER", "pywinauto").lower()
+    if kind in ("simulado", "simulated"):
+        from simulator import SimulatedDominio, SimulatedDriver
+
+        return SimulatedDriver(SimulatedDominio.from_env())
+    return PywinautoDriver(logger=logger)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict
+
+DEFAULT_FINGERPRINT_PATH = "fingerprints.sqlite3"
+
+# campos da resposta que mudam a cada consulta sem alterar o cadastro
+VOLATILE_FIELDS = ("ultima_atualizacao", "status", "extra", "billing", "fonte")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().upper()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [_normalize(item) for item in value]
+        # a ordem de sócios e atividades na resposta não é estável
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+def record_fingerprint(data: Dict) -> str:
+    """Hash do cadastro da Receita normalizado, ignorando campos voláteis."""
+    record = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+    payload = json.dumps(_normalize(record), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """Hash do cadastro aplicado no Domínio por CNPJ, em SQLite.
+
+    Guarda, para cada CNPJ, a empresa, o hash do registro da Receita usado na
+    última atualização bem-sucedida e a data em que ela foi feita. O modo
+    diferencial do ``script.py`` consulta o hash para pular empresas cujo
+    cadastro não mudou.
+    """
+
+    def __init__(self, path: str = DEFAULT_FINGERPRINT_PATH, max_age_days: float = 90) -> None:
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                cnpj TEXT PRIMARY KEY,
+                empresa TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                applied_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "FingerprintStore":
+        """Cria o armazenamento a partir das variáveis do ``.env``."""
+        return cls(
+            path=os.getenv("FINGERPRINT_PATH", DEFAULT_FINGERPRINT_PATH),
+            max_age_days=float(os.getenv("DIFERENCIAL_IDADE_MAXIMA_DIAS", "90")),
+        )
+
+    def is_current(self, cnpj: str, fingerprint: str) -> bool:
+        """O cadastro já foi aplicado com este hash há menos de ``max_age_days``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, applied_at FROM fingerprints WHERE cnpj = ?", (cnpj,)
+            ).fetchone()
+        if row is None:
+            return False
+        stored, applied_at = row
+        return stored == fingerprint and time.time() - applied_at <= self.max_age
+
+    def mark_applied(self, cnpj: str, empresa: str, fingerprint: str) -> None:
+        """Registra que o cadastro com ``fingerprint`` foi aplicado agora."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO fingerprints (cnpj, empresa, fingerprint, applied_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(cnpj) DO UPDATE SET
+                    empresa = excluded.empresa,
+                    fingerprint = excluded.fingerprint,
+                    applied_at = excluded.applied_at
+                """,
+                (cnpj, empresa, fingerprint, time.time()),
+            )
+            self._conn.commit()
+
+    def known_cnpjs(self) -> Dict[str, str]:
+        """CNPJ de cada empresa já atualizada, para antecipar as consultas."""
+        with self._lock:
+            rows = self._conn.execute("SELECT empresa, cnpj FROM fingerprints").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Set
+
+
+class ResultJournal:
+    """Diário de resultados em JSONL, gravado a cada empresa processada.
+
+    Cada linha registra o resultado de uma empresa e se ela foi concluída. O
+    arquivo só recebe acréscimos e é sincronizado em disco a cada registro,
+    então uma queda no meio da execução não perde o que já foi feito. Quando a
+    mesma empresa aparece mais de uma vez, vale o último registro.
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        if not resume and os.path.exists(path):
+            # preserva o diário da execução anterior antes de começar outro
+            os.replace(path, path + ".anterior")
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            with open(path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    # isola a linha truncada deixada por uma queda
+                    self._file.write("\n")
+
+    def record(self, result: Dict, concluida: bool) -> None:
+        line = json.dumps(
+            {
+                "empresa": result["empresa"],
+                "concluida": concluida,
+                "registrado_em": datetime.now().isoformat(timespec="seconds"),
+                "resultado": result,
+            },
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _last_offsets(self) -> Dict[str, tuple[int, bool]]:
+        # posição do último registro de cada empresa, na ordem em que apareceram
+        offsets: Dict[str, tuple[int, bool]] = {}
+        with open(self.path, "rb") as journal_file:
+            while True:
+                offset = journal_file.tell()
+                line = journal_file.readline()
+                if not line:
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # linha truncada por uma queda durante a gravação
+                    continue
+                offsets[entry["empresa"]] = (offset, entry["concluida"])
+        return offsets
+
+    def completed(self) -> Set[str]:
+        """Empresas cujo último registro indica conclusão com sucesso."""
+        return {name for name, (_, done) in self._last_offsets().items() if done}
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Percorre o último resultado de cada empresa sem carregar o diário todo."""
+        offsets = self._last_offsets()
+        with open(self.path, "rb") as journal_file:
+            for offset, _ in offsets.values():
+                journal_file.seek(offset)
+                yield json.loads(journal_file.readline())["resultado"]
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def write_json_array(path: str, entries: Iterable[Dict]) -> None:
+    """Grava ``entries`` como um array JSON, um item por vez."""
+    with open(path, "w", encoding="utf-8") as json_file:
+        json_file.write("[")
+        for index, entry in enumerate(entries):
+            json_file.write(",\n" if index else "\n")
+            json_file.write(json.dumps(entry, indent=2, ensure_ascii=False))
+        json_file.write("\n]\n")
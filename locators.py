@@ -0,0 +1,243 @@
+"""Localizadores dos controles do Domínio compilados de ``Elementos.txt``.
+
+Cada seção de ``Elementos.txt`` (propriedades copiadas do Inspect, em UTF-8 com
+quebras CRLF) traz o AutomationId, a ClassName, o ControlType e o Name de um
+controle. O arquivo não registra a hierarquia: cada controle pertence à última
+janela listada antes dele (seção com ControlType ``Window`` ou título
+``JANELA ...``). Assim cada controle é localizado pelas propriedades gravadas e
+dentro da sua janela, e não por uma busca na árvore inteira da janela principal.
+
+:class:`ControlCache` guarda o wrapper resolvido de cada controle enquanto a
+janela que o contém estiver aberta: depois da primeira busca, a consulta é uma
+checagem do handle (``IsWindow``), sem percorrer a árvore.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, NamedTuple, Optional
+
+try:  # pragma: no cover - dependência disponível apenas no Windows
+    from pywinauto import handleprops
+except ImportError:  # pragma: no cover - permite usar o simulador fora do Windows
+    handleprops = None
+
+ELEMENTOS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Elementos.txt")
+
+# nome do localizador -> título da seção em Elementos.txt
+SECTIONS: Dict[str, str] = {
+    "login": "ABA LOGIN",
+    "senha": "CAMPO SENHA",
+    "ok": "BOTÃO OK (Alt+O)",
+    "principal": "JANELA DOMÍNIO",
+    "troca_empresas": "TROCA DE EMPRESAS (F8)",
+    "pesquisar": "CAMPO PESQUISAR",
+    "empresas": "EMPRESAS EM TROCA DE EMPRESAS",
+    "botao_dados": "BOTÃO DADOS... (Alt+D)",
+    "dados": "JANELA DADOS (EMPRESA)",
+    "quadro_societario": "JANELA DADOS QUADRO SOCIETÁRIO",
+    "capital_social": "CAMPO CAPITAL SOCIAL",
+    "socios": "CAMPO SÓCIOS",
+    "fechar_dados": "BOTÃO FECHAR DADOS (ESC)",
+}
+
+# seções opcionais: usadas se estiverem em Elementos.txt, buscadas pelo driver
+# dentro da janela em que aparecem (a imagem do captcha, na atualização cadastral)
+OPTIONAL_SECTIONS: Dict[str, str] = {
+    "captcha": "IMAGEM DO CAPTCHA",
+}
+
+_SECTION_RE = re.compile(r"^-{3,}\s*(.+?)\s*-{3,}$")
+_PROPERTY_RE = re.compile(r"^([\w.]+):\s*(.*)$")
+# "UIA_EditControlTypeId (0xC354)" (Inspect) ou "Edit(50004)" (Accessibility Insights)
+_CONTROL_TYPE_RE = re.compile(r"^(?:UIA_(\w+?)ControlTypeId|(\w+)\()")
+
+
+class Locator(NamedTuple):
+    name: str
+    section: str
+    auto_id: str
+    class_name: str
+    control_type: str
+    title: str
+    parent: Optional[str]
+
+    @property
+    def is_window(self) -> bool:
+        return self.control_type == "Window" or self.section.startswith("JANELA")
+
+    @property
+    def criteria(self) -> Dict[str, str]:
+        """Critérios de ``child_window`` (backend win32) gravados no inspect."""
+        criteria = {}
+        if self.auto_id:
+            criteria["auto_id"] = self.auto_id
+        if self.class_name:
+            criteria["class_name"] = self.class_name
+        # só janelas são buscadas pelo título; o texto dos controles muda
+        if self.control_type == "Window" and self.title:
+            criteria["title"] = self.title
+        return criteria
+
+
+# controles usados pelo driver que não têm seção própria em Elementos.txt
+EXTRA_LOCATORS: Dict[str, Locator] = {
+    "cnpj": Locator("cnpj", "", "", "Edit", "Edit", "", "dados"),
+}
+
+
+def parse_elements(path: str = ELEMENTOS_PATH) -> Dict[str, Dict[str, str]]:
+    """Propriedades de cada seção de ``Elementos.txt``, na ordem do arquivo."""
+    sections: Dict[str, Dict[str, str]] = {}
+    current: Optional[Dict[str, str]] = None
+    # o modo texto converte as quebras CRLF
+    with open(path, encoding="utf-8") as elements_file:
+        for line in elements_file:
+            line = line.strip()
+            header = _SECTION_RE.match(line)
+            if header:
+                current = sections.setdefault(header.group(1), {})
+                continue
+            prop = _PROPERTY_RE.match(line)
+            if current is not None and prop and prop.group(1) not in current:
+                current[prop.group(1)] = prop.group(2).strip().strip('"')
+    return sections
+
+
+def _control_type(value: str) -> str:
+    match = _CONTROL_TYPE_RE.match(value)
+    return (match.group(1) or match.group(2)) if match else value
+
+
+class LocatorRegistry:
+    """Localizadores por nome, com a janela que contém cada controle."""
+
+    def __init__(self, locators: Dict[str, Locator]) -> None:
+        self.locators = locators
+
+    @classmethod
+    def from_file(cls, path: str = ELEMENTOS_PATH) -> "LocatorRegistry":
+        sections = parse_elements(path)
+        names = {section: name for name, section in {**SECTIONS, **OPTIONAL_SECTIONS}.items()}
+        locators: Dict[str, Locator] = {}
+        window: Optional[str] = None
+        for section, props in sections.items():
+            name = names.get(section)
+            if name is None:
+                continue
+            locator = Locator(
+                name=name,
+                section=section,
+                auto_id=props.get("AutomationId", ""),
+                class_name=props.get("ClassName", ""),
+                control_type=_control_type(props.get("ControlType", "")),
+                title=props.get("Name", ""),
+                parent=None,
+            )
+            if locator.is_window:
+                window = name
+            elif name not in OPTIONAL_SECTIONS:
+                locator = locator._replace(parent=window)
+            locators[name] = locator
+        missing = set(SECTIONS) - set(locators)
+        if missing:
+            raise ValueError(f"Seções ausentes em {path}: {', '.join(sorted(missing))}")
+        locators.update(EXTRA_LOCATORS)
+        return cls(locators)
+
+    def __getitem__(self, name: str) -> Locator:
+        return self.locators[name]
+
+    def get(self, name: str) -> Optional[Locator]:
+        return self.locators.get(name)
+
+
+class ControlCache:
+    """Wrappers resolvidos por localizador, válidos enquanto a janela existir.
+
+    ``root`` devolve a janela principal (``WindowSpecification``), onde as
+    janelas do registro são buscadas; ``app`` devolve a ``Application`` usada
+    para buscar os controles dentro da janela já resolvida. ``stats`` conta
+    ``acertos`` (wrapper em cache), ``buscas`` (busca na árvore) e
+    ``obsoletos`` (handle em cache que deixou de valer).
+    """
+
+    def __init__(
+        self, registry: LocatorRegistry, root: Callable[[], object], app: Callable[[], object]
+    ) -> None:
+        self.registry = registry
+        self._root = root
+        self._app = app
+        self._wrappers: Dict[str, object] = {}
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def _alive(wrapper) -> bool:
+        handle = getattr(wrapper, "handle", None)
+        return bool(handle) and handleprops.iswindow(handle) and handleprops.isvisible(handle)
+
+    def _spec(self, name: str):
+        locator = self.registry[name]
+        if locator.parent is None:
+            scope = self._root()
+        else:
+            scope = self._app().window(handle=self.get(locator.parent).handle)
+        return scope.child_window(**locator.criteria)
+
+    def get(self, name: str):
+        """Wrapper do controle; levanta a exceção do pywinauto se não existir."""
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            if self._alive(wrapper):
+                self.stats["acertos"] += 1
+                return wrapper
+            self.stats["obsoletos"] += 1
+            del self._wrappers[name]
+        self.stats["buscas"] += 1
+        wrapper = self._spec(name).wrapper_object()
+        # controles sem handle (só UIA) não são guardados
+        if getattr(wrapper, "handle", None):
+            self._wrappers[name] = wrapper
+        return wrapper
+
+    def find(self, name: str):
+        """Wrapper do controle, ou ``None`` se ele (ou a sua janela) não estiver aberto."""
+        try:
+            return self.get(name)
+        except Exception:
+            return None
+
+    def enabled(self, name: str):
+        wrapper = self.find(name)
+        return wrapper if wrapper is not None and wrapper.is_enabled() else None
+
+    def text(self, name: str) -> str:
+        wrapper = self.find(name)
+        return wrapper.window_text().strip() if wrapper is not None else ""
+
+    def gone(self, name: str) -> bool:
+        """A janela (ou controle) deixou de existir; com cache, sem busca na árvore."""
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return not self._alive(wrapper)
+        try:
+            return not self._spec(name).exists(timeout=0)
+        except Exception:
+            # a janela que contém o controle também fechou
+            return True
+
+    def invalidate(self, window: str) -> None:
+        """Descarta a janela fechada, os controles dela e janelas com o mesmo handle."""
+        handle = getattr(self._wrappers.get(window), "handle", None)
+        dropped = {window}
+        dropped.update(
+            name
+            for name, wrapper in self._wrappers.items()
+            if handle and getattr(wrapper, "handle", None) == handle
+        )
+        for name in list(self._wrappers):
+            if name in dropped or self.registry[name].parent in dropped:
+                del self._wrappers[name]
+
+    def clear(self) -> None:
+        self._wrappers.clear()
@@ -0,0 +1,280 @@
+"""Métricas da execução em andamento, servidas por HTTP (Prometheus e JSON).
+
+Com ``METRICAS_PORTA`` definida, ``run()`` sobe um servidor local numa thread
+em segundo plano, com dois endereços:
+
+- ``/metrics``: formato texto do Prometheus;
+- ``/status``: o mesmo retrato em JSON, para consulta direta (ou pelo navegador).
+
+São expostas as empresas concluídas, com falha e restantes, a vazão das
+últimas empresas (empresas/hora), a previsão de término e a folga até o prazo,
+as fases em andamento (com a empresa e há quanto tempo), as chamadas aos
+provedores de CNPJ e ao 2Captcha, histogramas de duração por fase e a cota
+restante de cada provedor.
+
+Exemplo::
+
+    METRICAS_PORTA=9464 python script.py
+    curl http://127.0.0.1:9464/status
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from run_history import is_failure
+
+# janela da vazão móvel, em segundos
+ROLLING_WINDOW = 900.0
+
+# limites dos histogramas de duração por fase, em segundos
+LATENCY_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 150.0)
+
+
+class RunProgress:
+    """Empresas planejadas e concluídas na execução, com a vazão móvel.
+
+    Cada empresa conta uma vez, na primeira vez que o resultado é gravado;
+    o status é atualizado nas gravações seguintes (consulta concluída, nova
+    tentativa).
+    """
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._finished: deque = deque()
+        self.total = 0
+        self.statuses: Dict[str, str] = {}
+
+    def start(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+            self._started = self._clock()
+
+    def record(self, result: Dict) -> None:
+        with self._lock:
+            if result["empresa"] not in self.statuses:
+                self._finished.append(self._clock())
+            self.statuses[result["empresa"]] = result["status"]
+
+    def snapshot(self) -> Dict:
+        now = self._clock()
+        with self._lock:
+            while self._finished and now - self._finished[0] > ROLLING_WINDOW:
+                self._finished.popleft()
+            recent = len(self._finished)
+            done = len(self.statuses)
+            failed = sum(is_failure(status) for status in self.statuses.values())
+            window = min(ROLLING_WINDOW, now - self._started)
+        remaining = max(self.total - done, 0)
+        per_hour = recent * 3600 / window if window > 0 else 0.0
+        return {
+            "planejadas": self.total,
+            "concluidas": done,
+            "falhas": failed,
+            "restantes": remaining,
+            "por_hora": round(per_hour, 1),
+            "eta_segundos": round(remaining * 3600 / per_hour) if per_hour > 0 else None,
+        }
+
+
+def collect(session) -> Dict:
+    """Retrato da sessão em andamento (``DominioSession``)."""
+    progress = session.progress.snapshot()
+    now = datetime.now()
+    eta = progress["eta_segundos"]
+    deadline = session.scheduler.deadline
+    if eta is not None:
+        progress["termino_previsto"] = (now + timedelta(seconds=eta)).isoformat(
+            timespec="seconds"
+        )
+    if deadline is not None:
+        progress["prazo"] = deadline.isoformat(timespec="seconds")
+        if eta is not None:
+            progress["folga_segundos"] = round((deadline - now).total_seconds() - eta)
+
+    providers = []
+    for provider in session.lookup_worker.providers:
+        tokens = provider.limiter.available()
+        providers.append(
+            {
+                "provedor": provider.name,
+                **provider.health(),
+                "fichas": round(tokens, 3),
+                "espera_ficha": round(
+                    max(1 - tokens, 0) * provider.limiter.per / provider.limiter.rate, 1
+                ),
+            }
+        )
+    solver = getattr(session, "captcha_solver", None)
+    captcha = None
+    if solver is not None:
+        captcha = {
+            "chamadas": dict(solver.calls),
+            "disjuntor": solver.breaker.state,
+            "pausa_segundos": round(solver.breaker.retry_after(), 1),
+        }
+    return {
+        "modo": session.run_mode,
+        "inicio": session.started_at.isoformat(timespec="seconds"),
+        "empresas": progress,
+        "empresa_atual": session.current_company,
+        "fases_ativas": session.tracer.active(),
+        "provedores_cnpj": providers,
+        "captcha": captcha,
+        "novas_tentativas": len(session.retries),
+        "fases": session.tracer.summary(),
+    }
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus(status: Dict, durations: Dict[str, List[float]]) -> str:
+    """Métricas no formato texto do Prometheus (versão 0.0.4)."""
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    empresas = status["empresas"]
+    metric("dominio_empresas_planejadas", "gauge", "Empresas na fila da execução",
+           [({}, empresas["planejadas"])])
+    metric("dominio_empresas_concluidas_total", "counter", "Empresas processadas",
+           [({}, empresas["concluidas"])])
+    metric("dominio_empresas_falhas_total", "counter", "Empresas com falha",
+           [({}, empresas["falhas"])])
+    metric("dominio_empresas_restantes", "gauge", "Empresas ainda não processadas",
+           [({}, empresas["restantes"])])
+    metric("dominio_empresas_por_hora", "gauge", "Vazão nos últimos 15 minutos",
+           [({}, empresas["por_hora"])])
+    if empresas["eta_segundos"] is not None:
+        metric("dominio_eta_segundos", "gauge", "Previsão de término, em segundos",
+               [({}, empresas["eta_segundos"])])
+    if "folga_segundos" in empresas:
+        metric("dominio_prazo_folga_segundos", "gauge",
+               "Tempo entre o término previsto e o prazo (negativo: atraso)",
+               [({}, empresas["folga_segundos"])])
+    metric("dominio_fase_ativa_segundos", "gauge", "Fases em andamento e há quanto tempo",
+           [({"fase": span["fase"], "empresa": span["empresa"] or ""}, span["segundos"])
+            for span in status["fases_ativas"]])
+    metric("dominio_novas_tentativas_pendentes", "gauge", "Empresas adiadas para o fim da passada",
+           [({}, status["novas_tentativas"])])
+
+    providers = status["provedores_cnpj"]
+    metric("dominio_cnpj_consultas_total", "counter", "Consultas de CNPJ por provedor",
+           [({"provedor": p["provedor"]}, p["consultas"]) for p in providers])
+    metric("dominio_cnpj_falhas_total", "counter", "Consultas de CNPJ com falha por provedor",
+           [({"provedor": p["provedor"]}, p["falhas"]) for p in providers])
+    metric("dominio_cota_fichas", "gauge", "Fichas disponíveis no limitador do provedor",
+           [({"provedor": p["provedor"]}, p["fichas"]) for p in providers])
+    metric("dominio_cota_espera_segundos", "gauge", "Espera até a próxima ficha do provedor",
+           [({"provedor": p["provedor"]}, p["espera_ficha"]) for p in providers])
+    breakers = [({"servico": p["provedor"]}, int(p["disjuntor"] != "fechado")) for p in providers]
+
+    captcha = status["captcha"]
+    if captcha is not None:
+        metric("dominio_captcha_chamadas_total", "counter", "Chamadas ao 2Captcha por tipo",
+               [({"chamada": call}, count) for call, count in sorted(captcha["chamadas"].items())])
+        breakers.append(({"servico": "2captcha"}, int(captcha["disjuntor"] != "fechado")))
+    metric("dominio_disjuntor_aberto", "gauge",
+           "Serviço pausado pelo disjuntor (1) ou liberado (0)", breakers)
+
+    lines.append("# HELP dominio_fase_segundos Duração de cada fase")
+    lines.append("# TYPE dominio_fase_segundos histogram")
+    for fase, values in sorted(durations.items()):
+        for bound in LATENCY_BUCKETS:
+            count = sum(value <= bound for value in values)
+            lines.append(f"dominio_fase_segundos_bucket{_labels(fase=fase, le=bound)} {count}")
+        lines.append(f"dominio_fase_segundos_bucket{_labels(fase=fase, le='+Inf')} {len(values)}")
+        lines.append(f"dominio_fase_segundos_sum{_labels(fase=fase)} {sum(values):.3f}")
+        lines.append(f"dominio_fase_segundos_count{_labels(fase=fase)} {len(values)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Servidor HTTP das métricas de uma sessão, numa thread em segundo plano."""
+
+    def __init__(
+        self,
+        session,
+        port: int,
+        host: str = "127.0.0.1",
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.session = session
+        self.address = (host, port)
+        self.logger = logger or logging.getLogger(__name__)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def from_env(cls, session) -> Optional["MetricsServer"]:
+        port = os.getenv("METRICAS_PORTA", "")
+        if not port:
+            return None
+        return cls(
+            session,
+            int(port),
+            host=os.getenv("METRICAS_HOST", "127.0.0.1"),
+            logger=session.logger,
+        )
+
+    def start(self) -> "MetricsServer":
+        session = self.session
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, body: str, content_type: str) -> None:
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = prometheus(collect(session), session.tracer.phase_durations())
+                    self._send(body, "text/plain; version=0.0.4; charset=utf-8")
+                elif path in ("/", "/status"):
+                    body = json.dumps(collect(session), ensure_ascii=False, indent=2)
+                    self._send(body, "application/json; charset=utf-8")
+                else:
+                    self.send_error(404)
+
+        try:
+            self._server = ThreadingHTTPServer(self.address, Handler)
+        except OSError as exc:
+            # as métricas são opcionais: a execução segue sem elas
+            self.logger.warning("Métricas indisponíveis em %s:%d: %s", *self.address, exc)
+            return self
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metricas", daemon=True
+        ).start()
+        self.logger.info("Métricas em http://%s:%d/metrics e /status", *self.address)
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
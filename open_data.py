@@ -0,0 +1,370 @@
+"""Consulta offline do quadro societário pelos Dados Abertos do CNPJ.
+
+A Receita Federal publica mensalmente os arquivos ``Socios*.zip`` e
+``Qualificacoes.zip`` (CSV separado por ``;``, em latin-1, sem cabeçalho).
+O importador lê os zips em fluxo, ordena os sócios por CNPJ básico em disco
+e gera dois arquivos numa subpasta versionada do destino (``indice_<n>``):
+
+- ``qsa.dat``: o quadro societário de cada CNPJ básico, uma linha JSON cada;
+- ``qsa.idx``: registros de tamanho fixo (CNPJ básico, deslocamento,
+  tamanho) em ordem, pesquisados por busca binária sobre ``mmap``.
+
+Cada zip de sócios vira um arquivo ordenado em ``runs/``, reaproveitado
+enquanto o zip não mudar; na atualização mensal só os zips novos são lidos.
+
+Cada atualização grava o índice numa pasta nova e só então troca a versão no
+``manifesto.json``. Os arquivos em uso por uma execução (mapeados em memória)
+nunca são sobrescritos, o que no Windows falharia com ``PermissionError``; as
+versões antigas são apagadas quando ninguém mais as usa.
+
+Só o quadro societário (QSA) é indexado. Os arquivos ``Estabelecimentos*.zip``
+e ``Empresas*.zip`` (situação cadastral, capital social, endereço, atividade)
+não são importados: quem precisa desses campos pede a consulta completa
+(``complete=True`` em :meth:`~receita_lookup.ReceitaLookupWorker.submit`), que
+ignora o índice e vai à rede, como no modo diferencial e na fase de resolução.
+
+Exemplo::
+
+    python open_data.py /caminho/dos/zips --destino dados_abertos
+"""
+
+import argparse
+import csv
+import heapq
+import io
+import itertools
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_OPEN_DATA_DIR = "dados_abertos"
+INDEX_FILE = "qsa.idx"
+DATA_FILE = "qsa.dat"
+MANIFEST_FILE = "manifesto.json"
+RUNS_DIR = "runs"
+VERSION_PREFIX = "indice_"
+
+# registro do índice: CNPJ básico, deslocamento e tamanho no qsa.dat
+_RECORD = struct.Struct("<IQI")
+
+# linhas ordenadas em memória antes de gravar um bloco temporário
+CHUNK_ROWS = 500_000
+
+# colunas do arquivo de Sócios usadas
+_SOCIO_CNPJ_BASICO = 0
+_SOCIO_NOME = 2
+_SOCIO_QUALIFICACAO = 4
+
+_ENCODING = "latin-1"
+
+
+def _iter_rows(path: str) -> Iterator[List[str]]:
+    """Percorre as linhas de um CSV dos Dados Abertos, compactado ou não."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as raw:
+                    text = io.TextIOWrapper(raw, encoding=_ENCODING, newline="")
+                    yield from csv.reader(text, delimiter=";")
+    else:
+        with open(path, encoding=_ENCODING, newline="") as text:
+            yield from csv.reader(text, delimiter=";")
+
+
+def _source_kind(path: str) -> Optional[str]:
+    name = os.path.basename(path).lower()
+    if "socio" in name:
+        return "socios"
+    if "qualifica" in name:
+        return "qualificacoes"
+    return None
+
+
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _clean(text: str) -> str:
+    return text.replace("\t", " ").replace("\n", " ").strip()
+
+
+def _read_manifest(directory: str) -> Dict:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"fontes": {}, "qualificacoes": {}}
+    with open(path, encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def index_dir(directory: str) -> Optional[str]:
+    """Pasta da versão atual do índice (indicada no manifesto), ou ``None``."""
+    version = _read_manifest(directory).get("versao")
+    # índices anteriores ao versionamento ficam na própria pasta de destino
+    path = os.path.join(directory, version) if version else directory
+    return path if os.path.exists(os.path.join(path, INDEX_FILE)) else None
+
+
+def _remove_old_versions(directory: str, current: str) -> None:
+    """Apaga as versões antigas; as ainda abertas por outra execução ficam para depois."""
+    stale = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith(VERSION_PREFIX) and name != current
+    ]
+    for path in stale:
+        try:
+            shutil.rmtree(path)
+        except OSError:
+            pass
+    for name in (INDEX_FILE, DATA_FILE):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def _write_sorted_run(source: str, run_path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Grava os sócios de ``source`` ordenados por CNPJ básico (ordenação externa)."""
+    chunks: List[str] = []
+    lines: List[str] = []
+    count = 0
+
+    def _flush() -> None:
+        lines.sort()
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", delete=False, dir=os.path.dirname(run_path), suffix=".tmp"
+        ) as chunk:
+            chunk.writelines(lines)
+        chunks.append(chunk.name)
+        lines.clear()
+
+    for row in _iter_rows(source):
+        if len(row) <= _SOCIO_QUALIFICACAO:
+            continue
+        basico = row[_SOCIO_CNPJ_BASICO].strip().zfill(8)
+        nome = _clean(row[_SOCIO_NOME])
+        lines.append(f"{basico}\t{nome}\t{row[_SOCIO_QUALIFICACAO].strip()}\n")
+        count += 1
+        if len(lines) >= chunk_rows:
+            _flush()
+
+    lines.sort()
+    handles = [open(path, encoding="utf-8") for path in chunks]
+    try:
+        with open(run_path + ".tmp", "w", encoding="utf-8") as run:
+            run.writelines(heapq.merge(lines, *handles))
+    finally:
+        for handle in handles:
+            handle.close()
+        for path in chunks:
+            os.remove(path)
+    os.replace(run_path + ".tmp", run_path)
+    return count
+
+
+def _build_index(runs: List[str], qualificacoes: Dict[str, str], directory: str) -> int:
+    """Intercala os arquivos ordenados e grava ``qsa.dat`` e ``qsa.idx``."""
+    data_path = os.path.join(directory, DATA_FILE)
+    index_path = os.path.join(directory, INDEX_FILE)
+    handles = [open(path, encoding="utf-8") for path in runs]
+    count = 0
+    try:
+        with open(data_path + ".tmp", "wb") as data, open(index_path + ".tmp", "wb") as index:
+            merged = heapq.merge(*handles)
+            for basico, group in itertools.groupby(merged, key=lambda line: line[:8]):
+                socios = []
+                for line in group:
+                    _, nome, code = line.rstrip("\n").split("\t")
+                    description = qualificacoes.get(code)
+                    socios.append(
+                        {"nome": nome, "qual": f"{code}-{description}" if description else code}
+                    )
+                payload = json.dumps(socios, ensure_ascii=False).encode("utf-8") + b"\n"
+                index.write(_RECORD.pack(int(basico), data.tell(), len(payload)))
+                data.write(payload)
+                count += 1
+    finally:
+        for handle in handles:
+            handle.close()
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return count
+
+
+def _expand_sources(paths: List[str]) -> List[str]:
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if _source_kind(name)
+            )
+        else:
+            sources.append(path)
+    return sources
+
+
+def import_dump(
+    paths: List[str],
+    directory: str = DEFAULT_OPEN_DATA_DIR,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, int]:
+    """Importa (ou atualiza) o índice a partir dos arquivos dos Dados Abertos.
+
+    Zips de sócios já importados, com o mesmo tamanho e data, não são lidos
+    de novo. Retorna a quantidade de sócios lidos e de CNPJs no índice.
+    """
+    runs_dir = os.path.join(directory, RUNS_DIR)
+    os.makedirs(runs_dir, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    manifest = _read_manifest(directory)
+
+    stats = {"socios_lidos": 0, "arquivos_lidos": 0, "cnpjs": 0}
+    sources: Dict[str, Dict] = {}
+    runs = []
+    changed = False
+    for path in _expand_sources(paths):
+        kind = _source_kind(path)
+        name = os.path.basename(path)
+        if kind == "qualificacoes":
+            table = {row[0].strip(): _clean(row[1]) for row in _iter_rows(path) if len(row) > 1}
+            changed |= table != manifest.get("qualificacoes")
+            manifest["qualificacoes"] = table
+            continue
+        if kind != "socios":
+            continue
+        fingerprint = _fingerprint(path)
+        run_path = os.path.join(runs_dir, name + ".run")
+        previous = manifest["fontes"].get(name)
+        if previous is None or previous["fingerprint"] != fingerprint or not os.path.exists(run_path):
+            stats["socios_lidos"] += _write_sorted_run(path, run_path, chunk_rows)
+            stats["arquivos_lidos"] += 1
+            changed = True
+        sources[name] = {"fingerprint": fingerprint}
+        runs.append(run_path)
+
+    # uma nova remessa substitui a anterior: zips ausentes deixam o índice
+    for name in set(manifest["fontes"]) - set(sources):
+        changed = True
+        stale = os.path.join(runs_dir, name + ".run")
+        if os.path.exists(stale):
+            os.remove(stale)
+    manifest["fontes"] = sources
+
+    if changed or index_dir(directory) is None:
+        generation = manifest.get("geracao", 0) + 1
+        version = f"{VERSION_PREFIX}{generation}"
+        target = os.path.join(directory, version)
+        # restos de uma importação interrompida com a mesma geração
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+        stats["cnpjs"] = _build_index(runs, manifest["qualificacoes"], target)
+        manifest["geracao"] = generation
+        manifest["versao"] = version
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        _remove_old_versions(directory, version)
+    else:
+        index = OpenDataIndex(directory)
+        try:
+            stats["cnpjs"] = len(index)
+        finally:
+            index.close()
+    return stats
+
+
+class OpenDataIndex:
+    """Índice do quadro societário gerado por :func:`import_dump`.
+
+    Os arquivos são mapeados em memória; cada consulta é uma busca binária
+    no índice seguida da leitura de uma linha, sem carregar a base na RAM.
+    """
+
+    def __init__(self, directory: str = DEFAULT_OPEN_DATA_DIR) -> None:
+        self.directory = directory
+        # a versão é fixada na abertura: uma atualização em paralelo grava outra pasta
+        path = index_dir(directory)
+        if path is None:
+            raise FileNotFoundError(f"Índice dos Dados Abertos não encontrado em {directory}")
+        self._files = []
+        self._index = self._map(os.path.join(path, INDEX_FILE))
+        self._data = self._map(os.path.join(path, DATA_FILE))
+        self._count = len(self._index) // _RECORD.size if self._index else 0
+
+    def _map(self, path: str) -> Optional[mmap.mmap]:
+        handle = open(path, "rb")
+        self._files.append(handle)
+        if os.fstat(handle.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def from_env(cls) -> Optional["OpenDataIndex"]:
+        """Abre o índice de ``OPEN_DATA_DIR``; ``None`` se não houver índice."""
+        directory = os.getenv("OPEN_DATA_DIR", DEFAULT_OPEN_DATA_DIR)
+        if not directory or not os.path.isdir(directory) or index_dir(directory) is None:
+            return None
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def qsa(self, cnpj: str) -> Optional[List[Dict]]:
+        """Quadro societário do CNPJ (pelos 8 dígitos básicos) ou ``None``."""
+        if len(cnpj) < 8 or not cnpj[:8].isdigit():
+            return None
+        key = int(cnpj[:8])
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            basico, offset, length = _RECORD.unpack_from(self._index, middle * _RECORD.size)
+            if basico < key:
+                low = middle + 1
+            elif basico > key:
+                high = middle
+            else:
+                return json.loads(self._data[offset : offset + length])
+        return None
+
+    def lookup(self, cnpj: str) -> Optional[Dict]:
+        """Resposta no formato da ReceitaWS, somente com ``qsa``, ou ``None``.
+
+        Sem ``capital_social`` nem os demais campos do estabelecimento: a
+        conciliação não compara o capital das empresas respondidas aqui.
+        """
+        socios = self.qsa(cnpj)
+        if socios is None:
+            return None
+        return {"cnpj": cnpj, "qsa": socios, "fonte": "dados_abertos"}
+
+    def close(self) -> None:
+        for mapped in (self._index, self._data):
+            if mapped is not None:
+                mapped.close()
+        for handle in self._files:
+            handle.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Importa os Dados Abertos do CNPJ (sócios)")
+    parser.add_argument("fontes", nargs="+", help="zips/CSVs de Sócios e Qualificações ou diretórios")
+    parser.add_argument("--destino", default=os.getenv("OPEN_DATA_DIR", DEFAULT_OPEN_DATA_DIR))
+    parser.add_argument("--bloco", type=int, default=CHUNK_ROWS, help="linhas por bloco ordenado")
+    args = parser.parse_args()
+    stats = import_dump(args.fontes, args.destino, chunk_rows=args.bloco)
+    print(
+        f"Arquivos lidos: {stats['arquivos_lidos']}  sócios: {stats['socios_lidos']}  "
+        f"CNPJs no índice: {stats['cnpjs']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Atualização cadastral em várias sessões do Domínio ao mesmo tempo.
+
+O processo coordenador abre o Domínio uma vez para ler a lista de empresas e
+a coloca numa fila compartilhada. Cada sessão é um processo com o seu próprio
+Domínio, que retira a próxima empresa da fila assim que termina a anterior,
+de modo que sessões mais rápidas processam mais empresas. As cotas da
+consulta de CNPJ (de cada provedor) e do 2Captcha valem para todas as sessões
+juntas, e os diários de cada sessão são reunidos no diário e nos logs do
+coordenador ao final.
+
+Com ``METRICAS_PORTA`` só o coordenador serve as métricas (``metrics.py``):
+cada sessão repassa os resultados por uma fila, e o progresso, a vazão e a
+previsão de término são os da carteira inteira.
+
+Exemplo::
+
+    python script.py --sessoes 3
+"""
+
+import multiprocessing
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from journal import ResultJournal
+from metrics import MetricsServer, RunProgress
+from rate_limit import SharedTokenBucket
+from pipeline import STATUS_CONCLUIDOS
+from script import DominioAutomation
+
+# arquivos temporários de cada sessão, reunidos ao final
+SESSION_JOURNAL = "journal_atualizacao.sessao{index}.jsonl"
+SESSION_TRACE = "trace_atualizacao.sessao{index}.json"
+
+
+class _SessionProgress(RunProgress):
+    """Progresso de uma sessão que repassa cada resultado ao coordenador."""
+
+    def __init__(self, results) -> None:
+        super().__init__()
+        self._results = results
+
+    def record(self, result: Dict) -> None:
+        super().record(result)
+        self._results.put({"empresa": result["empresa"], "status": result["status"]})
+
+
+def _session_worker(
+    index: int,
+    queue,
+    results,
+    lookup_limiters: Dict[str, SharedTokenBucket],
+    captcha_slots,
+    resume: bool,
+    differential: Optional[bool],
+    deadline: Optional[datetime],
+    setup: Optional[Callable[[DominioAutomation], None]],
+) -> None:
+    """Processa empresas da fila numa sessão própria do Domínio."""
+    # as métricas são servidas pelo coordenador; vazia (e não removida) para
+    # que o load_dotenv da sessão não a leia de novo do .env
+    os.environ["METRICAS_PORTA"] = ""
+    automation = DominioAutomation(
+        resume=resume,
+        journal_path=SESSION_JOURNAL.format(index=index),
+        differential=differential,
+    )
+    for provider in automation.lookup_worker.providers:
+        provider.limiter = lookup_limiters[provider.name]
+    # só o coordenador pode usar um Domínio já aberto; cada sessão abre o seu
+    automation.attach = False
+    automation.captcha_solver.slots = captcha_slots
+    automation.scheduler.deadline = deadline
+    automation.scheduler.load_history(automation.run_mode)
+    automation.progress = _SessionProgress(results)
+    if setup is not None:
+        setup(automation)
+
+    # uma sessão que não consegue logar deixa a fila para as demais
+    if automation.start_session():
+        # cada Domínio monta o próprio índice de posições da lista de empresas
+        automation.get_companies_list()
+        automation.lookup_worker.start()
+        while True:
+            company = queue.get()
+            if company is None:
+                break
+            # perto do prazo a fila é esvaziada sem processar; o coordenador
+            # grava as que sobraram para a próxima execução
+            if not automation.scheduler.out_of_time(company):
+                automation.process_company(company)
+        automation.drain_retries()
+    automation.finish(save_logs=False)
+    automation.tracer.export_chrome_trace(SESSION_TRACE.format(index=index))
+
+
+class SessionOrchestrator:
+    """Distribui as empresas entre ``sessions`` processos do Domínio.
+
+    ``setup`` (opcional, precisa ser serializável) é chamado com o
+    :class:`~script.DominioAutomation` de cada sessão antes do login; o
+    benchmark o usa para ajustar os tempos do 2Captcha.
+    """
+
+    def __init__(
+        self,
+        sessions: int,
+        resume: bool = False,
+        time_scale: float = 1.0,
+        captcha_slots: Optional[int] = None,
+        setup: Optional[Callable[[DominioAutomation], None]] = None,
+        differential: Optional[bool] = None,
+        deadline: Optional[datetime] = None,
+    ) -> None:
+        self.sessions = sessions
+        self.resume = resume
+        self.differential = differential
+        # fator aplicado ao período dos limitadores (usado pelo benchmark)
+        self.time_scale = time_scale
+        self.captcha_slots = captcha_slots or int(os.getenv("CAPTCHA_SIMULTANEOS", "4"))
+        self.setup = setup
+        self.deadline = deadline
+        self.coordinator: Optional[DominioAutomation] = None
+
+    @property
+    def journal(self) -> ResultJournal:
+        return self.coordinator.journal
+
+    def _session_paths(self, pattern: str) -> List[str]:
+        return [pattern.format(index=index) for index in range(self.sessions)]
+
+    def _done_in_sessions(self) -> set:
+        """Empresas concluídas nos diários de sessões de uma execução interrompida."""
+        done = set()
+        for path in self._session_paths(SESSION_JOURNAL):
+            if os.path.exists(path):
+                journal = ResultJournal(path, resume=True)
+                done |= journal.completed()
+                journal.close()
+        return done
+
+    def _merge_sessions(self) -> set:
+        """Reúne diários e traces das sessões no coordenador e remove os arquivos.
+
+        Devolve as empresas processadas pelas sessões.
+        """
+        processed = set()
+        for path in self._session_paths(SESSION_JOURNAL):
+            if not os.path.exists(path):
+                continue
+            journal = ResultJournal(path, resume=True)
+            for entry in journal.iter_results():
+                self.journal.record(entry, concluida=entry["status"] in STATUS_CONCLUIDOS)
+                processed.add(entry["empresa"])
+            journal.close()
+            os.remove(path)
+        for path in self._session_paths(SESSION_TRACE):
+            if os.path.exists(path):
+                self.coordinator.tracer.load_chrome_trace(path)
+                os.remove(path)
+        return processed
+
+    def _collect_progress(self, results) -> None:
+        """Soma ao progresso do coordenador os resultados repassados pelas sessões."""
+        for result in iter(results.get, None):
+            self.coordinator.progress.record(result)
+
+    def run(self) -> None:
+        self.coordinator = coordinator = DominioAutomation(
+            resume=self.resume, differential=self.differential
+        )
+        if not coordinator.start_session():
+            return
+        companies = coordinator.get_companies_list()
+        # o coordenador só lê a lista; cada sessão abre o seu próprio Domínio
+        coordinator.driver.close()
+
+        done = set()
+        if self.resume:
+            done = coordinator.journal.completed() | self._done_in_sessions()
+        if self.deadline is not None:
+            coordinator.scheduler.deadline = self.deadline
+        coordinator.scheduler.sessions = self.sessions
+        companies = coordinator.pending_companies(companies, done)
+        print(f"Processando {len(companies)} empresas em {self.sessions} sessões")
+
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        for company in companies:
+            queue.put(company)
+        for _ in range(self.sessions):
+            queue.put(None)
+        lookup_limiters = {
+            provider.name: SharedTokenBucket(
+                provider.limiter.rate, per=provider.limiter.per * self.time_scale, ctx=ctx
+            )
+            for provider in coordinator.lookup_worker.providers
+        }
+        captcha_slots = ctx.BoundedSemaphore(self.captcha_slots)
+        # as fichas mostradas nas métricas são as da cota compartilhada
+        for provider in coordinator.lookup_worker.providers:
+            provider.limiter = lookup_limiters[provider.name]
+        results = ctx.Queue()
+        collector = threading.Thread(
+            target=self._collect_progress, args=(results,), name="progresso", daemon=True
+        )
+        collector.start()
+        coordinator.progress.start(len(companies))
+        metrics = MetricsServer.from_env(coordinator)
+        if metrics:
+            metrics.start()
+
+        processes = [
+            ctx.Process(
+                target=_session_worker,
+                args=(
+                    index,
+                    queue,
+                    results,
+                    lookup_limiters,
+                    captcha_slots,
+                    self.resume,
+                    self.differential,
+                    coordinator.scheduler.deadline,
+                    self.setup,
+                ),
+                name=f"sessao-{index}",
+            )
+            for index in range(self.sessions)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                if process.exitcode:
+                    print(f"{process.name} terminou com código {process.exitcode}")
+        finally:
+            results.put(None)
+            collector.join()
+            if metrics:
+                metrics.stop()
+
+        coordinator.scheduler.save_carryover(self._merge_sessions())
+        coordinator.lookup_worker.stop()
+        coordinator.close_resources()
+        coordinator.save_logs()
+        coordinator.journal.close()
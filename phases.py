@@ -0,0 +1,361 @@
+"""Atualização cadastral em três fases separadas.
+
+1. ``colher``: percorre a lista de empresas uma vez e grava, sem trocar de
+   empresa, o CNPJ, o capital social e os sócios exibidos no Domínio;
+2. ``resolver``: consulta todos os CNPJs colhidos, sem interface, no ritmo
+   máximo permitido pela cota (respostas em cache saem na hora);
+3. ``aplicar``: volta ao Domínio só nas empresas cujo cadastro na Receita
+   mudou desde a última atualização (ver ``fingerprints.py``).
+
+Cada fase grava o resultado em ``fases.sqlite3`` e pode ser executada
+sozinha, em outro horário ou retomada: ``resolver`` só consulta CNPJs ainda
+não resolvidos desde a última colheita, e ``colher``/``aplicar`` aceitam
+``--resume``.
+
+Exemplo::
+
+    python phases.py colher
+    python phases.py resolver
+    python phases.py aplicar
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from dominio_core import DominioSession
+from drivers import DominioDriver
+from fingerprints import record_fingerprint
+from pipeline import DominioPipeline
+from receita_lookup import ReceitaLookupWorker
+from scheduler import parse_deadline
+from tracing import Tracer
+
+DEFAULT_PHASES_PATH = "fases.sqlite3"
+
+JOURNAL_COLHEITA = "journal_fase_colheita.jsonl"
+JOURNAL_APLICACAO = "journal_fase_aplicacao.jsonl"
+
+STATUS_COLHIDA = "Colhida"
+
+
+class PhaseStore:
+    """Tabela local com o resultado da colheita e da resolução de cada empresa."""
+
+    def __init__(self, path: str = DEFAULT_PHASES_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS empresas (
+                empresa TEXT PRIMARY KEY,
+                cnpj TEXT NOT NULL,
+                capital_social TEXT NOT NULL,
+                socios_dominio TEXT NOT NULL,
+                colhido_em REAL NOT NULL,
+                receita TEXT,
+                fingerprint TEXT,
+                erro_consulta TEXT,
+                resolvido_em REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "PhaseStore":
+        return cls(os.getenv("FASES_PATH", DEFAULT_PHASES_PATH))
+
+    def save_harvest(self, empresa: str, cnpj: str, fields: Dict) -> None:
+        """Grava o que foi lido no Domínio, mantendo a resolução anterior."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO empresas (empresa, cnpj, capital_social, socios_dominio, colhido_em)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(empresa) DO UPDATE SET
+                    cnpj = excluded.cnpj,
+                    capital_social = excluded.capital_social,
+                    socios_dominio = excluded.socios_dominio,
+                    colhido_em = excluded.colhido_em
+                """,
+                (
+                    empresa,
+                    cnpj,
+                    fields.get("capital_social", ""),
+                    json.dumps(fields.get("socios", []), ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def pending_resolution(self, redo: bool = False) -> List[tuple]:
+        """``(empresa, cnpj)`` sem resolução desde a última colheita (ou todas)."""
+        query = "SELECT empresa, cnpj FROM empresas WHERE cnpj != ''"
+        if not redo:
+            query += " AND (resolvido_em IS NULL OR resolvido_em < colhido_em)"
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY empresa").fetchall()
+
+    def save_resolution(
+        self, cnpj: str, data: Optional[Dict] = None, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE empresas
+                SET receita = ?, fingerprint = ?, erro_consulta = ?, resolvido_em = ?
+                WHERE cnpj = ?
+                """,
+                (
+                    json.dumps(data, ensure_ascii=False) if data is not None else None,
+                    record_fingerprint(data) if data is not None else None,
+                    error,
+                    time.time(),
+                    cnpj,
+                ),
+            )
+            self._conn.commit()
+
+    def rows(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT empresa, cnpj, capital_social, socios_dominio, receita, fingerprint"
+                " FROM empresas"
+            ).fetchall()
+        return [
+            {
+                "empresa": empresa,
+                "cnpj": cnpj,
+                "capital_social": capital,
+                "socios_dominio": json.loads(socios),
+                "receita": json.loads(receita) if receita else None,
+                "fingerprint": fingerprint,
+            }
+            for empresa, cnpj, capital, socios, receita, fingerprint in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ----------------------------------------------------------------------
+# Fase 1: colheita
+# ----------------------------------------------------------------------
+class HarvestPhase(DominioSession):
+    """Lê CNPJ, capital social e sócios de cada empresa pela Troca de empresas."""
+
+    run_mode = "fase_colheita"
+
+    def __init__(
+        self,
+        store: Optional[PhaseStore] = None,
+        resume: bool = False,
+        driver: Optional[DominioDriver] = None,
+    ) -> None:
+        super().__init__(JOURNAL_COLHEITA, resume=resume, driver=driver)
+        self.store = store or PhaseStore.from_env()
+
+    def process_company(self, company: str) -> None:
+        self.current_company = company
+        result = {"empresa": company, "cnpj": "", "status": "Erro", "observacoes": ""}
+        with self._span("empresa"):
+            self._harvest(company, result)
+        self._record(result)
+        self.current_company = None
+
+    def _harvest(self, company: str, result: Dict) -> None:
+        try:
+            # abre a Troca de empresas e o botão Dados... sem confirmar a troca
+            with self._span("troca_dados"):
+                self.driver.open_switcher_data(company)
+        except LookupError:
+            result["status"] = result["observacoes"] = "Empresa não encontrada"
+            return
+        except Exception as exc:
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.defer(company, "interface")
+            return
+        try:
+            with self._span("ler_dados"):
+                result["cnpj"] = self.driver.read_cnpj()
+                fields = self.driver.read_company_fields()
+            with self._span("fechar_janelas"):
+                self.driver.close_data_and_switcher()
+        except Exception as exc:
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.driver.escape()
+            self.defer(company, "interface")
+            return
+        self.store.save_harvest(company, result["cnpj"], fields)
+        result["status"] = STATUS_COLHIDA
+
+    def is_completed(self, result: Dict) -> bool:
+        return result["status"] == STATUS_COLHIDA
+
+    def close_resources(self) -> None:
+        self.store.close()
+
+    def save_logs(self) -> None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        trace_name = f"trace_{self.run_mode}_{timestamp}.json"
+        self.tracer.export_chrome_trace(trace_name)
+        self.record_history(timestamp)
+        self.logger.info("Colheita gravada em %s; trace em %s", self.store.path, trace_name)
+        self.logger.info("Tempo por fase:\n%s", self.tracer.format_summary())
+
+
+# ----------------------------------------------------------------------
+# Fase 2: resolução
+# ----------------------------------------------------------------------
+class ResolvePhase:
+    """Consulta os CNPJs colhidos, sem interface, e grava as respostas.
+
+    Todas as consultas são entregues de uma vez ao ``lookup_worker``, que as
+    executa no ritmo da cota; cada resposta é gravada assim que chega, então
+    uma execução interrompida continua de onde parou.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PhaseStore] = None,
+        lookup_worker: Optional[ReceitaLookupWorker] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.logger = logger or logging.getLogger(__name__)
+        self.tracer = Tracer()
+        self.store = store or PhaseStore.from_env()
+        self.lookup_worker = lookup_worker or ReceitaLookupWorker.from_env(
+            logger=self.logger, tracer=self.tracer
+        )
+
+    def run(self, redo: bool = False) -> Dict[str, int]:
+        pending = self.store.pending_resolution(redo)
+        print(f"Resolvendo {len(pending)} CNPJs")
+        stats = {"resolvidos": 0, "erros": 0}
+        # os callbacks rodam nas threads do worker, ao mesmo tempo
+        stats_lock = threading.Lock()
+
+        def _save(cnpj: str, future: Future) -> None:
+            try:
+                self.store.save_resolution(cnpj, data=future.result())
+                outcome = "resolvidos"
+            except Exception as exc:
+                self.store.save_resolution(cnpj, error=str(exc))
+                outcome = "erros"
+            with stats_lock:
+                stats[outcome] += 1
+
+        self.lookup_worker.start()
+        for empresa, cnpj in pending:
+            # --refazer consulta de novo mesmo os CNPJs com resposta no cache
+            future = self.lookup_worker.submit(cnpj, empresa, complete=True, refresh=redo)
+            future.add_done_callback(lambda fut, cnpj=cnpj: _save(cnpj, fut))
+        self.lookup_worker.drain()
+        # o stop aguarda as threads do worker, e com elas os últimos callbacks
+        self.lookup_worker.stop()
+        self.store.close()
+        print(f"CNPJs resolvidos: {stats['resolvidos']}  erros: {stats['erros']}")
+        return stats
+
+
+# ----------------------------------------------------------------------
+# Fase 3: aplicação
+# ----------------------------------------------------------------------
+class ApplyPhase(DominioPipeline):
+    """Atualiza no Domínio só as empresas com cadastro alterado na Receita.
+
+    As respostas da fase 2 são entregues ao ``lookup_worker`` antes de
+    começar, então nenhuma consulta é repetida.
+    """
+
+    def __init__(
+        self,
+        store: Optional[PhaseStore] = None,
+        resume: bool = False,
+        driver: Optional[DominioDriver] = None,
+    ) -> None:
+        super().__init__(
+            update=True,
+            consulta=False,
+            resume=resume,
+            driver=driver,
+            journal_path=JOURNAL_APLICACAO,
+            differential=False,
+        )
+        self.store = store or PhaseStore.from_env()
+        self.rows: Dict[str, Dict] = {}
+
+    def needs_update(self, row: Dict) -> bool:
+        # sem resolução não há como comparar; a empresa é atualizada
+        if row["fingerprint"] is None:
+            return True
+        return not self.fingerprints.is_current(row["cnpj"], row["fingerprint"])
+
+    def pending_companies(self, companies: List[str], done: Set[str]) -> List[str]:
+        self.rows = {row["empresa"]: row for row in self.store.rows()}
+        selected = [c for c in companies if c in self.rows and self.needs_update(self.rows[c])]
+        print(f"{len(selected)} de {len(self.rows)} empresas colhidas precisam de atualização")
+        return super().pending_companies(selected, done)
+
+    def before_companies(self, companies: List[str]) -> None:
+        for company in companies:
+            row = self.rows[company]
+            if row["receita"] is not None:
+                self.lookup_worker.preload(row["cnpj"], row["receita"])
+
+    def _new_result(self, company: str) -> Dict:
+        result = super()._new_result(company)
+        if company in self.rows:
+            result["socios_dominio"] = self.rows[company]["socios_dominio"]
+            result["capital_social_dominio"] = self.rows[company]["capital_social"]
+        return result
+
+    def close_resources(self) -> None:
+        super().close_resources()
+        self.store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Atualização cadastral em três fases")
+    commands = parser.add_subparsers(dest="fase", required=True)
+    colher = commands.add_parser("colher", help="fase 1: lê CNPJ e sócios no Domínio")
+    colher.add_argument("--resume", action="store_true", help="pula empresas já colhidas")
+    colher.add_argument("--anexar", action="store_true", help="usa o Domínio já aberto e logado")
+    colher.add_argument("--prazo", help="horário limite (HH:MM ou data e hora ISO)")
+    resolver = commands.add_parser("resolver", help="fase 2: consulta os CNPJs, sem interface")
+    resolver.add_argument(
+        "--refazer",
+        action="store_true",
+        help="consulta de novo CNPJs já resolvidos, sem usar o cache de CNPJ",
+    )
+    aplicar = commands.add_parser("aplicar", help="fase 3: atualiza as empresas alteradas")
+    aplicar.add_argument("--resume", action="store_true", help="pula empresas já atualizadas")
+    aplicar.add_argument("--anexar", action="store_true", help="usa o Domínio já aberto e logado")
+    aplicar.add_argument("--prazo", help="horário limite (HH:MM ou data e hora ISO)")
+    args = parser.parse_args()
+
+    if args.fase == "resolver":
+        ResolvePhase().run(redo=args.refazer)
+        return
+    phase_class = HarvestPhase if args.fase == "colher" else ApplyPhase
+    phase = phase_class(resume=args.resume)
+    phase.attach = phase.attach or args.anexar
+    if args.prazo:
+        phase.scheduler.deadline = parse_deadline(args.prazo)
+    phase.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,543 @@
+"""Atualização cadastral e consulta societária numa única passada.
+
+Cada empresa é visitada uma vez: o CNPJ é lido uma vez, a consulta da
+Receita é feita uma vez e o mesmo resultado alimenta a conferência do quadro
+societário e a atualização cadastral. ``script.py`` e
+``consulta_societaria.py`` são os modos só de atualização e só de consulta.
+
+Exemplo::
+
+    python pipeline.py --resume
+"""
+
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from captcha import CaptchaAnswer, CaptchaError, CaptchaSolver
+from captcha_image import CaptureGuard
+from dominio_core import DominioSession, env_flag
+from drivers import DominioDriver
+from fingerprints import FingerprintStore, record_fingerprint
+from journal import write_json_array
+from providers import CnpjNotFound
+from receita_lookup import attach_shareholders
+from reconciliation import (
+    MOMENTOS,
+    export_reconciliation,
+    reconcile_stream,
+    result_annotator,
+)
+from scheduler import parse_deadline
+
+# diário gravado a cada empresa, usado pelo --resume
+JOURNAL_PATH = "journal_pipeline.jsonl"
+
+STATUS_SUCESSO = "Atualizada com sucesso"
+STATUS_SEM_ALTERACOES = "Sem alterações na Receita"
+STATUS_CONSULTADA = "Consultada"
+STATUS_NAO_ENCONTRADA = "Empresa não encontrada"
+# falha da interface na Troca de empresas (a empresa está na lista)
+STATUS_ERRO_SELECAO = "Erro na seleção da empresa"
+# status da consulta sem resposta; o provedor e o erro ficam em ``erro_consulta``
+STATUS_ERRO_CONSULTA = "Erro na consulta do CNPJ"
+
+# status de atualização que o --resume considera concluídos
+STATUS_CONCLUIDOS = (STATUS_SUCESSO, STATUS_SEM_ALTERACOES)
+
+# fases do tracer somadas por empresa nas colunas de tempo dos CSVs
+CSV_TIME_COLUMNS = {
+    "empresa": "Tempo Total (s)",
+    "selecionar_empresa": "Tempo Seleção (s)",
+    "captcha": "Tempo Captcha (s)",
+    "importar": "Tempo Importação (s)",
+    "gravar": "Tempo Gravação (s)",
+    "receitaws": "Tempo ReceitaWS (s)",
+}
+CSV_TIME_COLUMNS_CONSULTA = {
+    "empresa": "Tempo Total (s)",
+    "troca_dados": "Tempo Troca/Dados (s)",
+    "ler_cnpj": "Tempo CNPJ (s)",
+    "receitaws": "Tempo ReceitaWS (s)",
+}
+# na passada única o CNPJ é lido após trocar de empresa (Alt+D)
+CSV_TIME_COLUMNS_CONSULTA_PASSADA_UNICA = {
+    "empresa": "Tempo Total (s)",
+    "selecionar_empresa": "Tempo Troca/Dados (s)",
+    "dados": "Tempo CNPJ (s)",
+    "receitaws": "Tempo ReceitaWS (s)",
+}
+
+
+def _observations(entry: Dict) -> str:
+    """Observações do resultado, seguidas do erro da consulta do CNPJ, se houver."""
+    observacoes = entry.get("observacoes", "")
+    if entry.get("erro_consulta"):
+        return f"{observacoes} {STATUS_ERRO_CONSULTA}: {entry['erro_consulta']}".strip()
+    return observacoes
+
+
+def _times(entry: Dict, columns: Dict[str, str]) -> Dict[str, str]:
+    tempos = entry.get("tempos", {})
+    return {column: f"{tempos.get(phase, 0.0):.1f}" for phase, column in columns.items()}
+
+
+class DominioPipeline(DominioSession):
+    """Visita cada empresa uma vez, atualizando e/ou conferindo os sócios.
+
+    - ``update``: fluxo de atualização cadastral (Alt+U, captcha, Alt+I, Alt+G);
+    - ``consulta``: conferência do quadro societário com o status próprio e
+      o log ``log_consulta_socios``.
+
+    Sem ``update`` a empresa não é trocada: o CNPJ é lido pelo botão
+    ``Dados...`` da Troca de empresas.
+    """
+
+    def __init__(
+        self,
+        update: bool = True,
+        consulta: bool = True,
+        resume: bool = False,
+        driver: Optional[DominioDriver] = None,
+        journal_path: str = JOURNAL_PATH,
+        differential: Optional[bool] = None,
+    ) -> None:
+        super().__init__(journal_path, resume=resume, driver=driver)
+        self.update = update
+        self.consulta = consulta
+        if differential is None:
+            differential = env_flag("DIFERENCIAL")
+        # no modo diferencial a atualização só é aberta se o cadastro mudou
+        self.differential = update and differential
+        self.captcha_solver: Optional[CaptchaSolver] = None
+        self.captcha_guard: Optional[CaptureGuard] = None
+        self.fingerprints: Optional[FingerprintStore] = None
+        # capturas extras quando a imagem está em branco ou repetida, e o intervalo entre elas
+        self.captcha_recaptures = int(os.getenv("CAPTCHA_RECAPTURAS", "4"))
+        self.captcha_recapture_interval = 0.5
+        # relê capital social e sócios após a gravação (uma abertura extra dos dados)
+        self.reread_fields = update and env_flag("CONCILIACAO_RELER")
+        if update:
+            self.captcha_solver = CaptchaSolver.from_env(tracer=self.tracer, logger=self.logger)
+            self.captcha_guard = CaptureGuard.from_env()
+            self.fingerprints = FingerprintStore.from_env()
+
+    @property
+    def run_mode(self) -> str:
+        if self.update and self.consulta:
+            return "pipeline"
+        return "atualizacao" if self.update else "consulta_socios"
+
+    @property
+    def consulta_status_key(self) -> str:
+        # só no modo de consulta o status da conferência é o status principal
+        return "status_consulta" if self.update else "status"
+
+    def _new_result(self, company: str) -> Dict:
+        result: Dict[str, object] = {
+            "empresa": company,
+            "cnpj": "",
+            "status": "Erro" if self.update else "Pendente",
+            "socios_receita": [],
+            "observacoes": "",
+        }
+        if self.update:
+            result.update(
+                {"alteracoes": {}, "socios_dominio": [], "divergencia_societaria": False}
+            )
+            if self.consulta:
+                result["status_consulta"] = "Pendente"
+        return result
+
+    # ------------------------------------------------------------------
+    # Visita de cada empresa
+    # ------------------------------------------------------------------
+    def process_company(self, company: str) -> None:
+        self.current_company = company
+        with self._span("empresa"):
+            if self.update:
+                result = self.update_company_data(company)
+            else:
+                result = self.check_company_shareholders(company)
+        self._record(result)
+        self.current_company = None
+
+    def update_company_data(self, company: str) -> Dict:
+        """Troca para a empresa, confere os sócios e atualiza o cadastro."""
+        result = self._new_result(company)
+        try:
+            selected = self.select_company(company)
+        except Exception as exc:  # pragma: no cover - interação de UI
+            self.logger.error("Falha ao selecionar empresa %s: %s", company, exc)
+            result["status"] = STATUS_ERRO_SELECAO
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.defer(company, "interface")
+            return result
+        if not selected:
+            result["status"] = STATUS_NAO_ENCONTRADA
+            result["observacoes"] = "Empresa não selecionada"
+            return result
+
+        try:
+            result["cnpj"] = self.read_company_cnpj()
+            self.read_dominio_fields(result)
+            if result["cnpj"]:
+                # consulta a Receita em segundo plano enquanto a UI segue
+                future = self.lookup_worker.submit(
+                    result["cnpj"], company, complete=self.differential
+                )
+                if self.differential and self._unchanged(result["cnpj"], future):
+                    with self._span("fechar_dados"):
+                        self.driver.close_company_data()
+                    result["status"] = STATUS_SEM_ALTERACOES
+                    self.verify_shareholders(result)
+                    return result
+
+            # com o 2Captcha pausado a empresa é adiada sem abrir a atualização
+            pause = self.captcha_solver.breaker.retry_after()
+            if pause > 0:
+                with self._span("fechar_dados"):
+                    self.driver.close_company_data()
+                result["status"] = "Erro - 2Captcha pausado"
+                self.verify_shareholders(result)
+                self.defer(company, "captcha", delay=pause)
+                return result
+
+            # chamar atualização pelo menu
+            with self._span("abrir_atualizacao"):
+                self.driver.open_update()
+
+            # o Domínio troca o captcha quando a resposta é recusada; a nova
+            # imagem é reenviada em paralelo para reduzir a espera
+            for attempt in range(self.captcha_solver.max_attempts):
+                copies = 1 if attempt == 0 else self.captcha_solver.parallel_resubmits
+                answer = self.solve_captcha(copies)
+                if answer is None:
+                    result["status"] = "Erro - Captcha não resolvido"
+                    self.driver.escape()
+                    self.defer(company, "captcha", delay=self.captcha_solver.breaker.retry_after())
+                    return result
+
+                with self._span("importar"):
+                    self.driver.import_data()
+                if not self.driver.captcha_rejected():
+                    break
+                self.captcha_solver.report_bad(answer)
+            else:
+                result["status"] = "Erro - Captcha recusado"
+                self.driver.escape()
+                self.defer(company, "captcha")
+                return result
+
+            self.verify_shareholders(result)
+            self.save_changes()
+
+            result["status"] = STATUS_SUCESSO
+            if result["cnpj"]:
+                self._remember_fingerprint(result["cnpj"], company)
+            with self._span("fechar_atualizacao"):
+                self.driver.close_update()
+            if self.reread_fields:
+                self.reread_dominio_fields(result)
+            return result
+        except Exception as exc:  # pragma: no cover - interação de UI
+            result["status"] = f"Erro: {exc}"
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.defer(company, "interface")
+            return result
+
+    def check_company_shareholders(self, company: str) -> Dict:
+        """Lê o CNPJ pela Troca de empresas, sem trocar, e confere os sócios."""
+        result = self._new_result(company)
+        try:
+            self.logger.debug("Verificando sócios da empresa %s", company)
+            # abre a Troca de empresas e o botão Dados... sem confirmar a troca
+            with self._span("troca_dados"):
+                self.driver.open_switcher_data(company)
+        except LookupError:
+            result["status"] = STATUS_NAO_ENCONTRADA
+            result["observacoes"] = STATUS_NAO_ENCONTRADA
+            self.logger.warning("Empresa %s não encontrada", company)
+            return result
+        except Exception as exc:
+            result["status"] = "Erro"
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.defer(company, "interface")
+            return result
+        try:
+            with self._span("ler_cnpj"):
+                result["cnpj"] = self.driver.read_cnpj()
+            self.logger.debug("CNPJ obtido: %s", result["cnpj"])
+            self.read_dominio_fields(result)
+            self.verify_shareholders(result)
+
+            with self._span("fechar_janelas"):
+                self.driver.close_data_and_switcher()
+        except Exception as exc:
+            result["status"] = "Erro"
+            result["observacoes"] = str(exc)
+            self.driver.escape()
+            self.driver.escape()
+            self.defer(company, "interface")
+        return result
+
+    def read_dominio_fields(self, result: Dict, moment: str = "antes") -> None:
+        """Lê o capital social e os sócios da janela de dados aberta.
+
+        Os campos são comparados com a Receita ao final da execução
+        (``reconciliation.py``); ``moment`` é ``antes`` ou ``depois`` da importação.
+        """
+        capital_column, socios_column = MOMENTOS[moment]
+        with self._span("ler_campos"):
+            fields = self.driver.read_company_fields()
+        result[capital_column] = fields["capital_social"]
+        result[socios_column] = fields["socios"]
+
+    def reread_dominio_fields(self, result: Dict) -> None:
+        """Reabre os dados após a gravação e relê os campos importados."""
+        try:
+            with self._span("reler_dados"):
+                self.driver.open_company_data()
+            self.read_dominio_fields(result, "depois")
+            with self._span("fechar_dados"):
+                self.driver.close_company_data()
+        except Exception as exc:  # pragma: no cover - interação de UI
+            # a atualização já foi gravada; só a releitura fica de fora
+            self.logger.warning("Falha ao reler os dados de %s: %s", result["empresa"], exc)
+            self.driver.escape()
+
+    # ------------------------------------------------------------------
+    # Sócios e modo diferencial
+    # ------------------------------------------------------------------
+    def verify_shareholders(self, result: Dict, retry: bool = False) -> None:
+        """Associa ao resultado a consulta dos sócios na Receita.
+
+        A consulta roda no ``lookup_worker`` (a mesma já feita ao ler o CNPJ);
+        os sócios são preenchidos quando a resposta chegar, sem bloquear o
+        fluxo da interface. Se a consulta falhar, só ela é repetida ao final
+        da passada; com ``retry`` uma consulta que já falhou é refeita.
+        """
+        if not result.get("cnpj"):
+            return
+
+        def _done(exc) -> None:
+            if self.consulta:
+                status = STATUS_ERRO_CONSULTA if exc else STATUS_CONSULTADA
+                result[self.consulta_status_key] = status
+            self._record(result)
+            if exc is not None and not isinstance(exc, CnpjNotFound):
+                self.defer(result["empresa"], "receita", payload=result)
+
+        submit = self.lookup_worker.retry if retry else self.lookup_worker.submit
+        attach_shareholders(result, submit(result["cnpj"], result["empresa"]), on_done=_done)
+
+    def retry_company(self, company: str, kind: str, payload) -> None:
+        if kind != "receita":
+            super().retry_company(company, kind, payload)
+            return
+        # a interface já foi concluída: só a consulta é refeita
+        result = payload
+        result.pop("erro_consulta", None)
+        self.verify_shareholders(result, retry=True)
+        if result["status"] == STATUS_SUCESSO:
+            self._remember_fingerprint(result["cnpj"], company)
+
+    def _unchanged(self, cnpj: str, future) -> bool:
+        """Aguarda a consulta e compara o cadastro com o último aplicado."""
+        with self._span("comparar_receita"):
+            try:
+                data = future.result()
+            except Exception:
+                # sem a consulta não há como comparar; segue com a atualização
+                return False
+            return self.fingerprints.is_current(cnpj, record_fingerprint(data))
+
+    def _remember_fingerprint(self, cnpj: str, company: str) -> None:
+        """Grava o hash do cadastro aplicado assim que a consulta terminar."""
+
+        def _done(future) -> None:
+            if future.exception() is not None:
+                return
+            data = future.result()
+            # o índice dos Dados Abertos só traz o quadro societário
+            if data.get("fonte") != "dados_abertos":
+                self.fingerprints.mark_applied(cnpj, company, record_fingerprint(data))
+
+        self.lookup_worker.submit(cnpj, company).add_done_callback(_done)
+
+    def before_companies(self, companies: List[str]) -> None:
+        if self.differential:
+            self.prefetch(companies)
+
+    def prefetch(self, companies: List[str]) -> None:
+        """Antecipa as consultas das empresas com CNPJ conhecido de execuções anteriores."""
+        known = self.fingerprints.known_cnpjs()
+        for company in companies:
+            if company in known:
+                self.lookup_worker.submit(known[company], company, complete=True)
+
+    # ------------------------------------------------------------------
+    # Utilidades da atualização
+    # ------------------------------------------------------------------
+    def capture_captcha(self) -> bytes:
+        """Captura o captcha, repetindo enquanto a imagem estiver em branco ou repetida."""
+        for _ in range(self.captcha_recaptures + 1):
+            with self._span("captcha_captura"):
+                image = self.driver.capture_captcha()
+            reason = self.captcha_guard.check(image)
+            if reason is None:
+                return image
+            self.logger.warning(
+                "Captura do captcha %s; capturando de novo", reason.replace("_", " ")
+            )
+            time.sleep(self.captcha_recapture_interval)
+        raise CaptchaError(f"Captura do captcha {reason.replace('_', ' ')}")
+
+    def solve_captcha(self, copies: int = 1) -> Optional[CaptchaAnswer]:
+        """Resolve o captcha exibido via 2Captcha e preenche a resposta."""
+        with self._span("captcha"):
+            try:
+                # a imagem é enviada assim que a atualização abre
+                image = self.capture_captcha()
+                answer = self.captcha_solver.solve(image, copies, self.current_company)
+            except Exception as exc:
+                self.logger.error("Erro ao resolver captcha: %s", exc)
+                return None
+            self.driver.type_captcha(answer.text)
+            return answer
+
+    def save_changes(self) -> None:
+        """Dispara o atalho para gravar as alterações."""
+        with self._span("gravar"):
+            self.driver.save()
+
+    # ------------------------------------------------------------------
+    # Registro de logs
+    # ------------------------------------------------------------------
+    def is_completed(self, result: Dict) -> bool:
+        if self.update and result["status"] not in STATUS_CONCLUIDOS:
+            return False
+        if self.consulta and result.get(self.consulta_status_key) != STATUS_CONSULTADA:
+            return False
+        return True
+
+    def close_resources(self) -> None:
+        if self.captcha_solver:
+            self.captcha_solver.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+
+    def _write_update_csv(self, csv_name: str, results: Iterable[Dict]) -> None:
+        with open(csv_name, "w", newline="", encoding="utf-8") as csv_file:
+            fieldnames = ["Empresa", "CNPJ", "Status", "Alterações", "Observações"]
+            fieldnames += list(CSV_TIME_COLUMNS.values())
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer.writeheader()
+            for entry in results:
+                row = {
+                    "Empresa": entry["empresa"],
+                    "CNPJ": entry["cnpj"],
+                    "Status": entry["status"],
+                    "Alterações": len(entry.get("alteracoes", {})),
+                    "Observações": _observations(entry),
+                }
+                row.update(_times(entry, CSV_TIME_COLUMNS))
+                writer.writerow(row)
+
+    def _write_consulta_csv(self, csv_name: str, results: Iterable[Dict]) -> None:
+        if self.update:
+            time_columns = CSV_TIME_COLUMNS_CONSULTA_PASSADA_UNICA
+        else:
+            time_columns = CSV_TIME_COLUMNS_CONSULTA
+        with open(csv_name, "w", newline="", encoding="utf-8") as csv_file:
+            fieldnames = ["Empresa", "CNPJ", "Socios Receita", "Observacoes"]
+            fieldnames += list(time_columns.values())
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer.writeheader()
+            for entry in results:
+                row = {
+                    "Empresa": entry.get("empresa", ""),
+                    "CNPJ": entry.get("cnpj", ""),
+                    "Socios Receita": " | ".join(entry.get("socios_receita", [])),
+                    "Observacoes": _observations(entry),
+                }
+                row.update(_times(entry, time_columns))
+                writer.writerow(row)
+
+    def save_logs(self) -> None:
+        """Gera os arquivos CSV e JSON de cada modo ativo a partir do diário."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # conciliação da carteira inteira, em blocos lidos do diário, antes dos logs
+        field_diffs, people_diffs = reconcile_stream(self.journal.iter_results())
+        annotate = result_annotator(field_diffs, people_diffs)
+        files = export_reconciliation(field_diffs, people_diffs, timestamp)
+
+        def results() -> Iterator[Dict]:
+            # cada log percorre o diário de novo, sem manter os resultados em memória
+            return map(annotate, self.journal.iter_results())
+
+        if self.update:
+            files.append(f"log_atualizacao_dominio_{timestamp}.csv")
+            self._write_update_csv(files[-1], results())
+        if self.consulta:
+            files.append(f"log_consulta_socios_{timestamp}.csv")
+            self._write_consulta_csv(files[-1], results())
+
+        if self.update:
+            json_name = f"log_detalhado_{timestamp}.json"
+        else:
+            json_name = f"log_consulta_socios_{timestamp}.json"
+        write_json_array(json_name, results())
+        files.append(json_name)
+
+        trace_name = f"trace_{self.run_mode}_{timestamp}.json"
+        self.tracer.export_chrome_trace(trace_name)
+        files.append(trace_name)
+        self.record_history(timestamp)
+
+        self.logger.info("Logs salvos em %s", ", ".join(files))
+        if self.captcha_guard:
+            self.logger.info("Capturas de captcha descartadas: %s", self.captcha_guard.rejected)
+        self.logger.info("Tempo por fase:\n%s", self.tracer.format_summary())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Atualização cadastral e consulta societária numa única passada"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="retoma a execução anterior, pulando empresas já concluídas",
+    )
+    parser.add_argument(
+        "--diferencial",
+        action="store_true",
+        default=None,
+        help="abre a atualização somente para empresas com cadastro alterado na Receita",
+    )
+    parser.add_argument(
+        "--anexar",
+        action="store_true",
+        help="usa o Domínio já aberto e logado, sem abrir outro nem encerrá-lo ao final",
+    )
+    parser.add_argument(
+        "--prazo",
+        help="horário limite (HH:MM ou data e hora ISO); o que não couber fica para a próxima",
+    )
+    args = parser.parse_args()
+    pipeline = DominioPipeline(resume=args.resume, differential=args.diferencial)
+    pipeline.attach = pipeline.attach or args.anexar
+    if args.prazo:
+        pipeline.scheduler.deadline = parse_deadline(args.prazo)
+    pipeline.run()
+
+
+if __name__ == "__main__":
+    main()
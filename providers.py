@@ -0,0 +1,262 @@
+"""Provedores de consulta de CNPJ.
+
+Cada provedor tem o próprio limitador de taxa, disjuntor e estatísticas de
+saúde, e devolve a resposta num formato único (nomes de campo da ReceitaWS),
+para que o quadro societário e o hash do cadastro (``fingerprints.py``) não
+dependam de qual provedor respondeu:
+
+- ``receitaws``: receitaws.com.br (versão gratuita: 3 consultas/min);
+- ``brasilapi``: brasilapi.com.br;
+- ``minhareceita``: instância própria do minhareceita.org, que usa o mesmo
+  formato da BrasilAPI.
+
+Os provedores usados, em ordem de preferência, vêm de ``CNPJ_PROVEDORES``.
+"""
+
+import abc
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+
+from rate_limit import CircuitBreaker, TokenBucket
+
+RECEITAWS_URL = "https://receitaws.com.br/v1/cnpj/{cnpj}"
+BRASILAPI_URL = "https://brasilapi.com.br/api/cnpj/v1/{cnpj}"
+
+# versão gratuita da ReceitaWS: 3 consultas por minuto
+RECEITAWS_CALLS_PER_MINUTE = 3
+
+# período do limitador, com margem para a variação de latência da rede entre
+# a liberação da ficha e a chegada da requisição no servidor
+RECEITAWS_PERIOD = 61.0
+
+# limite de cada provedor: consultas (``<PROVEDOR>_CONSULTAS_POR_MINUTO``) por
+# janela de segundos (``<PROVEDOR>_PERIODO``), quando não definidos no .env
+DEFAULT_LIMITS = {
+    "receitaws": (RECEITAWS_CALLS_PER_MINUTE, RECEITAWS_PERIOD),
+    "brasilapi": (10, 60.0),
+    "minhareceita": (60, 60.0),
+}
+
+
+class CnpjNotFound(LookupError):
+    """O provedor respondeu que o CNPJ não existe; não adianta consultar outro."""
+
+
+def _digits(value) -> str:
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def _money(value) -> str:
+    """Valor monetário com duas casas, aceitando ``1000.5``, ``"1000.50"`` e ``"1.000,50"``."""
+    if value in (None, ""):
+        return ""
+    text = str(value)
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    return f"{float(text):.2f}"
+
+
+def _date(value: str) -> str:
+    """Data em ISO, aceitando ``dd/mm/aaaa`` e ``aaaa-mm-dd``."""
+    if not value:
+        return ""
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+class CnpjProvider(abc.ABC):
+    """Consulta de CNPJ num serviço HTTP, com limitador, disjuntor e saúde."""
+
+    name = ""
+
+    def __init__(
+        self,
+        url: str,
+        limiter: TokenBucket,
+        breaker: Optional[CircuitBreaker] = None,
+        timeout: float = 30,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.url = url
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        # atualizadas pelas threads de consulta e lidas por metrics.py
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.latency = 0.0
+
+    def fetch(self, cnpj: str) -> Dict:
+        """Consulta o CNPJ e devolve a resposta normalizada.
+
+        O limitador e o disjuntor são verificados por quem chama (ver
+        :class:`~receita_lookup.ReceitaLookupWorker`); aqui só o resultado é
+        registrado.
+        """
+        start = time.monotonic()
+        with self._stats_lock:
+            self.calls += 1
+        try:
+            response = self.session.get(self.url.format(cnpj=cnpj), timeout=self.timeout)
+            raw = self._parse(cnpj, response)
+        except CnpjNotFound:
+            # resposta válida do provedor: não conta como falha
+            self.breaker.record_success()
+            raise
+        except Exception:
+            with self._stats_lock:
+                self.failures += 1
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        elapsed = time.monotonic() - start
+        with self._stats_lock:
+            self.latency = elapsed if not self.latency else 0.8 * self.latency + 0.2 * elapsed
+        data = self.normalize(cnpj, raw)
+        data["fonte"] = self.name
+        return data
+
+    def _parse(self, cnpj: str, response: requests.Response) -> Dict:
+        if response.status_code == 404:
+            raise CnpjNotFound(f"CNPJ {cnpj} não encontrado ({self.name})")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} ({self.name})")
+        return response.json()
+
+    @abc.abstractmethod
+    def normalize(self, cnpj: str, raw: Dict) -> Dict:
+        """Converte a resposta do provedor para o formato comum."""
+
+    def health(self) -> Dict[str, object]:
+        with self._stats_lock:
+            calls, failures, latency = self.calls, self.failures, self.latency
+        return {
+            "consultas": calls,
+            "falhas": failures,
+            "latencia_media": round(latency, 3),
+            "disjuntor": self.breaker.state,
+        }
+
+
+class ReceitaWSProvider(CnpjProvider):
+    name = "receitaws"
+
+    def _parse(self, cnpj: str, response: requests.Response) -> Dict:
+        raw = super()._parse(cnpj, response)
+        # CNPJ inválido ou inexistente vem com HTTP 200 e status ERROR
+        if raw.get("status") == "ERROR":
+            raise CnpjNotFound(raw.get("message", f"CNPJ {cnpj} não encontrado"))
+        return raw
+
+    def normalize(self, cnpj: str, raw: Dict) -> Dict:
+        return {
+            "cnpj": _digits(raw.get("cnpj")) or cnpj,
+            "nome": raw.get("nome", ""),
+            "fantasia": raw.get("fantasia", ""),
+            "situacao": raw.get("situacao", ""),
+            "abertura": _date(raw.get("abertura", "")),
+            "natureza_juridica": _digits((raw.get("natureza_juridica") or "").split(" - ")[0]),
+            "capital_social": _money(raw.get("capital_social")),
+            "logradouro": raw.get("logradouro", ""),
+            "numero": raw.get("numero", ""),
+            "complemento": raw.get("complemento", ""),
+            "bairro": raw.get("bairro", ""),
+            "municipio": raw.get("municipio", ""),
+            "uf": raw.get("uf", ""),
+            "cep": _digits(raw.get("cep")),
+            "atividade_principal": [
+                {"code": _digits(a.get("code")), "text": a.get("text", "")}
+                for a in raw.get("atividade_principal", [])
+            ],
+            "qsa": [{"nome": s["nome"], "qual": s.get("qual", "")} for s in raw.get("qsa", [])],
+        }
+
+
+class BrasilAPIProvider(CnpjProvider):
+    name = "brasilapi"
+
+    def normalize(self, cnpj: str, raw: Dict) -> Dict:
+        tipo = raw.get("descricao_tipo_de_logradouro")
+        logradouro = " ".join(part for part in (tipo, raw.get("logradouro")) if part)
+        atividade = []
+        if raw.get("cnae_fiscal"):
+            atividade.append(
+                {"code": _digits(raw["cnae_fiscal"]), "text": raw.get("cnae_fiscal_descricao", "")}
+            )
+        return {
+            "cnpj": _digits(raw.get("cnpj")) or cnpj,
+            "nome": raw.get("razao_social", ""),
+            "fantasia": raw.get("nome_fantasia") or "",
+            "situacao": raw.get("descricao_situacao_cadastral", ""),
+            "abertura": _date(raw.get("data_inicio_atividade", "")),
+            "natureza_juridica": _digits(raw.get("codigo_natureza_juridica")),
+            "capital_social": _money(raw.get("capital_social")),
+            "logradouro": logradouro,
+            "numero": raw.get("numero", ""),
+            "complemento": raw.get("complemento") or "",
+            "bairro": raw.get("bairro", ""),
+            "municipio": raw.get("municipio", ""),
+            "uf": raw.get("uf", ""),
+            "cep": _digits(raw.get("cep")),
+            "atividade_principal": atividade,
+            "qsa": [
+                {
+                    "nome": s["nome_socio"],
+                    "qual": "{}-{}".format(
+                        s.get("codigo_qualificacao_socio", ""), s.get("qualificacao_socio", "")
+                    ),
+                }
+                for s in raw.get("qsa", [])
+            ],
+        }
+
+
+class MinhaReceitaProvider(BrasilAPIProvider):
+    name = "minhareceita"
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (ReceitaWSProvider, BrasilAPIProvider, MinhaReceitaProvider)
+}
+
+
+def providers_from_env() -> List[CnpjProvider]:
+    """Cria os provedores listados em ``CNPJ_PROVEDORES`` (padrão: só ReceitaWS)."""
+    names = [n.strip().lower() for n in os.getenv("CNPJ_PROVEDORES", "receitaws").split(",")]
+    threshold = int(os.getenv("CNPJ_FALHAS_PARA_PAUSAR", "3"))
+    pause = float(os.getenv("CNPJ_PAUSA_PROVEDOR", "120"))
+    urls = {
+        "receitaws": os.getenv("RECEITAWS_URL", RECEITAWS_URL),
+        "brasilapi": os.getenv("BRASILAPI_URL", BRASILAPI_URL),
+        "minhareceita": os.getenv("MINHARECEITA_URL", ""),
+    }
+    providers = []
+    for name in filter(None, names):
+        if name not in PROVIDERS:
+            raise ValueError(f"Provedor de CNPJ desconhecido: {name}")
+        if not urls[name]:
+            raise ValueError(f"Defina {name.upper()}_URL para usar o provedor {name}")
+        calls, period = DEFAULT_LIMITS[name]
+        rate = float(os.getenv(f"{name.upper()}_CONSULTAS_POR_MINUTO", calls))
+        per = float(os.getenv(f"{name.upper()}_PERIODO", period))
+        providers.append(
+            PROVIDERS[name](
+                urls[name],
+                TokenBucket(rate, per=per),
+                CircuitBreaker(threshold, pause),
+            )
+        )
+    return providers
@@ -0,0 +1,173 @@
+import multiprocessing
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Limitador de taxa no modelo token bucket.
+
+    ``rate`` fichas são repostas a cada ``per`` segundos, até o limite de
+    ``capacity``. Com ``capacity=1`` as chamadas ficam espaçadas de forma
+    uniforme (``per / rate`` segundos), o que garante que nenhuma janela de
+    ``per`` segundos receba mais de ``rate`` chamadas.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        per: float = 60.0,
+        capacity: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.per = per
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate / self.per)
+
+    def try_acquire(self) -> float:
+        """Consome uma ficha se houver; caso contrário retorna a espera necessária."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * self.per / self.rate
+
+    def available(self) -> float:
+        """Fichas disponíveis agora, sem consumir nenhuma."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self) -> None:
+        """Bloqueia até que uma ficha esteja disponível e a consome."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            self._sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """:class:`TokenBucket` com o estado em memória compartilhada.
+
+    Pode ser entregue a processos filhos (``multiprocessing``) para que uma
+    única cota valha para todos eles. Usa ``time.monotonic``, que é comum a
+    todos os processos da máquina.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        per: float = 60.0,
+        capacity: float = 1.0,
+        ctx: Optional[multiprocessing.context.BaseContext] = None,
+    ) -> None:
+        ctx = ctx or multiprocessing.get_context()
+        self.rate = rate
+        self.per = per
+        self.capacity = capacity
+        self._clock = time.monotonic
+        self._sleep = time.sleep
+        # [fichas, instante da última reposição]
+        self._state = ctx.Array("d", [capacity, time.monotonic()])
+        self._lock = self._state.get_lock()
+
+    @property
+    def _tokens(self) -> float:
+        return self._state[0]
+
+    @_tokens.setter
+    def _tokens(self, value: float) -> None:
+        self._state[0] = value
+
+    @property
+    def _updated(self) -> float:
+        return self._state[1]
+
+    @_updated.setter
+    def _updated(self, value: float) -> None:
+        self._state[1] = value
+
+
+class CircuitBreaker:
+    """Disjuntor que suspende as chamadas a um serviço com falhas seguidas.
+
+    Após ``failure_threshold`` falhas consecutivas o disjuntor abre e nenhuma
+    chamada é liberada por ``reset_timeout`` segundos. Em seguida ele fica
+    meio aberto: uma única chamada de teste é liberada e o resultado dela
+    fecha o disjuntor ou o abre novamente.
+    """
+
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "meio_aberto"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 120.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update()
+            return self._state
+
+    def _update(self) -> None:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+
+    def retry_after(self) -> float:
+        """Segundos até o disjuntor liberar uma chamada (0 se liberada agora)."""
+        with self._lock:
+            self._update()
+            if self._state == self.OPEN:
+                return self._opened_at + self.reset_timeout - self._clock()
+            if self._state == self.HALF_OPEN and self._probing:
+                # aguarda o resultado da chamada de teste
+                return self.reset_timeout
+            return 0.0
+
+    def begin(self) -> None:
+        """Registra o início de uma chamada liberada por :meth:`retry_after`."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
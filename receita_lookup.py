@@ -0,0 +1,275 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from cnpj_cache import CnpjCache
+from open_data import OpenDataIndex
+from providers import (
+    RECEITAWS_CALLS_PER_MINUTE,
+    RECEITAWS_PERIOD,
+    RECEITAWS_URL,
+    CnpjNotFound,
+    CnpjProvider,
+    ReceitaWSProvider,
+    providers_from_env,
+)
+from rate_limit import TokenBucket
+from tracing import Tracer
+
+# espera máxima do despachante entre duas verificações dos provedores
+_MAX_IDLE = 1.0
+
+
+def socios_from_response(data: Dict) -> List[str]:
+    """Extrai os nomes do quadro societário (``qsa``) de uma resposta."""
+    return [s["nome"].upper() for s in data.get("qsa", [])]
+
+
+class LookupFailed(RuntimeError):
+    """Consulta de CNPJ sem resposta: falhou no último provedor tentado."""
+
+    def __init__(self, provider: str, error: Exception) -> None:
+        super().__init__(f"{provider}: {error}")
+        self.provider = provider
+        self.error = error
+
+
+def attach_shareholders(
+    result: Dict,
+    future: Future,
+    on_done: Optional[Callable[[Optional[Exception]], None]] = None,
+) -> None:
+    """Preenche ``socios_receita`` e ``capital_social_receita`` quando a consulta terminar.
+
+    Uma falha da consulta fica em ``erro_consulta`` (provedor e erro), e não
+    em ``observacoes``; ``on_done`` é chamado em seguida com a exceção da
+    consulta (ou ``None``).
+    """
+
+    def _done(fut: Future) -> None:
+        error: Optional[Exception] = None
+        try:
+            data = fut.result()
+            result["socios_receita"] = socios_from_response(data)
+            # usado pela conciliação (reconciliation.py); vazio nos Dados Abertos
+            result["capital_social_receita"] = data.get("capital_social", "")
+            result.pop("erro_consulta", None)
+        except Exception as exc:
+            error = exc
+            result["erro_consulta"] = str(exc)
+        if on_done:
+            on_done(error)
+
+    future.add_done_callback(_done)
+
+
+class ReceitaLookupWorker:
+    """Consulta CNPJs em segundo plano respeitando o limite de cada provedor.
+
+    A interface entrega os CNPJs com :meth:`submit` assim que são lidos e segue
+    para a próxima empresa; uma thread dedicada despacha as consultas na ordem
+    de chegada para o primeiro provedor (``providers``, ver ``providers.py``)
+    com ficha disponível e disjuntor fechado, somando as cotas de todos. Uma
+    consulta que falha é repetida nos provedores ainda não tentados.
+
+    Com um ``cache`` configurado, CNPJs já consultados são respondidos na hora,
+    sem rede e sem espera do limitador. Em ``cache_only`` nenhuma chamada de
+    rede é feita e CNPJs fora do cache resultam em erro.
+
+    Com ``open_data`` (índice dos Dados Abertos do CNPJ, ver ``open_data.py``)
+    o quadro societário é lido localmente; a ReceitaWS só é consultada para
+    CNPJs ausentes do índice.
+    """
+
+    def __init__(
+        self,
+        providers: Optional[List[CnpjProvider]] = None,
+        logger: Optional[logging.Logger] = None,
+        cache: Optional[CnpjCache] = None,
+        cache_only: bool = False,
+        tracer: Optional[Tracer] = None,
+        open_data: Optional[OpenDataIndex] = None,
+    ) -> None:
+        self.providers = providers or [
+            ReceitaWSProvider(
+                os.getenv("RECEITAWS_URL", RECEITAWS_URL),
+                TokenBucket(RECEITAWS_CALLS_PER_MINUTE, per=RECEITAWS_PERIOD),
+            )
+        ]
+        self.logger = logger or logging.getLogger(__name__)
+        self.cache = cache
+        self.cache_only = cache_only
+        self.tracer = tracer or Tracer()
+        self.open_data = open_data
+        self._queue: "queue.Queue[Optional[tuple[str, Future, FrozenSet[str]]]]" = queue.Queue()
+        self._futures: Dict[str, Future] = {}
+        self._companies: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_env(
+        cls, logger: Optional[logging.Logger] = None, tracer: Optional[Tracer] = None
+    ) -> "ReceitaLookupWorker":
+        """Cria o worker com o cache e o índice configurados pelas variáveis do ``.env``."""
+        cache = None
+        if os.getenv("CNPJ_CACHE", "true").lower() in ("1", "true", "yes"):
+            cache = CnpjCache.from_env()
+        cache_only = os.getenv("CNPJ_CACHE_ONLY", "false").lower() in ("1", "true", "yes")
+        return cls(
+            providers=providers_from_env(),
+            logger=logger,
+            cache=cache,
+            cache_only=cache_only,
+            tracer=tracer,
+            open_data=OpenDataIndex.from_env(),
+        )
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=2 * len(self.providers), thread_name_prefix="cnpj-provedor"
+            )
+            self._thread = threading.Thread(
+                target=self._loop, name="receita-lookup", daemon=True
+            )
+            self._thread.start()
+
+    def submit(
+        self,
+        cnpj: str,
+        empresa: Optional[str] = None,
+        complete: bool = False,
+        refresh: bool = False,
+    ) -> Future:
+        """Enfileira a consulta de um CNPJ; repetições reaproveitam o mesmo futuro.
+
+        ``empresa`` é usada apenas para atribuir os tempos da consulta no tracer.
+        Com ``complete`` o índice dos Dados Abertos, que só tem o quadro
+        societário, é ignorado e a resposta traz o cadastro completo. Com
+        ``refresh`` o cache também é ignorado: o CNPJ é consultado de novo e a
+        resposta substitui a do cache.
+        """
+        with self._lock:
+            if empresa:
+                self._companies[cnpj] = empresa
+            future = self._futures.get(cnpj)
+            if future is None:
+                future = Future()
+                self._futures[cnpj] = future
+                local = self.open_data.lookup(cnpj) if self.open_data and not complete else None
+                cached = (
+                    self.cache.get(cnpj) if self.cache and local is None and not refresh else None
+                )
+                if local is not None:
+                    self.logger.debug("CNPJ %s respondido pelos Dados Abertos", cnpj)
+                    future.set_result(local)
+                elif cached is not None:
+                    self.logger.debug("CNPJ %s respondido pelo cache", cnpj)
+                    future.set_result(cached)
+                elif self.cache_only:
+                    future.set_exception(
+                        LookupError(f"CNPJ {cnpj} ausente do cache (modo somente cache)")
+                    )
+                else:
+                    self._queue.put((cnpj, future, frozenset()))
+        return future
+
+    def retry(self, cnpj: str, empresa: Optional[str] = None, complete: bool = False) -> Future:
+        """Consulta de novo um CNPJ cuja consulta anterior falhou (ver ``retry_queue.py``)."""
+        with self._lock:
+            future = self._futures.get(cnpj)
+            if future is not None and future.done() and future.exception() is not None:
+                del self._futures[cnpj]
+        return self.submit(cnpj, empresa, complete)
+
+    def preload(self, cnpj: str, data: Dict) -> None:
+        """Registra uma resposta já obtida (ex.: na fase de resolução) sem nova consulta."""
+        with self._lock:
+            if cnpj not in self._futures:
+                future: Future = Future()
+                future.set_result(data)
+                self._futures[cnpj] = future
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            cnpj, future, tried = item
+            if not tried and not future.set_running_or_notify_cancel():
+                continue
+            empresa = self._companies.get(cnpj)
+            with self.tracer.span("espera_cota_receitaws", empresa, cnpj=cnpj):
+                provider = self._next_provider(tried)
+            self._executor.submit(self._fetch, provider, cnpj, future, tried)
+
+    def _next_provider(self, tried: FrozenSet[str]) -> CnpjProvider:
+        """Aguarda o primeiro provedor não tentado com disjuntor e ficha liberados."""
+        candidates = [p for p in self.providers if p.name not in tried]
+        while True:
+            waits = []
+            for provider in candidates:
+                wait_breaker = provider.breaker.retry_after()
+                if wait_breaker > 0:
+                    waits.append(wait_breaker)
+                    continue
+                wait_token = provider.limiter.try_acquire()
+                if wait_token <= 0:
+                    provider.breaker.begin()
+                    return provider
+                waits.append(wait_token)
+            time.sleep(min(min(waits), _MAX_IDLE))
+
+    def _fetch(
+        self, provider: CnpjProvider, cnpj: str, future: Future, tried: FrozenSet[str]
+    ) -> None:
+        empresa = self._companies.get(cnpj)
+        try:
+            self.logger.debug("Consultando CNPJ %s em %s", cnpj, provider.name)
+            with self.tracer.span("receitaws", empresa, cnpj=cnpj, provedor=provider.name):
+                data = provider.fetch(cnpj)
+        except CnpjNotFound as exc:
+            future.set_exception(exc)
+            return
+        except Exception as exc:
+            tried = tried | {provider.name}
+            if len(tried) < len(self.providers):
+                self.logger.warning(
+                    "Falha ao consultar CNPJ %s em %s (%s); tentando outro provedor",
+                    cnpj,
+                    provider.name,
+                    exc,
+                )
+                self._queue.put((cnpj, future, tried))
+            else:
+                future.set_exception(LookupFailed(provider.name, exc))
+            return
+        if self.cache:
+            self.cache.put(cnpj, data)
+        future.set_result(data)
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Aguarda o término de todas as consultas já enfileiradas."""
+        with self._lock:
+            pending = list(self._futures.values())
+        wait(pending, timeout=timeout)
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            for provider in self.providers:
+                self.logger.info("Provedor %s: %s", provider.name, provider.health())
+        if self.cache:
+            self.cache.close()
+        if self.open_data:
+            self.open_data.close()
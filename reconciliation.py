@@ -0,0 +1,307 @@
+"""Conciliação dos dados do Domínio com o cadastro da Receita.
+
+O capital social e o quadro societário lidos na janela de dados do Domínio
+(``CAMPO CAPITAL SOCIAL`` e ``CAMPO SÓCIOS`` em ``Elementos.txt``) são
+comparados com a resposta da Receita para a carteira inteira de uma vez, com
+pandas. Os nomes dos sócios são comparados sem acentos, em maiúsculas e com
+espaços normalizados. As leituras podem ser de dois momentos:
+
+- ``antes``: ao abrir os dados da empresa, antes da importação;
+- ``depois``: relidas após a gravação (``CONCILIACAO_RELER``), o que mostra
+  o que a importação não corrigiu.
+
+São gerados dois quadros, exportados em Parquet (ou CSV, sem ``pyarrow``):
+
+- diferenças por campo: ``empresa, cnpj, momento, campo, de, para``;
+- sócios divergentes: ``empresa, cnpj, momento, socio, onde``.
+
+Exemplo::
+
+    python reconciliation.py log_detalhado_20250131_060000.json
+    python reconciliation.py --fases
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from company_index import normalize_name
+
+# colunas (capital social, sócios) lidas no Domínio em cada momento
+MOMENTOS = {
+    "antes": ("capital_social_dominio", "socios_dominio"),
+    "depois": ("capital_social_apos", "socios_apos"),
+}
+
+ONDE = {"left_only": "só no Domínio", "right_only": "só na Receita"}
+
+# colunas extraídas de cada resultado do diário
+_COLUMNS = [
+    "empresa",
+    "cnpj",
+    "capital_social_dominio",
+    "socios_dominio",
+    "capital_social_apos",
+    "socios_apos",
+    "capital_social_receita",
+    "socios_receita",
+]
+
+# resultados por bloco em reconcile_stream
+CHUNK_SIZE = 2000
+
+FIELD_COLUMNS = ["empresa", "cnpj", "momento", "campo", "de", "para"]
+PEOPLE_COLUMNS = ["empresa", "cnpj", "momento", "socio", "onde"]
+
+logger = logging.getLogger(__name__)
+
+
+def results_frame(results: Iterable[Dict]) -> pd.DataFrame:
+    """Quadro com os campos do Domínio e da Receita de cada resultado do diário.
+
+    ``capital_social_receita`` só existe quando a consulta respondeu; sem ele
+    a empresa fica fora da comparação.
+    """
+    rows = [{column: result.get(column) for column in _COLUMNS} for result in results]
+    return pd.DataFrame(rows, columns=_COLUMNS)
+
+
+def _money(values: pd.Series) -> pd.Series:
+    """Valores monetários como número, aceitando ``50.000,00`` e ``50000.00``."""
+    text = values.fillna("").astype(str).str.strip()
+    brazilian = text.str.contains(",", regex=False)
+    text = text.where(
+        ~brazilian, text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    )
+    return pd.to_numeric(text, errors="coerce")
+
+
+def _people(frame: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Um sócio por linha, com a chave de comparação normalizada."""
+    people = frame[["empresa", "cnpj", column]].explode(column).dropna(subset=[column])
+    people = people.rename(columns={column: "socio"})
+    names = people["socio"].astype(str)
+    # unidecode não é vetorizado: normaliza cada nome distinto uma única vez
+    keys = {name: normalize_name(name) for name in names.unique()}
+    people["chave"] = names.map(keys)
+    return people.drop_duplicates(["empresa", "chave"])
+
+
+def _joined(values: pd.Series) -> pd.Series:
+    return values.map(lambda names: " | ".join(sorted(names)))
+
+
+def reconcile(frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Diferenças por campo e sócios divergentes de toda a carteira."""
+    fields: List[pd.DataFrame] = []
+    people: List[pd.DataFrame] = []
+    known = frame[frame["capital_social_receita"].notna()]
+    for momento, (capital_column, socios_column) in MOMENTOS.items():
+        if capital_column not in known:
+            continue
+        read = known[known[socios_column].map(lambda value: isinstance(value, list))]
+        if read.empty:
+            continue
+
+        dominio = _money(read[capital_column])
+        receita = _money(read["capital_social_receita"])
+        changed = read[dominio.notna() & receita.notna() & ((dominio - receita).abs() > 0.005)]
+        fields.append(
+            pd.DataFrame(
+                {
+                    "empresa": changed["empresa"],
+                    "cnpj": changed["cnpj"],
+                    "momento": momento,
+                    "campo": "Capital Social",
+                    "de": changed[capital_column],
+                    "para": changed["capital_social_receita"],
+                }
+            )
+        )
+
+        merged = _people(read, socios_column).merge(
+            _people(read, "socios_receita"),
+            on=["empresa", "cnpj", "chave"],
+            how="outer",
+            suffixes=("_dominio", "_receita"),
+            indicator=True,
+        )
+        mismatched = merged[merged["_merge"] != "both"]
+        people.append(
+            pd.DataFrame(
+                {
+                    "empresa": mismatched["empresa"],
+                    "cnpj": mismatched["cnpj"],
+                    "momento": momento,
+                    "socio": mismatched["socio_dominio"].fillna(mismatched["socio_receita"]),
+                    "onde": mismatched["_merge"].astype(str).map(ONDE),
+                }
+            )
+        )
+        divergent = read[read["empresa"].isin(mismatched["empresa"])]
+        fields.append(
+            pd.DataFrame(
+                {
+                    "empresa": divergent["empresa"],
+                    "cnpj": divergent["cnpj"],
+                    "momento": momento,
+                    "campo": "Sócios",
+                    "de": _joined(divergent[socios_column]),
+                    "para": _joined(divergent["socios_receita"]),
+                }
+            )
+        )
+    field_diffs = pd.concat(fields, ignore_index=True) if fields else pd.DataFrame()
+    people_diffs = pd.concat(people, ignore_index=True) if people else pd.DataFrame()
+    return (
+        field_diffs.reindex(columns=FIELD_COLUMNS),
+        people_diffs.reindex(columns=PEOPLE_COLUMNS),
+    )
+
+
+def reconcile_stream(
+    results: Iterable[Dict], chunk_size: int = CHUNK_SIZE
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """:func:`reconcile` em blocos de ``chunk_size`` resultados.
+
+    A comparação é feita empresa a empresa, então os blocos são independentes
+    e só um deles fica em memória por vez (além das diferenças encontradas).
+    """
+    fields: List[pd.DataFrame] = []
+    people: List[pd.DataFrame] = []
+    results = iter(results)
+    while True:
+        chunk = list(islice(results, chunk_size))
+        if not chunk:
+            break
+        field_diffs, people_diffs = reconcile(results_frame(chunk))
+        fields.append(field_diffs)
+        people.append(people_diffs)
+    if not fields:
+        return reconcile(results_frame([]))
+    return pd.concat(fields, ignore_index=True), pd.concat(people, ignore_index=True)
+
+
+def result_annotator(
+    field_diffs: pd.DataFrame, people_diffs: pd.DataFrame
+) -> Callable[[Dict], Dict]:
+    """Função que preenche ``alteracoes`` e ``divergencia_societaria`` de um resultado.
+
+    ``alteracoes`` traz o que a importação muda (momento ``antes``); a
+    divergência societária usa a releitura após a gravação, quando existe.
+    Serve para anotar os resultados um a um, à medida que são lidos do diário.
+    """
+    changes: Dict[str, Dict] = {}
+    before = field_diffs[field_diffs["momento"] == "antes"]
+    for empresa, campo, de, para in before[["empresa", "campo", "de", "para"]].itertuples(
+        index=False
+    ):
+        changes.setdefault(empresa, {})[campo] = {"de": de, "para": para}
+    divergent = {
+        momento: set(people_diffs.loc[people_diffs["momento"] == momento, "empresa"])
+        for momento in MOMENTOS
+    }
+
+    def annotate(result: Dict) -> Dict:
+        if "alteracoes" in result:
+            result["alteracoes"] = changes.get(result["empresa"], {})
+        momento = "depois" if result.get("socios_apos") is not None else "antes"
+        if "divergencia_societaria" in result:
+            result["divergencia_societaria"] = result["empresa"] in divergent[momento]
+        return result
+
+    return annotate
+
+
+def export(frame: pd.DataFrame, base_name: str, fmt: Optional[str] = None) -> str:
+    """Grava ``base_name.parquet`` (ou ``.csv``) e devolve o nome do arquivo.
+
+    O Parquet precisa de ``pyarrow`` (ou ``fastparquet``); sem ele, ou com
+    ``CONCILIACAO_FORMATO=csv``, o quadro é gravado em CSV.
+    """
+    fmt = fmt or os.getenv("CONCILIACAO_FORMATO", "parquet")
+    if fmt == "parquet":
+        try:
+            frame.to_parquet(f"{base_name}.parquet", index=False)
+            return f"{base_name}.parquet"
+        except ImportError:
+            logger.warning("pyarrow não instalado; conciliação gravada em CSV")
+    frame.to_csv(f"{base_name}.csv", index=False, encoding="utf-8")
+    return f"{base_name}.csv"
+
+
+def export_reconciliation(
+    field_diffs: pd.DataFrame,
+    people_diffs: pd.DataFrame,
+    timestamp: str,
+    fmt: Optional[str] = None,
+) -> List[str]:
+    """Grava os dois quadros com o carimbo ``timestamp`` dos logs da execução."""
+    return [
+        export(field_diffs, f"conciliacao_campos_{timestamp}", fmt),
+        export(people_diffs, f"conciliacao_socios_{timestamp}", fmt),
+    ]
+
+
+def phases_frame() -> pd.DataFrame:
+    """Quadro da carteira inteira a partir de ``fases.sqlite3`` (colheita e resolução)."""
+    from phases import PhaseStore
+    from receita_lookup import socios_from_response
+
+    store = PhaseStore.from_env()
+    try:
+        rows = store.rows()
+    finally:
+        store.close()
+    results = []
+    for row in rows:
+        result = {
+            "empresa": row["empresa"],
+            "cnpj": row["cnpj"],
+            "capital_social_dominio": row["capital_social"],
+            "socios_dominio": row["socios_dominio"],
+        }
+        if row["receita"] is not None:
+            result["capital_social_receita"] = row["receita"].get("capital_social", "")
+            result["socios_receita"] = socios_from_response(row["receita"])
+        results.append(result)
+    return results_frame(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Conciliação do Domínio com a Receita")
+    parser.add_argument(
+        "logs", nargs="*", help="logs JSON (log_detalhado_*, log_consulta_socios_*)"
+    )
+    parser.add_argument(
+        "--fases", action="store_true", help="usa a colheita e a resolução de fases.sqlite3"
+    )
+    parser.add_argument("--formato", choices=("parquet", "csv"), help="formato da exportação")
+    args = parser.parse_args()
+    if not args.logs and not args.fases:
+        parser.error("informe logs JSON ou --fases")
+
+    if args.fases:
+        frame = phases_frame()
+    else:
+        results = []
+        for path in args.logs:
+            with open(path, encoding="utf-8") as json_file:
+                results.extend(json.load(json_file))
+        frame = results_frame(results)
+    field_diffs, people_diffs = reconcile(frame)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    files = export_reconciliation(field_diffs, people_diffs, timestamp, args.formato)
+    print(f"Empresas comparadas: {frame['capital_social_receita'].notna().sum()}")
+    print(f"Diferenças por campo: {len(field_diffs)}  sócios divergentes: {len(people_diffs)}")
+    print(f"Arquivos: {', '.join(files)}")
+
+
+if __name__ == "__main__":
+    main()
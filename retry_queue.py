@@ -0,0 +1,92 @@
+"""Fila de novas tentativas para empresas com falha temporária.
+
+Uma empresa que falha por um motivo passageiro (2Captcha fora do ar ou
+lento, consulta de CNPJ recusada, erro de interface) não é repetida na hora:
+entra nesta fila e é processada de novo ao final da passada, depois de uma
+espera que cresce a cada tentativa. Cada classe de erro tem o seu número de
+tentativas e a sua espera base:
+
+- ``captcha``: captcha não resolvido, recusado ou 2Captcha pausado;
+- ``receita``: consulta do CNPJ sem resposta (só a consulta é repetida,
+  sem voltar à interface);
+- ``interface``: erro inesperado na interface do Domínio.
+
+As políticas podem ser ajustadas com ``REPETIR_<CLASSE>=tentativas,espera``.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# classe de erro -> (tentativas extras, espera base em segundos)
+RETRY_POLICIES: Dict[str, Tuple[int, float]] = {
+    "captcha": (2, 60.0),
+    "receita": (3, 60.0),
+    "interface": (1, 15.0),
+}
+
+
+class RetryQueue:
+    """Empresas adiadas, ordenadas pelo instante em que podem ser repetidas.
+
+    A espera da ``n``-ésima tentativa de uma classe é ``espera * 2 ** (n - 1)``,
+    ou o ``delay`` pedido por quem adia (ex.: o tempo até o disjuntor do
+    2Captcha fechar), o que for maior.
+    """
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, Tuple[int, float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.policies = dict(RETRY_POLICIES if policies is None else policies)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._attempts: Counter = Counter()
+        # tentativas esgotadas por classe de erro
+        self.exhausted: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "RetryQueue":
+        if os.getenv("REPETIR_FALHAS", "true").lower() not in ("1", "true", "yes"):
+            return cls(policies={})
+        policies = dict(RETRY_POLICIES)
+        for kind in policies:
+            value = os.getenv(f"REPETIR_{kind.upper()}")
+            if value:
+                attempts, delay = value.split(",")
+                policies[kind] = (int(attempts), float(delay))
+        return cls(policies)
+
+    def push(self, company: str, kind: str, payload: Any = None, delay: float = 0.0) -> bool:
+        """Adia a empresa; ``False`` se as tentativas da classe se esgotaram."""
+        if kind not in self.policies:
+            return False
+        attempts, base = self.policies[kind]
+        with self._lock:
+            done = self._attempts[(company, kind)]
+            if done >= attempts:
+                self.exhausted[kind] += 1
+                return False
+            self._attempts[(company, kind)] = done + 1
+            ready_at = self._clock() + max(base * 2**done, delay)
+            heapq.heappush(self._heap, (ready_at, next(self._order), company, kind, payload))
+        return True
+
+    def pop(self) -> Optional[Tuple[str, str, Any, float]]:
+        """``(empresa, classe, payload, espera)`` da próxima tentativa, ou ``None``."""
+        with self._lock:
+            if not self._heap:
+                return None
+            ready_at, _, company, kind, payload = heapq.heappop(self._heap)
+        return company, kind, payload, max(ready_at - self._clock(), 0.0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
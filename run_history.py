@@ -0,0 +1,491 @@
+"""Histórico das execuções e relatório de regressões de desempenho.
+
+Ao final de cada execução (``DominioSession.save_logs``) o resultado de cada
+empresa e o tempo de cada fase são gravados em ``historico.sqlite3``. Os logs
+de execuções anteriores (``log_detalhado_*.json``, ``log_consulta_socios_*``,
+``log_atualizacao_dominio_*.csv`` e ``trace_*.json``) podem ser importados.
+
+O relatório mostra a vazão (empresas/hora) de cada execução, as empresas mais
+lentas, as falhas por status e observação e as regressões da última execução
+de cada modo em relação às anteriores.
+
+Exemplo::
+
+    python run_history.py importar .
+    python run_history.py relatorio --execucoes 20 --base 5
+    python run_history.py relatorio --verificar  # código 1 se houver regressão
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import statistics
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_HISTORY_PATH = "historico.sqlite3"
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# nome dos arquivos de log e de trace gravados pelos modos de execução
+_LOG_RE = re.compile(
+    r"^(?:log_(?P<log>atualizacao_dominio|detalhado|consulta_socios)"
+    r"|trace_(?P<trace>[a-z_]+))_(?P<ts>\d{8}_\d{6})\.(?P<ext>csv|json)$"
+)
+
+# status que contam como falha mesmo sem o prefixo "Erro"
+STATUS_FALHA = ("Empresa não encontrada",)
+
+# fases com mediana abaixo disso (segundos) não entram na busca por regressões
+MIN_PHASE_SECONDS = 0.05
+
+
+def is_failure(status: str) -> bool:
+    return status.startswith("Erro") or status in STATUS_FALHA
+
+
+def run_source(mode: str, timestamp: str) -> str:
+    """Identificador da execução, o mesmo na gravação ao vivo e na importação."""
+    return f"{mode}_{timestamp}"
+
+
+class RunHistory:
+    """Execuções, resultados por empresa e tempos por fase numa base SQLite."""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS execucoes (
+                id INTEGER PRIMARY KEY,
+                origem TEXT NOT NULL UNIQUE,
+                modo TEXT NOT NULL,
+                inicio TEXT NOT NULL,
+                duracao REAL,
+                empresas INTEGER NOT NULL,
+                retomada INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS resultados (
+                execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+                empresa TEXT NOT NULL,
+                cnpj TEXT NOT NULL,
+                status TEXT NOT NULL,
+                observacoes TEXT NOT NULL,
+                tempo_total REAL,
+                PRIMARY KEY (execucao_id, empresa)
+            );
+            CREATE TABLE IF NOT EXISTS tempos (
+                execucao_id INTEGER NOT NULL REFERENCES execucoes(id),
+                empresa TEXT NOT NULL,
+                fase TEXT NOT NULL,
+                segundos REAL NOT NULL,
+                PRIMARY KEY (execucao_id, empresa, fase)
+            );
+            CREATE INDEX IF NOT EXISTS resultados_empresa ON resultados (empresa);
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "RunHistory":
+        return cls(os.getenv("HISTORICO_PATH", DEFAULT_HISTORY_PATH))
+
+    def record_run(
+        self,
+        source: str,
+        mode: str,
+        started_at: datetime,
+        duration: Optional[float],
+        results: Iterable[Dict],
+        resumed: bool = False,
+    ) -> Optional[int]:
+        """Grava uma execução e devolve o id, ou ``None`` se ``source`` já existe.
+
+        ``duration`` é o tempo de relógio da execução; sem ele (logs antigos
+        sem trace) a execução não entra no cálculo de empresas/hora.
+        """
+        results = list(results)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO execucoes
+                    (origem, modo, inicio, duracao, empresas, retomada)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    source,
+                    mode,
+                    started_at.isoformat(timespec="seconds"),
+                    duration,
+                    len(results),
+                    int(resumed),
+                ),
+            )
+            if not cursor.rowcount:
+                return None
+            run_id = cursor.lastrowid
+            for result in results:
+                tempos = result.get("tempos") or {}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        result["empresa"],
+                        result.get("cnpj") or "",
+                        result.get("status") or "",
+                        result.get("observacoes") or "",
+                        tempos.get("empresa"),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tempos VALUES (?, ?, ?, ?)",
+                    [(run_id, result["empresa"], fase, s) for fase, s in tempos.items()],
+                )
+        return run_id
+
+    def query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ----------------------------------------------------------------------
+# Importação dos logs existentes
+# ----------------------------------------------------------------------
+def _trace_duration(path: str) -> Optional[float]:
+    """Tempo de relógio coberto pelos spans de um trace Chrome, em segundos."""
+    with open(path, encoding="utf-8") as trace_file:
+        events = json.load(trace_file).get("traceEvents", [])
+    if not events:
+        return None
+    start = min(event["ts"] for event in events)
+    end = max(event["ts"] + event["dur"] for event in events)
+    return (end - start) / 1e6
+
+
+def _read_json_log(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def _read_csv_log(path: str, consulta: bool) -> List[Dict]:
+    """Resultados de um CSV; as colunas ``Tempo ... (s)`` voltam a ser fases."""
+    from pipeline import (
+        CSV_TIME_COLUMNS,
+        CSV_TIME_COLUMNS_CONSULTA,
+        CSV_TIME_COLUMNS_CONSULTA_PASSADA_UNICA,
+        STATUS_CONSULTADA,
+    )
+
+    phases = {}
+    for columns in (
+        CSV_TIME_COLUMNS_CONSULTA_PASSADA_UNICA,
+        CSV_TIME_COLUMNS_CONSULTA,
+        CSV_TIME_COLUMNS,
+    ):
+        phases.update({column: phase for phase, column in columns.items()})
+    results = []
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        for row in csv.DictReader(csv_file):
+            observacoes = row.get("Observações", row.get("Observacoes", "")) or ""
+            if consulta:
+                # o CSV da consulta não tem status: sem observação, foi consultada
+                status = "Erro" if observacoes else STATUS_CONSULTADA
+            else:
+                status = row.get("Status", "")
+            tempos = {}
+            for column, value in row.items():
+                if column in phases and value:
+                    tempos[phases[column]] = float(value)
+            results.append(
+                {
+                    "empresa": row["Empresa"],
+                    "cnpj": row.get("CNPJ", ""),
+                    "status": status,
+                    "observacoes": observacoes,
+                    "tempos": tempos,
+                }
+            )
+    return results
+
+
+def import_logs(history: RunHistory, directory: str = ".") -> int:
+    """Importa os logs de ``directory`` ainda não registrados; devolve quantas execuções.
+
+    Os arquivos de uma execução têm o mesmo carimbo de data e hora. O modo vem
+    do nome do trace (ou, sem ele, dos logs presentes) e a duração, do trace;
+    o JSON é preferido ao CSV por trazer os tempos de todas as fases.
+    """
+    groups: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for name in os.listdir(directory):
+        match = _LOG_RE.match(name)
+        if match:
+            kind = match["log"] or "trace"
+            groups[match["ts"]][f"{kind}.{match['ext']}"] = os.path.join(directory, name)
+            if match["trace"]:
+                groups[match["ts"]]["modo"] = match["trace"]
+    imported = 0
+    for timestamp, files in sorted(groups.items()):
+        update = "detalhado.json" in files or "atualizacao_dominio.csv" in files
+        consulta = "consulta_socios.json" in files or "consulta_socios.csv" in files
+        if not (update or consulta):
+            continue
+        if "modo" in files:
+            mode = files["modo"]
+        elif update and consulta:
+            mode = "pipeline"
+        else:
+            mode = "atualizacao" if update else "consulta_socios"
+        if "detalhado.json" in files:
+            results = _read_json_log(files["detalhado.json"])
+        elif "consulta_socios.json" in files and not update:
+            results = _read_json_log(files["consulta_socios.json"])
+        elif "atualizacao_dominio.csv" in files:
+            results = _read_csv_log(files["atualizacao_dominio.csv"], consulta=False)
+        else:
+            results = _read_csv_log(files["consulta_socios.csv"], consulta=True)
+        duration = _trace_duration(files["trace.json"]) if "trace.json" in files else None
+        # os logs são gravados ao final: o carimbo é o fim da execução
+        finished_at = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        started_at = finished_at - timedelta(seconds=duration or 0)
+        if history.record_run(run_source(mode, timestamp), mode, started_at, duration, results):
+            imported += 1
+    return imported
+
+
+# ----------------------------------------------------------------------
+# Relatório
+# ----------------------------------------------------------------------
+def _runs(history: RunHistory, mode: Optional[str], limit: int) -> List[Dict]:
+    """Últimas ``limit`` execuções (mais antigas primeiro) com vazão e falhas."""
+    where, params = ("WHERE modo = ?", [mode]) if mode else ("", [])
+    rows = history.query(
+        f"""
+        SELECT id, modo, inicio, duracao, empresas, retomada FROM execucoes {where}
+        ORDER BY inicio DESC LIMIT ?
+        """,
+        params + [limit],
+    )
+    runs = []
+    for run_id, run_mode, inicio, duracao, empresas, retomada in reversed(rows):
+        statuses = history.query(
+            "SELECT status FROM resultados WHERE execucao_id = ?", [run_id]
+        )
+        failures = sum(is_failure(status) for (status,) in statuses)
+        runs.append(
+            {
+                "id": run_id,
+                "modo": run_mode,
+                "inicio": inicio,
+                "duracao": duracao,
+                "empresas": empresas,
+                # execuções retomadas só processaram parte das empresas do diário
+                "empresas_hora": (
+                    empresas / duracao * 3600 if duracao and not retomada else None
+                ),
+                "falhas": failures / empresas if empresas else 0.0,
+            }
+        )
+    return runs
+
+
+def _phase_medians(history: RunHistory, run_id: int) -> Dict[str, float]:
+    by_phase: Dict[str, List[float]] = defaultdict(list)
+    for fase, segundos in history.query(
+        "SELECT fase, segundos FROM tempos WHERE execucao_id = ?", [run_id]
+    ):
+        by_phase[fase].append(segundos)
+    return {fase: statistics.median(values) for fase, values in by_phase.items()}
+
+
+def _ids(runs: List[Dict]) -> str:
+    return ",".join(str(run["id"]) for run in runs) or "NULL"
+
+
+def _format_throughput(runs: List[Dict]) -> List[str]:
+    lines = [
+        f"{'Início':<21}{'Modo':<17}{'Empresas':>9}{'Duração (min)':>15}"
+        f"{'Empresas/h':>12}{'Falhas':>9}"
+    ]
+    for run in runs:
+        duration = f"{run['duracao'] / 60:.1f}" if run["duracao"] else "-"
+        rate = f"{run['empresas_hora']:.1f}" if run["empresas_hora"] else "-"
+        lines.append(
+            f"{run['inicio']:<21}{run['modo']:<17}{run['empresas']:>9}{duration:>15}"
+            f"{rate:>12}{run['falhas']:>9.0%}"
+        )
+    return lines
+
+
+def _format_slowest(history: RunHistory, runs: List[Dict], top: int) -> List[str]:
+    rows = history.query(
+        f"""
+        SELECT empresa, COUNT(*), AVG(tempo_total), MAX(tempo_total) FROM resultados
+        WHERE execucao_id IN ({_ids(runs)}) AND tempo_total IS NOT NULL
+        GROUP BY empresa ORDER BY AVG(tempo_total) DESC LIMIT ?
+        """,
+        [top],
+    )
+    lines = [f"{'Empresa':<44}{'n':>4}{'média (s)':>11}{'máx (s)':>10}"]
+    for empresa, count, mean, maximum in rows:
+        lines.append(f"{empresa[:43]:<44}{count:>4}{mean:>11.1f}{maximum:>10.1f}")
+    return lines
+
+
+def _format_failures(history: RunHistory, runs: List[Dict], top: int) -> List[str]:
+    """Falhas por status/observação: na última execução e na média das anteriores."""
+    latest, previous = runs[-1], runs[:-1]
+    counts: Dict[tuple, Counter] = defaultdict(Counter)
+    for run_id, status, observacoes in history.query(
+        f"SELECT execucao_id, status, observacoes FROM resultados "
+        f"WHERE execucao_id IN ({_ids(runs)})"
+    ):
+        if is_failure(status):
+            counts[(status, observacoes[:40])][run_id] += 1
+    lines = [f"{'Status':<32}{'Observação':<42}{'última':>8}{'média ant.':>12}"]
+    ranked = sorted(counts.items(), key=lambda item: -sum(item[1].values()))
+    for (status, observacoes), by_run in ranked[:top]:
+        mean = sum(by_run[run["id"]] for run in previous) / len(previous) if previous else 0.0
+        lines.append(
+            f"{status[:31]:<32}{observacoes:<42}{by_run[latest['id']]:>8}{mean:>12.1f}"
+        )
+
+    # empresas que falharam em pelo menos metade das execuções em que apareceram
+    recurring = history.query(
+        f"""
+        SELECT empresa, COUNT(*), SUM(CASE WHEN status LIKE 'Erro%' OR status IN
+            ({",".join("?" * len(STATUS_FALHA))}) THEN 1 ELSE 0 END) AS falhas
+        FROM resultados WHERE execucao_id IN ({_ids(runs)})
+        GROUP BY empresa HAVING falhas >= 2 AND falhas * 2 >= COUNT(*)
+        ORDER BY falhas DESC, empresa LIMIT ?
+        """,
+        list(STATUS_FALHA) + [top],
+    )
+    if recurring:
+        lines += ["", "Empresas com falha recorrente:"]
+        lines += [f"  {empresa} ({falhas} de {n})" for empresa, n, falhas in recurring]
+    return lines
+
+
+def find_regressions(
+    history: RunHistory, runs: List[Dict], tolerance: float, failure_tolerance: float
+) -> List[str]:
+    """Compara a última execução com a mediana das anteriores do mesmo modo."""
+    latest, previous = runs[-1], runs[:-1]
+    if not previous:
+        return []
+    regressions = []
+    rates = [run["empresas_hora"] for run in previous if run["empresas_hora"]]
+    if latest["empresas_hora"] and rates:
+        base = statistics.median(rates)
+        if latest["empresas_hora"] < base * (1 - tolerance):
+            regressions.append(
+                f"vazão: {latest['empresas_hora']:.1f} empresas/h (base {base:.1f})"
+            )
+    base = statistics.median(run["falhas"] for run in previous)
+    if latest["falhas"] > base + failure_tolerance:
+        regressions.append(f"falhas: {latest['falhas']:.0%} (base {base:.0%})")
+
+    latest_phases = _phase_medians(history, latest["id"])
+    previous_phases = [_phase_medians(history, run["id"]) for run in previous]
+    for fase, value in sorted(latest_phases.items()):
+        values = [phases[fase] for phases in previous_phases if fase in phases]
+        if not values:
+            continue
+        base = statistics.median(values)
+        if base >= MIN_PHASE_SECONDS and value > base * (1 + tolerance):
+            regressions.append(f"fase {fase}: p50 {value:.2f}s (base {base:.2f}s)")
+    return regressions
+
+
+def report(
+    history: RunHistory,
+    mode: Optional[str] = None,
+    limit: int = 20,
+    baseline: int = 5,
+    top: int = 10,
+    tolerance: float = 0.2,
+    failure_tolerance: float = 0.05,
+) -> tuple:
+    """Texto do relatório e lista de regressões encontradas."""
+    runs = _runs(history, mode, limit)
+    if not runs:
+        return "Nenhuma execução no histórico", []
+    lines = ["Vazão por execução:"] + _format_throughput(runs)
+    lines += ["", "Empresas mais lentas (tempo total médio):"]
+    lines += _format_slowest(history, runs, top)
+    lines += ["", "Falhas por status e observação:"] + _format_failures(history, runs, top)
+
+    regressions = []
+    lines += ["", f"Regressões (última execução contra as {baseline} anteriores do modo):"]
+    for run_mode in sorted({run["modo"] for run in runs}):
+        found = find_regressions(
+            history, _runs(history, run_mode, baseline + 1), tolerance, failure_tolerance
+        )
+        regressions += [f"{run_mode}: {item}" for item in found]
+    lines += [f"  {item}" for item in regressions] or ["  nenhuma"]
+    return "\n".join(lines), regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Histórico das execuções e regressões")
+    commands = parser.add_subparsers(dest="comando", required=True)
+    importar = commands.add_parser("importar", help="importa os logs de execuções anteriores")
+    importar.add_argument("diretorio", nargs="?", default=".", help="pasta dos logs")
+    relatorio = commands.add_parser("relatorio", help="vazão, lentidão, falhas e regressões")
+    relatorio.add_argument("--modo", help="só execuções deste modo (ex.: atualizacao)")
+    relatorio.add_argument("--execucoes", type=int, default=20, help="execuções exibidas")
+    relatorio.add_argument(
+        "--base", type=int, default=5, help="execuções anteriores usadas como referência"
+    )
+    relatorio.add_argument("--top", type=int, default=10, help="linhas das listas de empresas")
+    relatorio.add_argument(
+        "--tolerancia",
+        type=float,
+        default=0.2,
+        help="piora relativa aceita na vazão e nos tempos por fase (0.2 = 20%%)",
+    )
+    relatorio.add_argument(
+        "--tolerancia-falhas",
+        type=float,
+        default=0.05,
+        help="aumento aceito na taxa de falhas, em pontos (0.05 = 5 pontos percentuais)",
+    )
+    relatorio.add_argument(
+        "--verificar", action="store_true", help="sai com código 1 se houver regressão"
+    )
+    args = parser.parse_args()
+
+    history = RunHistory.from_env()
+    try:
+        if args.comando == "importar":
+            print(f"Execuções importadas: {import_logs(history, args.diretorio)}")
+            return
+        text, regressions = report(
+            history,
+            mode=args.modo,
+            limit=args.execucoes,
+            baseline=args.base,
+            top=args.top,
+            tolerance=args.tolerancia,
+            failure_tolerance=args.tolerancia_falhas,
+        )
+        print(text)
+    finally:
+        history.close()
+    if args.verificar and regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Ordem das empresas e seleção do que cabe na janela de manutenção.
+
+A fila é ordenada com o histórico de ``run_history.py`` (execuções do mesmo
+modo):
+
+1. empresas da lista de prioridades (``AGENDA_PRIORIDADES``), na ordem dela;
+2. empresas que ficaram de fora da execução anterior por falta de tempo
+   (``agenda_pendentes.json``);
+3. empresas ainda sem histórico no modo;
+4. as demais, pela razão entre o tempo desde o último sucesso (ou desde a
+   primeira tentativa) e o tempo médio da empresa, dividida pelas falhas
+   recentes: empresas rápidas, há muito sem
+   atualizar e que costumam dar certo vêm primeiro.
+
+Com um prazo (``AGENDA_PRAZO`` ou ``--prazo``) o plano só inclui as empresas
+cuja duração estimada cabe até lá; a execução não começa uma empresa que não
+terminaria a tempo, e as que sobraram vão para a frente da próxima fila.
+"""
+
+import json
+import logging
+import os
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from run_history import DEFAULT_HISTORY_PATH, RunHistory, is_failure
+
+DEFAULT_CARRYOVER_PATH = "agenda_pendentes.json"
+
+# estimativa por empresa quando ainda não há histórico do modo
+DEFAULT_COMPANY_SECONDS = 60.0
+
+# aparições mais recentes de cada empresa usadas no tempo médio e nas falhas
+LOOKBACK_RUNS = 10
+
+
+def parse_deadline(value: str, now: Optional[datetime] = None) -> datetime:
+    """Prazo ``HH:MM`` (a próxima ocorrência desse horário) ou data e hora ISO.
+
+    Uma data com fuso (``2026-10-16T18:00-03:00``) é convertida para o horário
+    local sem fuso, o mesmo de ``datetime.now()`` usado nas comparações.
+    """
+    now = now or datetime.now()
+    try:
+        hour, minute = (int(part) for part in value.split(":"))
+    except ValueError:
+        try:
+            deadline = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(
+                f"Prazo inválido: {value!r} (use HH:MM ou data e hora ISO)"
+            ) from None
+        if deadline.tzinfo is not None:
+            deadline = deadline.astimezone().replace(tzinfo=None)
+        return deadline
+    deadline = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return deadline if deadline > now else deadline + timedelta(days=1)
+
+
+class CompanyScheduler:
+    """Ordena a fila de empresas e a limita ao que cabe até ``deadline``.
+
+    ``margin`` é a fração do tempo até o prazo usada no plano, para absorver
+    empresas mais lentas que a estimativa; ``sessions`` multiplica o tempo
+    disponível quando várias sessões dividem a fila (``orchestrator.py``).
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[datetime] = None,
+        priorities: Sequence[str] = (),
+        carryover_path: str = DEFAULT_CARRYOVER_PATH,
+        history_path: str = DEFAULT_HISTORY_PATH,
+        margin: float = 0.9,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.deadline = deadline
+        self.priorities = list(priorities)
+        self.carryover_path = carryover_path
+        self.history_path = history_path
+        self.margin = margin
+        self.sessions = 1
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats: Dict[str, Dict] = {}
+        self.default_seconds = DEFAULT_COMPANY_SECONDS
+        # fila completa da execução, planejada ou não
+        self.scheduled: List[str] = []
+
+    @classmethod
+    def from_env(cls, logger: Optional[logging.Logger] = None) -> "CompanyScheduler":
+        deadline = os.getenv("AGENDA_PRAZO", "")
+        priorities = []
+        priorities_path = os.getenv("AGENDA_PRIORIDADES", "")
+        if priorities_path:
+            # uma empresa por linha, como aparece na Troca de empresas
+            with open(priorities_path, encoding="utf-8") as priorities_file:
+                priorities = [line.strip() for line in priorities_file if line.strip()]
+        return cls(
+            deadline=parse_deadline(deadline) if deadline else None,
+            priorities=priorities,
+            carryover_path=os.getenv("AGENDA_PENDENTES", DEFAULT_CARRYOVER_PATH),
+            history_path=os.getenv("HISTORICO_PATH", DEFAULT_HISTORY_PATH),
+            margin=float(os.getenv("AGENDA_MARGEM", "0.9")),
+            logger=logger,
+        )
+
+    def load_history(self, mode: str) -> None:
+        """Tempo médio, falhas recentes e último sucesso de cada empresa no modo."""
+        if not os.path.exists(self.history_path):
+            return
+        history = RunHistory(self.history_path)
+        try:
+            rows = history.query(
+                """
+                SELECT r.empresa, r.status, r.tempo_total, e.inicio
+                FROM resultados r JOIN execucoes e ON e.id = r.execucao_id
+                WHERE e.modo = ? ORDER BY e.inicio
+                """,
+                [mode],
+            )
+        finally:
+            history.close()
+        by_company: Dict[str, List[tuple]] = defaultdict(list)
+        for empresa, status, total, inicio in rows:
+            by_company[empresa].append((status, total, inicio))
+        self.stats = {}
+        for empresa, entries in by_company.items():
+            recent = entries[-LOOKBACK_RUNS:]
+            durations = [total for _, total, _ in recent if total]
+            successes = [inicio for status, _, inicio in entries if not is_failure(status)]
+            self.stats[empresa] = {
+                "segundos": statistics.median(durations) if durations else None,
+                "falhas": sum(is_failure(status) for status, _, _ in recent),
+                # sem nenhum sucesso, conta desde a primeira tentativa
+                "desde": datetime.fromisoformat(successes[-1] if successes else entries[0][2]),
+            }
+        known = [stats["segundos"] for stats in self.stats.values() if stats["segundos"]]
+        self.default_seconds = statistics.median(known) if known else DEFAULT_COMPANY_SECONDS
+
+    def estimate(self, company: str) -> float:
+        """Duração estimada da empresa, em segundos."""
+        return self.stats.get(company, {}).get("segundos") or self.default_seconds
+
+    def _rank(self, company: str, now: datetime) -> tuple:
+        stats = self.stats.get(company)
+        if stats is None:
+            return (0, 0.0)
+        staleness = (now - stats["desde"]).total_seconds()
+        return (1, -staleness / (self.estimate(company) * (1 + stats["falhas"])))
+
+    def _load_carryover(self) -> List[str]:
+        if not os.path.exists(self.carryover_path):
+            return []
+        with open(self.carryover_path, encoding="utf-8") as carryover_file:
+            return json.load(carryover_file)
+
+    def order(self, companies: List[str]) -> List[str]:
+        """Prioridades, pendentes da execução anterior e as demais por valor."""
+        available = set(companies)
+        first = [
+            company
+            for company in dict.fromkeys(self.priorities + self._load_carryover())
+            if company in available
+        ]
+        chosen = set(first)
+        now = datetime.now()
+        # sorted é estável: sem histórico, a ordem da Troca de empresas é mantida
+        rest = sorted((c for c in companies if c not in chosen), key=lambda c: self._rank(c, now))
+        return first + rest
+
+    def plan(self, companies: List[str], mode: str) -> List[str]:
+        """Ordena ``companies`` e, com prazo, mantém só o que cabe até ele."""
+        self.load_history(mode)
+        self.scheduled = self.order(companies)
+        if self.deadline is None:
+            return self.scheduled
+        budget = (self.deadline - datetime.now()).total_seconds() * self.margin * self.sessions
+        planned, used = [], 0.0
+        for company in self.scheduled:
+            cost = self.estimate(company)
+            if used + cost <= budget:
+                planned.append(company)
+                used += cost
+        print(
+            f"Prazo {self.deadline:%d/%m %H:%M}: {len(planned)} empresas planejadas "
+            f"(~{used / 60 / self.sessions:.0f} min), "
+            f"{len(self.scheduled) - len(planned)} ficam para a próxima execução"
+        )
+        return planned
+
+    def out_of_time(self, company: str, wait: float = 0.0) -> bool:
+        """A empresa, começando daqui a ``wait`` segundos, não terminaria antes do prazo."""
+        if self.deadline is None:
+            return False
+        finish = datetime.now() + timedelta(seconds=wait + self.estimate(company))
+        return finish > self.deadline
+
+    def save_carryover(self, processed: Iterable[str]) -> None:
+        """Grava as empresas que ficaram para a próxima execução.
+
+        Com prazo, são as da fila não processadas; sem prazo, só saem da lista
+        anterior as que foram processadas agora.
+        """
+        processed = set(processed)
+        queue = self._load_carryover()
+        if self.deadline is not None:
+            queue += self.scheduled
+        remaining = [c for c in dict.fromkeys(queue) if c not in processed]
+        if not remaining and not os.path.exists(self.carryover_path):
+            return
+        with open(self.carryover_path, "w", encoding="utf-8") as carryover_file:
+            json.dump(remaining, carryover_file, ensure_ascii=False, indent=2)
+        if remaining:
+            self.logger.info(
+                "%d empresas ficam para a próxima execução (%s)",
+                len(remaining),
+                self.carryover_path,
+            )
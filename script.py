@@ -1,294 +1,82 @@
-import csv
-import json
-import os
-import re
-import time
-from datetime import datetime
-from typing import Dict, List
-import base64
-import pyautogui
-import pyperclip
-import requests
-from dotenv import load_dotenv
-from pywinauto import Application, keyboard
+"""Atualização cadastral no Domínio.
 
+Modo do :mod:`pipeline` só com a atualização: para cada empresa, troca no
+Domínio, importa os dados da Receita (com captcha) e grava, conferindo o
+quadro societário pela consulta feita ao ler o CNPJ.
+"""
 
-# caminho padrão do atalho do Domínio Registro
-APP_SHORTCUT = r"C:\Contabil\contabil.exe /registro"
+import argparse
+from typing import Optional
 
-class DominioAutomation:
-    """Automação simplificada do Domínio utilizando pywinauto."""
+from drivers import DominioDriver
+from pipeline import DominioPipeline
+from scheduler import parse_deadline
 
-    def __init__(self) -> None:
-        load_dotenv()
-        self.password = os.getenv("DOMINIO_PASSWORD", "")
-        self.captcha_key = os.getenv("CAPTCHA_2CAPTCHA_KEY", "")
+# diário gravado a cada empresa, usado pelo --resume
+JOURNAL_PATH = "journal_atualizacao.jsonl"
 
-        self.test_mode = os.getenv("TEST_MODE", "false").lower() in ("1", "true", "yes")
-        self.manual_login = os.getenv("MANUAL_LOGIN", "false").lower() in ("1", "true", "yes")
-        self.app: Application | None = None
-        self.main_window = None
-        self.log_json: List[Dict] = []
 
-    # ------------------------------------------------------------------
-    # Inicialização e login
-    # ------------------------------------------------------------------
-    def init_app(self) -> None:
-        """Abre o aplicativo Domínio a partir do atalho."""
-        self.app = Application(backend="win32").start(APP_SHORTCUT, wait_for_idle=False)
-        time.sleep(2)
-        self.app.connect(title_re=".*Domínio.*", timeout=60)
-        self.main_window = self.app.window(title_re=".*Domínio.*")
-        self.main_window.wait("visible", timeout=60)
+class DominioAutomation(DominioPipeline):
+    """Automação da atualização cadastral do Domínio."""
 
-    def login(self) -> bool:
-        """Realiza login automático ou aguarda login manual."""
-        try:
-            if not self.main_window:
-                return False
-
-            self.main_window.wait("ready", timeout=30)
-            self.main_window.set_focus()
-
-            if self.manual_login:
-                print("Aguardando login manual. Realize o login e pressione Enter...")
-                input()
-                return True
-
-            try:
-                password_edit = self.main_window.child_window(class_name="Edit")
-                password_edit.wait("ready", timeout=5)
-                password_edit.click_input()
-                pyperclip.copy(self.password)
-                pyautogui.hotkey("ctrl", "v")
-                time.sleep(0.5)
-            except Exception:  # pragma: no cover - depende da UI
-                keyboard.send_keys(self.password)
-
-            keyboard.send_keys("%o")  # Alt+O
-            time.sleep(2)
-
-            # reconecta na nova janela principal apos o login
-            self.app.connect(title_re=".*Domínio.*", timeout=60)
-            self.main_window = self.app.window(title_re=".*Domínio.*")
-            self.main_window.wait("ready")
-            self.main_window.set_focus()
-
-            return True
-        except Exception as exc:  # pragma: no cover - interação de UI
-            print(f"Erro no login: {exc}")
-            return False
-
-    # ------------------------------------------------------------------
-    # Processamento das empresas
-    # ------------------------------------------------------------------
-    def get_companies_list(self) -> List[str]:
-        """Obtém a lista de empresas através da janela de troca de empresas."""
-        try:
-            self.main_window.set_focus()
-            keyboard.send_keys("{F8}")
-            time.sleep(2)
-
-            list_box = self.main_window.child_window(class_name="ListBox")
-            companies = [item.window_text() for item in list_box.children()]
-            self.main_window.set_focus()
-            keyboard.send_keys("{ESC}")
-            return companies
-        except Exception as exc:  # pragma: no cover - interação de UI
-            print(f"Erro ao obter empresas: {exc}")
-            return []
-
-    def select_company(self, name: str) -> bool:
-        """Seleciona uma empresa na lista."""
-        try:
-            self.main_window.set_focus()
-            keyboard.send_keys("{F8}")
-            time.sleep(1)
-
-            list_box = self.main_window.child_window(class_name="ListBox")
-            list_box.select(name)
-            self.main_window.set_focus()
-            keyboard.send_keys("%o")  # confirmar
-            time.sleep(1)
-            return True
-        except Exception as exc:  # pragma: no cover - interação de UI
-            print(f"Erro ao selecionar empresa {name}: {exc}")
-            self.main_window.set_focus()
-            keyboard.send_keys("{ESC}")
-            return False
-
-    # ------------------------------------------------------------------
-    # Atualização dos dados de cada empresa
-    # ------------------------------------------------------------------
-    def update_company_data(self, company: str) -> Dict:
-        """Fluxo de atualização simplificado para uma única empresa."""
-        result: Dict[str, object] = {
-            "empresa": company,
-            "cnpj": "",
-            "status": "Erro",
-            "alteracoes": {},
-            "socios_dominio": [],
-            "socios_receita": [],
-            "divergencia_societaria": False,
-            "observacoes": "",
-        }
-
-        try:
-            self.main_window.set_focus()
-            keyboard.send_keys("%d")  # abre aba Dados (Alt+D)
-            time.sleep(2)
-
-            cnpj_edit = self.main_window.child_window(class_name="Edit")
-            cnpj_raw = cnpj_edit.window_text()
-            result["cnpj"] = re.sub(r"[^0-9]", "", cnpj_raw)
-
-            # chamar atualização pelo menu
-            self.main_window.set_focus()
-            keyboard.send_keys("%u")  # Alt+U - Atualizar Cadastro
-            time.sleep(2)
-
-            if not self.solve_captcha():
-                result["status"] = "Erro - Captcha não resolvido"
-                self.main_window.set_focus()
-                keyboard.send_keys("{ESC}")
-                return result
-
-            self.main_window.set_focus()
-            keyboard.send_keys("%i")  # Alt+I - Importar
-            time.sleep(3)
-
-            self.verify_shareholders(result)
-            self.save_changes()
-
-            result["status"] = "Atualizada com sucesso"
-            self.main_window.set_focus()
-            keyboard.send_keys("{ESC}")
-            time.sleep(1)
-            return result
-        except Exception as exc:  # pragma: no cover - interação de UI
-            result["status"] = f"Erro: {exc}"
-            result["observacoes"] = str(exc)
-            self.main_window.set_focus()
-            keyboard.send_keys("{ESC}")
-            return result
-
-    # ------------------------------------------------------------------
-    # Utilidades
-    # ------------------------------------------------------------------
-    def solve_captcha(self) -> bool:
-        """Exemplo de resolução de captcha utilizando 2Captcha."""
-        try:
-            # captura de tela do captcha
-            screenshot = pyautogui.screenshot(region=(100, 100, 300, 300))
-            screenshot.save("captcha.png")
-
-            with open("captcha.png", "rb") as img_file:
-                b64_img = base64.b64encode(img_file.read())
-
-            data = {
-                "key": self.captcha_key,
-                "method": "base64",
-                "body": b64_img,
-                "json": 1,
-            }
-            response = requests.post("http://2captcha.com/in.php", data=data)
-            result = response.json()
-            if result.get("status") != 1:
-                return False
-            captcha_id = result["request"]
-
-            for _ in range(30):
-                time.sleep(5)
-                check = requests.get(
-                    f"http://2captcha.com/res.php?key={self.captcha_key}&action=get&id={captcha_id}&json=1"
-                ).json()
-                if check.get("status") == 1:
-                    pyperclip.copy(check["request"])
-                    keyboard.send_keys("^v")
-                    return True
-                if check.get("request") != "CAPCHA_NOT_READY":
-                    break
-            return False
-        except Exception:
-            return False
-
-    def verify_shareholders(self, result: Dict) -> None:
-        """Exemplo mínimo de consulta aos sócios na ReceitaWS."""
-        if not result.get("cnpj"):
-            return
-        try:
-            time.sleep(30)
-            url = f"https://receitaws.com.br/v1/cnpj/{result['cnpj']}"
-            response = requests.get(url, timeout=30)
-            if response.status_code == 200:
-                data = response.json()
-                result["socios_receita"] = [s["nome"].upper() for s in data.get("qsa", [])]
-        except Exception as exc:  # pragma: no cover
-            result["observacoes"] += f" Erro ReceitaWS: {exc}"
-
-    def save_changes(self) -> None:
-        """Dispara o atalho para gravar as alterações."""
-        keyboard.send_keys("%g")
-        time.sleep(1)
-
-    # ------------------------------------------------------------------
-    # Registro de logs
-    # ------------------------------------------------------------------
-    def save_logs(self) -> None:
-        """Salva os resultados em arquivos CSV e JSON."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_name = f"log_atualizacao_dominio_{timestamp}.csv"
-        json_name = f"log_detalhado_{timestamp}.json"
-
-        with open(csv_name, "w", newline="", encoding="utf-8") as csv_file:
-            fieldnames = ["Empresa", "CNPJ", "Status", "Alterações", "Observações"]
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            writer.writeheader()
-            for entry in self.log_json:
-                writer.writerow(
-                    {
-                        "Empresa": entry["empresa"],
-                        "CNPJ": entry["cnpj"],
-                        "Status": entry["status"],
-                        "Alterações": len(entry["alteracoes"]),
-                        "Observações": entry["observacoes"],
-                    }
-                )
-
-        with open(json_name, "w", encoding="utf-8") as json_file:
-            json.dump(self.log_json, json_file, indent=2, ensure_ascii=False)
-
-        print(f"Logs salvos em {csv_name} e {json_name}")
-
-    # ------------------------------------------------------------------
-    # Execução principal
-    # ------------------------------------------------------------------
-    def run(self) -> None:
-        self.init_app()
-        if not self.login():
-            print("Falha no login")
-            return
-
-        companies = self.get_companies_list()
-        if self.test_mode:
-            companies = companies[:3]
-            print("Modo teste ativo: processando apenas as 3 primeiras empresas")
-
-        print(f"Processando {len(companies)} empresas")
-        for company in companies:
-            if not self.select_company(company):
-                continue
-            result = self.update_company_data(company)
-            self.log_json.append(result)
-
-        self.save_logs()
-
-        if self.app:
-            self.app.kill()
+    def __init__(
+        self,
+        resume: bool = False,
+        driver: Optional[DominioDriver] = None,
+        journal_path: str = JOURNAL_PATH,
+        differential: Optional[bool] = None,
+    ) -> None:
+        super().__init__(
+            update=True,
+            consulta=False,
+            resume=resume,
+            driver=driver,
+            journal_path=journal_path,
+            differential=differential,
+        )
 
 
 def main() -> None:
-    automation = DominioAutomation()
+    parser = argparse.ArgumentParser(description="Atualização cadastral no Domínio")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="retoma a execução anterior, pulando empresas já concluídas",
+    )
+    parser.add_argument(
+        "--diferencial",
+        action="store_true",
+        default=None,
+        help="abre a atualização somente para empresas com cadastro alterado na Receita",
+    )
+    parser.add_argument(
+        "--sessoes",
+        type=int,
+        default=1,
+        help="número de sessões do Domínio processando em paralelo",
+    )
+    parser.add_argument(
+        "--anexar",
+        action="store_true",
+        help="usa o Domínio já aberto e logado, sem abrir outro nem encerrá-lo ao final",
+    )
+    parser.add_argument(
+        "--prazo",
+        help="horário limite (HH:MM ou data e hora ISO); o que não couber fica para a próxima",
+    )
+    args = parser.parse_args()
+    deadline = parse_deadline(args.prazo) if args.prazo else None
+    if args.sessoes > 1:
+        from orchestrator import SessionOrchestrator
+
+        SessionOrchestrator(
+            args.sessoes, resume=args.resume, differential=args.diferencial, deadline=deadline
+        ).run()
+        return
+    automation = DominioAutomation(resume=args.resume, differential=args.diferencial)
+    automation.attach = automation.attach or args.anexar
+    if deadline:
+        automation.scheduler.deadline = deadline
     automation.run()
 
 
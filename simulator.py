@@ -0,0 +1,524 @@
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from captcha_image import compact_png
+from company_index import CompanyIndex
+from drivers import DominioDriver
+
+# Árvore de controles do Domínio, conforme inspecionada em Elementos.txt
+CONTROL_TREE: Dict[str, Dict] = {
+    "login": {
+        "title": "Conectando ...",
+        "class_name": "FNWNS3190",
+        "controls": {
+            "senha": {"auto_id": "1007", "class_name": "Edit"},
+            "ok": {"auto_id": "1003", "class_name": "Button"},
+        },
+    },
+    "principal": {
+        "title": "Domínio Registro - Versão: 10.5A-06 - 09",
+        "class_name": "FNWND3190",
+        "controls": {},
+    },
+    "troca_empresas": {
+        "title": "Troca de empresas",
+        "auto_id": "203",
+        "class_name": "FNWND3190",
+        "controls": {
+            "pesquisar": {"auto_id": "1003", "class_name": "Edit"},
+            "empresas": {"auto_id": "1011", "class_name": "pbdw190"},
+            "dados": {"auto_id": "1006", "class_name": "Button"},
+        },
+    },
+    "dados": {
+        "auto_id": "1000",
+        "class_name": "PBTabControl32_100",
+        "controls": {
+            "cnpj": {"class_name": "Edit"},
+            "capital_social": {"auto_id": "13", "class_name": "PBEDIT190"},
+            "socios": {"auto_id": "1010", "class_name": "pbdw190"},
+        },
+    },
+    "atualizacao": {
+        "class_name": "FNWND3190",
+        "controls": {"captcha": {"class_name": "Static"}},
+    },
+}
+
+# latência padrão de cada ação da interface, em segundos
+DEFAULT_LATENCIES: Dict[str, float] = {
+    "abrir": 3.0,
+    "login": 2.0,
+    "anexar": 0.2,
+    "f8": 0.4,
+    "selecionar": 0.3,
+    "confirmar": 0.3,
+    "dados": 0.4,
+    "esc": 0.1,
+    "atualizar": 1.0,
+    "captcha": 0.05,
+    "importar": 1.5,
+    "gravar": 0.5,
+}
+
+
+class SimulatedUIError(RuntimeError):
+    """Falha injetada pelo simulador."""
+
+
+def generate_portfolio(size: int, seed: int = 0) -> List[Dict]:
+    """Gera uma carteira sintética de empresas com CNPJ e quadro societário."""
+    rng = random.Random(seed)
+    portfolio = []
+    for index in range(size):
+        cnpj = f"{rng.randrange(10**7, 10**8)}0001{rng.randrange(10, 100)}"
+        portfolio.append(
+            {
+                "nome": f"EMPRESA SIMULADA {index + 1:04d} LTDA",
+                "cnpj": cnpj,
+                "capital_social": f"{rng.randrange(1, 500) * 1000:,}".replace(",", ".") + ",00",
+                "socios": [f"SOCIO {index + 1:04d}-{n}" for n in range(rng.randint(1, 3))],
+            }
+        )
+    return portfolio
+
+
+def write_open_data_dump(portfolio: List[Dict], directory: str, files: int = 2) -> List[str]:
+    """Grava zips sintéticos no layout dos Dados Abertos (Sócios e Qualificações)."""
+    os.makedirs(directory, exist_ok=True)
+    rows: List[List[str]] = [[] for _ in range(files)]
+    for index, entry in enumerate(portfolio):
+        for nome in entry["socios"]:
+            fields = [entry["cnpj"][:8], "2", nome, "***123456**", "49", "20200101", "", "***000000**", "", "00", "4"]
+            rows[index % files].append(";".join(f'"{field}"' for field in fields))
+    paths = []
+    for number, lines in enumerate(rows):
+        path = os.path.join(directory, f"Socios{number}.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(f"SOCIOCSV{number}", "\n".join(lines).encode("latin-1"))
+        paths.append(path)
+    path = os.path.join(directory, "Qualificacoes.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("QUALSCSV", '"49";"Sócio-Administrador"\n'.encode("latin-1"))
+    paths.append(path)
+    return paths
+
+
+def parse_failure_rates(values: Iterable[str]) -> Dict[str, float]:
+    """Converte entradas ``ACAO=TAXA`` (ex.: ``importar=0.05``) em taxas de falha."""
+    rates = {}
+    for value in values:
+        action, _, rate = value.strip().partition("=")
+        if action:
+            rates[action] = float(rate)
+    return rates
+
+
+def _png(width: int, height: int, pixels: bytes) -> bytes:
+    """Codifica uma imagem em tons de cinza (8 bits) como PNG."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    rows = b"".join(
+        b"\x00" + pixels[y * width : (y + 1) * width] for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+class SimulatedDominio:
+    """Domínio simulado em processo, para testes e benchmarks fora do Windows.
+
+    Mantém a pilha de janelas abertas segundo ``CONTROL_TREE`` e valida cada
+    ação contra ela, aplicando a latência configurada e, com a probabilidade
+    de ``failure_rates``, uma falha :class:`SimulatedUIError`. Com ``running``
+    o Domínio já está aberto e logado, pronto para :meth:`SimulatedDriver.attach`.
+    """
+
+    def __init__(
+        self,
+        portfolio: List[Dict],
+        latencies: Optional[Dict[str, float]] = None,
+        failure_rates: Optional[Dict[str, float]] = None,
+        time_scale: float = 1.0,
+        seed: int = 0,
+        running: bool = False,
+    ) -> None:
+        self.portfolio = portfolio
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.failure_rates = failure_rates or {}
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.running = running
+        self.windows: List[str] = ["principal"] if running else []
+        self.active: Optional[Dict] = None
+        self.highlighted: Optional[Dict] = None
+        self.captcha_answer = ""
+        self.captcha_refused = False
+        self.actions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SimulatedDominio":
+        return cls(
+            generate_portfolio(int(os.getenv("SIMULADOR_EMPRESAS", "20"))),
+            failure_rates=parse_failure_rates(os.getenv("SIMULADOR_FALHAS", "").split(",")),
+            time_scale=float(os.getenv("SIMULADOR_ESCALA", "1.0")),
+            running=os.getenv("SIMULADOR_ABERTO", "false").lower() in ("1", "true", "yes"),
+        )
+
+    def act(self, action: str, requires: Optional[str] = None) -> None:
+        """Executa uma ação: confere a janela ativa, aplica latência e falhas."""
+        with self._lock:
+            self.actions[action] = self.actions.get(action, 0) + 1
+            fail = self.rng.random() < self.failure_rates.get(action, 0.0)
+        if requires and (not self.windows or self.windows[-1] != requires):
+            top = self.windows[-1] if self.windows else "nenhuma"
+            raise SimulatedUIError(f"{action}: janela {requires} esperada, ativa {top}")
+        time.sleep(self.latencies.get(action, 0.0) * self.time_scale)
+        if fail:
+            raise SimulatedUIError(f"Falha simulada em {action}")
+
+    def control(self, window: str, name: str) -> Dict:
+        """Retorna a especificação de um controle de uma janela aberta."""
+        if window not in self.windows:
+            raise SimulatedUIError(f"Janela {window} não está aberta")
+        return CONTROL_TREE[window]["controls"][name]
+
+
+class SimulatedDriver(DominioDriver):
+    """Implementação de :class:`DominioDriver` sobre o :class:`SimulatedDominio`."""
+
+    def __init__(self, dominio: SimulatedDominio) -> None:
+        super().__init__()
+        self.dominio = dominio
+        self._last_captcha = b""
+
+    def open_app(self) -> None:
+        self.dominio.act("abrir")
+        self.dominio.windows = ["login"]
+
+    def attach(self) -> None:
+        if not self.dominio.running:
+            raise LookupError("Nenhum Domínio logado encontrado")
+        self.dominio.act("anexar")
+        self.dominio.windows = ["principal"]
+        self.logged_in = self.attached = True
+
+    def login(self, password: str, manual: bool = False) -> None:
+        self.dominio.control("login", "senha")
+        self.dominio.act("login", requires="login")
+        self.dominio.windows = ["principal"]
+        self.dominio.running = self.logged_in = True
+
+    def list_companies(self) -> List[str]:
+        self._open_switcher()
+        self.dominio.control("troca_empresas", "empresas")
+        companies = [entry["nome"] for entry in self.dominio.portfolio]
+        self.company_index = CompanyIndex(companies)
+        self.close_switcher()
+        return companies
+
+    def _open_switcher(self) -> None:
+        self.dominio.act("f8", requires="principal")
+        self.dominio.windows.append("troca_empresas")
+
+    def _pick(self, name: str) -> None:
+        self._open_switcher()
+        entry = self.company_index.lookup(name)
+        company = self.dominio.portfolio[entry.position] if entry else None
+        if company is None:
+            self.close_switcher()
+            raise LookupError(f"Empresa {name} não encontrada")
+        self.dominio.act("selecionar", requires="troca_empresas")
+        self.dominio.highlighted = company
+
+    def select_company(self, name: str) -> None:
+        self._pick(name)
+        self.dominio.act("confirmar", requires="troca_empresas")
+        self.dominio.windows.pop()
+        self.dominio.active = self.dominio.highlighted
+
+    def open_switcher_data(self, name: str) -> None:
+        self._pick(name)
+        self.dominio.control("troca_empresas", "dados")
+        self.dominio.act("dados", requires="troca_empresas")
+        self.dominio.windows.append("dados")
+
+    def open_company_data(self) -> None:
+        self.dominio.act("dados", requires="principal")
+        self.dominio.highlighted = self.dominio.active
+        self.dominio.windows.append("dados")
+
+    def read_cnpj(self) -> str:
+        self.dominio.control("dados", "cnpj")
+        return self.dominio.highlighted["cnpj"]
+
+    def read_company_fields(self) -> Dict[str, object]:
+        self.dominio.control("dados", "capital_social")
+        self.dominio.control("dados", "socios")
+        company = self.dominio.highlighted
+        return {"capital_social": company["capital_social"], "socios": list(company["socios"])}
+
+    def _close(self, window: str) -> None:
+        self.dominio.act("esc", requires=window)
+        self.dominio.windows.pop()
+
+    def close_company_data(self) -> None:
+        self._close("dados")
+
+    def close_switcher(self) -> None:
+        self._close("troca_empresas")
+
+    def open_update(self) -> None:
+        # a atualização cadastral substitui a janela de dados; um único ESC
+        # volta para a janela principal
+        self.dominio.act("atualizar", requires="dados")
+        self.dominio.windows[-1] = "atualizacao"
+        self.dominio.captcha_answer = ""
+
+    def capture_captcha(self) -> bytes:
+        self.dominio.control("atualizacao", "captcha")
+        rates = self.dominio.failure_rates
+        rng = self.dominio.rng
+        # falhas de captura: imagem ainda não carregada ou captcha não renovado
+        if rng.random() < rates.get("captcha_branco", 0.0):
+            return compact_png(_png(200, 80, b"\xff" * 200 * 80))
+        if self._last_captcha and rng.random() < rates.get("captcha_repetido", 0.0):
+            return self._last_captcha
+        # controle de 200x80 com moldura branca em volta do texto de 120x40
+        pixels = bytearray(b"\xff" * 200 * 80)
+        for y in range(20, 60):
+            pixels[y * 200 + 40 : y * 200 + 160] = bytes(rng.randrange(256) for _ in range(120))
+        self._last_captcha = compact_png(_png(200, 80, bytes(pixels)))
+        return self._last_captcha
+
+    def type_captcha(self, text: str) -> None:
+        self.dominio.act("captcha", requires="atualizacao")
+        self.dominio.captcha_answer = text
+
+    def import_data(self) -> None:
+        if not self.dominio.captcha_answer:
+            raise SimulatedUIError("Captcha não informado")
+        if self.dominio.rng.random() < self.dominio.failure_rates.get("captcha_recusado", 0.0):
+            # o Domínio mostra o aviso e um novo captcha, sem importar
+            self.dominio.captcha_refused = True
+            self.dominio.captcha_answer = ""
+            return
+        self.dominio.act("importar", requires="atualizacao")
+
+    def captcha_rejected(self) -> bool:
+        refused = self.dominio.captcha_refused
+        self.dominio.captcha_refused = False
+        return refused
+
+    def save(self) -> None:
+        self.dominio.act("gravar", requires="atualizacao")
+
+    def close_update(self) -> None:
+        self._close("atualizacao")
+
+    def escape(self) -> None:
+        if len(self.dominio.windows) > 1:
+            self.dominio.windows.pop()
+
+    def screenshot(self, path: str) -> None:
+        with open(path, "wb") as image:
+            image.write(_png(1, 1, b"\x00"))
+
+    def close(self) -> None:
+        if not self.attached:
+            self.dominio.windows = []
+            self.dominio.running = False
+        self.logged_in = self.attached = False
+
+
+class FakeServices:
+    """Servidor HTTP local que imita a ReceitaWS, a BrasilAPI e a API do 2Captcha.
+
+    Os provedores de CNPJ simulados respondem 429 quando a cota de cada um por
+    janela de tempo é excedida, o que permite detectar regressões nos
+    limitadores de taxa, e 503 enquanto estiverem em ``outages``; com
+    ``captcha`` em ``outages`` o 2Captcha aceita as imagens mas nunca as
+    resolve, como num serviço sobrecarregado. A janela
+    é reduzida em ``jitter`` segundos (valor absoluto, não escalado) para não
+    acusar atrasos de agendamento de threads quando ``time_scale`` é pequeno.
+    """
+
+    def __init__(
+        self,
+        portfolio: List[Dict],
+        receita_quota: int = 3,
+        brasilapi_quota: int = 10,
+        quota_window: float = 60.0,
+        receita_latency: float = 0.3,
+        captcha_solve_time: float = 12.0,
+        time_scale: float = 1.0,
+        jitter: float = 0.05,
+    ) -> None:
+        self.by_cnpj = {entry["cnpj"]: entry for entry in portfolio}
+        self.quotas = {"receita": receita_quota, "brasilapi": brasilapi_quota}
+        self.quota_window = max(quota_window * time_scale - jitter, 0.0)
+        self.receita_latency = receita_latency * time_scale
+        self.captcha_solve_time = captcha_solve_time * time_scale
+        self.calls: Dict[str, deque] = {name: deque() for name in self.quotas}
+        # serviços fora do ar ("receita", "brasilapi" ou "captcha")
+        self.outages: set = set()
+        self.counters = {
+            "receita": 0,
+            "receita_429": 0,
+            "receita_503": 0,
+            "brasilapi": 0,
+            "brasilapi_429": 0,
+            "brasilapi_503": 0,
+            "captcha_in": 0,
+            "captcha_res": 0,
+            "captcha_reportbad": 0,
+        }
+        self.captchas: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServices":
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, payload: Dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                if url.path.startswith("/v1/cnpj/"):
+                    self._send(*services.receita(url.path.rsplit("/", 1)[-1]))
+                elif url.path.startswith("/api/cnpj/v1/"):
+                    self._send(*services.brasilapi(url.path.rsplit("/", 1)[-1]))
+                elif url.path == "/res.php":
+                    query = parse_qs(url.query)
+                    if query.get("action") == ["reportbad"]:
+                        services.counters["captcha_reportbad"] += 1
+                        self._send(200, {"status": 1, "request": "OK_REPORT_RECORDED"})
+                    else:
+                        self._send(200, services.captcha_result(query))
+                else:
+                    self._send(404, {"status": "ERROR"})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if urlparse(self.path).path == "/in.php":
+                    self._send(200, services.captcha_submit())
+                else:
+                    self._send(404, {"status": "ERROR"})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _provider_call(self, name: str) -> Optional[tuple[int, Dict]]:
+        """Aplica a cota e a indisponibilidade simuladas; ``None`` se a chamada passa."""
+        with self._lock:
+            now = time.monotonic()
+            calls = self.calls[name]
+            while calls and now - calls[0] >= self.quota_window:
+                calls.popleft()
+            self.counters[name] += 1
+            if name in self.outages:
+                self.counters[f"{name}_503"] += 1
+                return 503, {"message": "Service Unavailable"}
+            if len(calls) >= self.quotas[name]:
+                self.counters[f"{name}_429"] += 1
+                return 429, {"status": "ERROR", "message": "Too many requests"}
+            calls.append(now)
+        time.sleep(self.receita_latency)
+        return None
+
+    def receita(self, cnpj: str) -> tuple[int, Dict]:
+        refused = self._provider_call("receita")
+        if refused:
+            return refused
+        entry = self.by_cnpj.get(cnpj)
+        if entry is None:
+            return 200, {"status": "ERROR", "message": "CNPJ inválido"}
+        return 200, {
+            "status": "OK",
+            "cnpj": cnpj,
+            "nome": entry["nome"],
+            "capital_social": entry["capital_social"],
+            "qsa": [{"nome": nome, "qual": "49-Sócio-Administrador"} for nome in entry["socios"]],
+        }
+
+    def brasilapi(self, cnpj: str) -> tuple[int, Dict]:
+        refused = self._provider_call("brasilapi")
+        if refused:
+            return refused
+        entry = self.by_cnpj.get(cnpj)
+        if entry is None:
+            return 404, {"message": "CNPJ não encontrado"}
+        return 200, {
+            "cnpj": cnpj,
+            "razao_social": entry["nome"],
+            "capital_social": float(entry["capital_social"].replace(".", "").replace(",", ".")),
+            "qsa": [
+                {
+                    "nome_socio": nome,
+                    "codigo_qualificacao_socio": 49,
+                    "qualificacao_socio": "Sócio-Administrador",
+                }
+                for nome in entry["socios"]
+            ],
+        }
+
+    def captcha_submit(self) -> Dict:
+        with self._lock:
+            self.counters["captcha_in"] += 1
+            captcha_id = str(len(self.captchas) + 1)
+            if "captcha" in self.outages:
+                self.captchas[captcha_id] = float("inf")
+            else:
+                self.captchas[captcha_id] = time.monotonic() + self.captcha_solve_time
+        return {"status": 1, "request": captcha_id}
+
+    def captcha_result(self, query: Dict) -> Dict:
+        with self._lock:
+            self.counters["captcha_res"] += 1
+            ready_at = self.captchas.get(query.get("id", [""])[0])
+        if ready_at is None:
+            return {"status": 0, "request": "ERROR_WRONG_CAPTCHA_ID"}
+        if time.monotonic() < ready_at:
+            return {"status": 0, "request": "CAPCHA_NOT_READY"}
+        return {"status": 1, "request": "abc12"}
@@ -0,0 +1,37 @@
+"""Cliente do 2Captcha (``captcha.py``) contra o serviço falso do simulador."""
+
+import pytest
+
+from captcha import CaptchaError, CaptchaPaused, CaptchaSolver
+from rate_limit import CircuitBreaker
+from simulator import FakeServices, generate_portfolio
+
+
+@pytest.fixture
+def services():
+    services = FakeServices(generate_portfolio(1), time_scale=0.01).start()
+    yield services
+    services.stop()
+
+
+def test_breaker_pauses_the_solver_without_sending_images(services):
+    # imagens aceitas mas nunca resolvidas, como num serviço sobrecarregado
+    services.outages.add("captcha")
+    solver = CaptchaSolver(
+        "chave",
+        base_url=services.base_url,
+        first_poll=0.02,
+        min_poll=0.02,
+        max_poll=0.05,
+        timeout=0.2,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0),
+    )
+    for _ in range(2):
+        with pytest.raises(CaptchaError, match="Tempo esgotado"):
+            solver.solve(b"captcha")
+
+    with pytest.raises(CaptchaPaused) as paused:
+        solver.solve(b"captcha")
+    assert 0 < paused.value.retry_after <= 60.0
+    assert solver.calls["envio"] == services.counters["captcha_in"] == 2
+    solver.close()
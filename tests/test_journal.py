@@ -0,0 +1,64 @@
+"""Diário de resultados (``journal.py``): quedas no meio da gravação e --resume."""
+
+import json
+
+from journal import ResultJournal, write_json_array
+
+
+def _result(empresa: str, status: str) -> dict:
+    return {"empresa": empresa, "status": status}
+
+
+def test_last_record_of_each_company_wins(tmp_path):
+    journal = ResultJournal(str(tmp_path / "diario.jsonl"))
+    journal.record(_result("A", "Erro"), concluida=False)
+    journal.record(_result("B", "Atualizada com sucesso"), concluida=True)
+    journal.record(_result("A", "Atualizada com sucesso"), concluida=True)
+    journal.record(_result("B", "Erro na releitura"), concluida=False)
+
+    assert journal.completed() == {"A"}
+    assert list(journal.iter_results()) == [
+        _result("A", "Atualizada com sucesso"),
+        _result("B", "Erro na releitura"),
+    ]
+    journal.close()
+
+
+def test_resume_ignores_a_line_truncated_by_a_crash(tmp_path):
+    path = tmp_path / "diario.jsonl"
+    journal = ResultJournal(str(path))
+    journal.record(_result("A", "Atualizada com sucesso"), concluida=True)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as crashed:
+        crashed.write('{"empresa": "B", "concluida": tr')
+
+    resumed = ResultJournal(str(path), resume=True)
+    resumed.record(_result("C", "Atualizada com sucesso"), concluida=True)
+
+    # o registro de C começa numa linha própria, depois da linha truncada
+    assert path.read_text("utf-8").splitlines()[1] == '{"empresa": "B", "concluida": tr'
+    assert resumed.completed() == {"A", "C"}
+    assert [result["empresa"] for result in resumed.iter_results()] == ["A", "C"]
+    resumed.close()
+
+
+def test_new_run_keeps_the_previous_journal_aside(tmp_path):
+    path = tmp_path / "diario.jsonl"
+    first = ResultJournal(str(path))
+    first.record(_result("A", "Atualizada com sucesso"), concluida=True)
+    first.close()
+
+    second = ResultJournal(str(path))
+
+    assert second.completed() == set()
+    assert (tmp_path / "diario.jsonl.anterior").exists()
+    second.close()
+
+
+def test_write_json_array_streams_a_valid_array(tmp_path):
+    path = tmp_path / "log.json"
+    write_json_array(str(path), (_result(name, "ok") for name in "AB"))
+    assert json.loads(path.read_text("utf-8")) == [_result("A", "ok"), _result("B", "ok")]
+
+    write_json_array(str(path), [])
+    assert json.loads(path.read_text("utf-8")) == []
@@ -0,0 +1,104 @@
+"""Índice offline do quadro societário (``open_data.py``) sobre zips sintéticos."""
+
+import os
+import zipfile
+
+import pytest
+
+from open_data import OpenDataIndex, import_dump, index_dir
+
+
+def _zip(path, member: str, rows) -> str:
+    lines = "\n".join(";".join(f'"{field}"' for field in row) for row in rows)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(member, lines.encode("latin-1"))
+    return str(path)
+
+
+def _socio(basico: str, nome: str, qualificacao: str = "49") -> list:
+    # layout do arquivo de Sócios: só as colunas 0, 2 e 4 são usadas
+    return [basico, "2", nome, "***123456**", qualificacao, "20200101", "", "", "", "00", "4"]
+
+
+@pytest.fixture
+def dump(tmp_path):
+    source = tmp_path / "dump"
+    source.mkdir()
+    _zip(source / "Qualificacoes.zip", "QUALS", [["49", "Sócio-Administrador"], ["22", "Sócio"]])
+    _zip(
+        source / "Socios0.zip",
+        "SOCIOS0",
+        [_socio("12345678", "JOÃO DA SILVA"), _socio("00001234", "ANA PEREIRA", "22")],
+    )
+    _zip(source / "Socios1.zip", "SOCIOS1", [_socio("12345678", "MARIA SOUZA", "22")])
+    return source
+
+
+def test_lookup_merges_partners_from_every_file(dump, tmp_path):
+    stats = import_dump([str(dump)], str(tmp_path / "indice"), chunk_rows=1)
+    assert stats == {"socios_lidos": 3, "arquivos_lidos": 2, "cnpjs": 2}
+
+    index = OpenDataIndex(str(tmp_path / "indice"))
+    try:
+        assert len(index) == 2
+        assert sorted(index.qsa("12345678000190"), key=lambda s: s["nome"]) == [
+            {"nome": "JOÃO DA SILVA", "qual": "49-Sócio-Administrador"},
+            {"nome": "MARIA SOUZA", "qual": "22-Sócio"},
+        ]
+        assert index.lookup("00001234000155") == {
+            "cnpj": "00001234000155",
+            "qsa": [{"nome": "ANA PEREIRA", "qual": "22-Sócio"}],
+            "fonte": "dados_abertos",
+        }
+        assert index.lookup("99999999000199") is None
+        assert index.qsa("123") is None
+    finally:
+        index.close()
+
+
+def test_refresh_reads_only_changed_files(dump, tmp_path):
+    target = str(tmp_path / "indice")
+    import_dump([str(dump)], target)
+
+    unchanged = import_dump([str(dump)], target)
+    assert unchanged["arquivos_lidos"] == 0
+    assert unchanged["cnpjs"] == 2
+
+    _zip(
+        dump / "Socios1.zip",
+        "SOCIOS1",
+        [_socio("12345678", "MARIA SOUZA", "22"), _socio("55555555", "NOVA SOCIA LTDA ME")],
+    )
+    refreshed = import_dump([str(dump)], target)
+    assert refreshed["arquivos_lidos"] == 1
+    assert refreshed["socios_lidos"] == 2
+    assert refreshed["cnpjs"] == 3
+
+
+def test_index_open_during_refresh_keeps_its_version(dump, tmp_path):
+    target = str(tmp_path / "indice")
+    import_dump([str(dump)], target)
+    before = OpenDataIndex(target)
+    try:
+        os.remove(dump / "Socios1.zip")
+        import_dump([str(dump)], target)
+
+        # a execução em andamento continua lendo a versão que abriu
+        assert len(before.qsa("12345678000190")) == 2
+        after = OpenDataIndex(target)
+        try:
+            assert after.qsa("12345678000190") == [
+                {"nome": "JOÃO DA SILVA", "qual": "49-Sócio-Administrador"}
+            ]
+        finally:
+            after.close()
+    finally:
+        before.close()
+    assert index_dir(target) == os.path.join(target, "indice_2")
+
+
+def test_from_env_without_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPEN_DATA_DIR", str(tmp_path))
+    assert OpenDataIndex.from_env() is None
+    with pytest.raises(FileNotFoundError):
+        OpenDataIndex(str(tmp_path))
@@ -0,0 +1,100 @@
+"""Várias sessões do Domínio simulado (``orchestrator.py``) com cota compartilhada."""
+
+import json
+import os
+import socket
+import threading
+import urllib.request
+from functools import partial
+
+import pytest
+
+from benchmark import _scale_session
+from orchestrator import SESSION_JOURNAL, SessionOrchestrator
+from simulator import FakeServices, generate_portfolio
+
+COMPANIES = 8
+SCALE = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    # as sessões (processos novos) montam a mesma carteira pelo SIMULADOR_EMPRESAS
+    services = FakeServices(generate_portfolio(COMPANIES), time_scale=SCALE).start()
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "DOMINIO_DRIVER": "simulado",
+        "SIMULADOR_EMPRESAS": str(COMPANIES),
+        "SIMULADOR_ESCALA": str(SCALE),
+        "SIMULADOR_FALHAS": "",
+        "RECEITAWS_URL": services.base_url + "/v1/cnpj/{cnpj}",
+        "CNPJ_PROVEDORES": "receitaws",
+        "CAPTCHA_API_URL": services.base_url,
+        "CNPJ_CACHE": "false",
+        "OPEN_DATA_DIR": "",
+        "TEST_MODE": "false",
+        "MANUAL_LOGIN": "false",
+        "DOMINIO_ANEXAR": "false",
+        "AGENDA_PRAZO": "",
+        "METRICAS_PORTA": "",
+    }.items():
+        monkeypatch.setenv(name, value)
+    yield services
+    services.stop()
+
+
+def _orchestrator() -> SessionOrchestrator:
+    return SessionOrchestrator(2, time_scale=SCALE, setup=partial(_scale_session, SCALE))
+
+
+def test_sessions_share_the_queue_and_the_quota(services):
+    orchestrator = _orchestrator()
+    orchestrator.run()
+
+    results = list(orchestrator.journal.iter_results())
+    names = {entry["nome"] for entry in services.by_cnpj.values()}
+    assert sorted(result["empresa"] for result in results) == sorted(names)
+    assert {result["status"] for result in results} == {"Atualizada com sucesso"}
+    # cada empresa foi processada por uma única sessão
+    assert services.counters["captcha_in"] == COMPANIES
+    # duas sessões juntas não passaram da cota da ReceitaWS
+    assert services.counters["receita"] == COMPANIES
+    assert services.counters["receita_429"] == 0
+    assert not any(os.path.exists(SESSION_JOURNAL.format(index=i)) for i in range(2))
+
+
+def test_metrics_cover_every_session(services, monkeypatch):
+    port = _free_port()
+    monkeypatch.setenv("METRICAS_PORTA", str(port))
+    seen = []
+    finished = threading.Event()
+
+    def poll() -> None:
+        while not finished.is_set():
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=1) as reply:
+                    seen.append(json.load(reply)["empresas"])
+            except OSError:
+                pass
+            finished.wait(0.05)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    orchestrator = _orchestrator()
+    try:
+        orchestrator.run()
+    finally:
+        finished.set()
+        poller.join()
+
+    # o coordenador serve a carteira inteira, não a fatia de uma sessão
+    assert seen and all(status["planejadas"] == COMPANIES for status in seen)
+    assert max(status["concluidas"] for status in seen) > COMPANIES // 2
+    final = orchestrator.coordinator.progress.snapshot()
+    assert (final["concluidas"], final["restantes"]) == (COMPANIES, 0)
@@ -0,0 +1,115 @@
+"""Colheita, resolução e aplicação (``phases.py``) em execuções separadas."""
+
+import pytest
+
+from phases import ApplyPhase, HarvestPhase, PhaseStore, ResolvePhase
+from pipeline import STATUS_SUCESSO
+from rate_limit import TokenBucket
+from simulator import FakeServices, SimulatedDominio, SimulatedDriver, generate_portfolio
+
+SCALE = 0.01
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    services = FakeServices(generate_portfolio(4, seed=11), receita_quota=100, time_scale=SCALE)
+    services.start()
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "RECEITAWS_URL": services.base_url + "/v1/cnpj/{cnpj}",
+        "CNPJ_PROVEDORES": "receitaws",
+        "CAPTCHA_API_URL": services.base_url,
+        "CNPJ_CACHE": "true",
+        "CNPJ_CACHE_ONLY": "false",
+        "OPEN_DATA_DIR": "",
+        "TEST_MODE": "false",
+        "MANUAL_LOGIN": "false",
+        "DOMINIO_ANEXAR": "false",
+        "AGENDA_PRAZO": "",
+        "METRICAS_PORTA": "",
+    }.items():
+        monkeypatch.setenv(name, value)
+    yield services
+    services.stop()
+
+
+def _driver(services) -> SimulatedDriver:
+    portfolio = list(services.by_cnpj.values())
+    return SimulatedDriver(SimulatedDominio(portfolio, time_scale=SCALE))
+
+
+def _fast_lookups(phase) -> None:
+    for provider in phase.lookup_worker.providers:
+        provider.limiter = TokenBucket(100, per=1.0)
+
+
+def _harvest(services) -> None:
+    HarvestPhase(driver=_driver(services)).run()
+
+
+def _resolve(redo: bool = False) -> dict:
+    phase = ResolvePhase()
+    _fast_lookups(phase)
+    return phase.run(redo=redo)
+
+
+def test_redo_queries_again_instead_of_copying_the_cache(services):
+    _harvest(services)
+    assert _resolve() == {"resolvidos": 4, "erros": 0}
+    assert services.counters["receita"] == 4
+
+    # sem --refazer nada está pendente; com ele, a Receita é consultada de novo
+    assert _resolve() == {"resolvidos": 0, "erros": 0}
+    assert _resolve(redo=True) == {"resolvidos": 4, "erros": 0}
+    assert services.counters["receita"] == 8
+
+
+def test_harvest_stores_what_the_dominio_shows_and_resumes(services):
+    _harvest(services)
+
+    store = PhaseStore()
+    rows = {row["empresa"]: row for row in store.rows()}
+    store.close()
+    for entry in services.by_cnpj.values():
+        row = rows[entry["nome"]]
+        assert (row["cnpj"], row["socios_dominio"]) == (entry["cnpj"], entry["socios"])
+        assert row["receita"] is None
+
+    driver = _driver(services)
+    HarvestPhase(resume=True, driver=driver).run()
+    # todas já colhidas: nenhuma janela de dados aberta de novo
+    assert driver.dominio.actions.get("dados", 0) == 0
+
+
+def test_resolve_only_queries_what_was_harvested_since(services):
+    _harvest(services)
+    _resolve()
+
+    # uma nova colheita deixa todas pendentes de novo
+    _harvest(services)
+    assert _resolve() == {"resolvidos": 4, "erros": 0}
+    store = PhaseStore()
+    assert store.pending_resolution() == []
+    assert all(row["receita"]["qsa"] for row in store.rows())
+    store.close()
+
+
+def test_apply_uses_stored_answers_and_skips_unchanged_companies(services):
+    _harvest(services)
+    _resolve()
+    calls = services.counters["receita"]
+
+    apply = ApplyPhase(driver=_driver(services))
+    apply.captcha_solver.first_poll = apply.captcha_solver.min_poll = 0.05
+    apply.run()
+
+    statuses = [result["status"] for result in apply.journal.iter_results()]
+    assert statuses == [STATUS_SUCESSO] * 4
+    # as respostas vieram da fase de resolução, sem nova consulta
+    assert services.counters["receita"] == calls
+
+    # o cadastro aplicado já está nos hashes: nada a atualizar na próxima vez
+    again = ApplyPhase(driver=_driver(services))
+    again.run()
+    assert list(again.journal.iter_results()) == []
+    assert services.counters["captcha_in"] == 4
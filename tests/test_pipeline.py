@@ -0,0 +1,208 @@
+"""Passada única (``pipeline.py``) sobre o Domínio simulado e os serviços falsos."""
+
+import copy
+import json
+
+import pytest
+
+from pipeline import (
+    STATUS_CONSULTADA,
+    STATUS_ERRO_CONSULTA,
+    STATUS_ERRO_SELECAO,
+    STATUS_NAO_ENCONTRADA,
+    STATUS_SEM_ALTERACOES,
+    STATUS_SUCESSO,
+    DominioPipeline,
+)
+from rate_limit import TokenBucket
+from simulator import FakeServices, SimulatedDominio, SimulatedDriver, generate_portfolio
+
+SCALE = 0.01
+
+
+@pytest.fixture
+def portfolio():
+    return generate_portfolio(6, seed=3)
+
+
+@pytest.fixture
+def services(portfolio, tmp_path, monkeypatch):
+    services = FakeServices(portfolio, receita_quota=100, time_scale=SCALE).start()
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "RECEITAWS_URL": services.base_url + "/v1/cnpj/{cnpj}",
+        "CNPJ_PROVEDORES": "receitaws",
+        "CAPTCHA_API_URL": services.base_url,
+        "CNPJ_CACHE": "false",
+        "OPEN_DATA_DIR": "",
+        "TEST_MODE": "false",
+        "MANUAL_LOGIN": "false",
+        "DOMINIO_ANEXAR": "false",
+        "AGENDA_PRAZO": "",
+        "METRICAS_PORTA": "",
+    }.items():
+        monkeypatch.setenv(name, value)
+    yield services
+    services.stop()
+
+
+def _run(
+    dominio_portfolio,
+    resume: bool = False,
+    companies=None,
+    differential: bool = False,
+    **dominio,
+) -> DominioPipeline:
+    driver = SimulatedDriver(SimulatedDominio(dominio_portfolio, time_scale=SCALE, **dominio))
+    pipeline = DominioPipeline(driver=driver, resume=resume, differential=differential)
+    solver = pipeline.captcha_solver
+    solver.first_poll = solver.min_poll = 0.05
+    solver.max_poll = 0.2
+    solver.timeout *= SCALE
+    pipeline.captcha_recapture_interval *= SCALE
+    for provider in pipeline.lookup_worker.providers:
+        provider.limiter = TokenBucket(100, per=1.0)
+    pipeline.run(companies)
+    return pipeline
+
+
+def test_run_updates_every_company_with_one_lookup_each(portfolio, services):
+    pipeline = _run(portfolio)
+
+    results = {result["empresa"]: result for result in pipeline.journal.iter_results()}
+    assert set(results) == {entry["nome"] for entry in portfolio}
+    for entry in portfolio:
+        result = results[entry["nome"]]
+        assert result["status"] == "Atualizada com sucesso"
+        assert result["socios_receita"] == entry["socios"]
+        assert result["divergencia_societaria"] is False
+    assert services.counters["receita"] == len(portfolio)
+    assert services.counters["receita_429"] == 0
+    assert services.counters["captcha_in"] == len(portfolio)
+
+
+def test_run_reports_what_the_import_changes(portfolio, services, tmp_path):
+    # o Domínio ainda tem o capital antigo de uma empresa e um sócio que saiu de outra
+    dominio = copy.deepcopy(portfolio)
+    dominio[0]["capital_social"] = "1.000,00"
+    dominio[1]["socios"].append("SOCIO QUE SAIU")
+
+    _run(dominio)
+
+    # a conciliação anota o log detalhado, não o diário
+    (log_path,) = tmp_path.glob("log_detalhado_*.json")
+    results = {result["empresa"]: result for result in json.loads(log_path.read_text("utf-8"))}
+    capital = results[portfolio[0]["nome"]]
+    assert capital["alteracoes"]["Capital Social"] == {
+        "de": "1.000,00",
+        "para": capital["capital_social_receita"],
+    }
+    assert capital["divergencia_societaria"] is False
+    assert results[portfolio[1]["nome"]]["divergencia_societaria"] is True
+    assert not results[portfolio[2]["nome"]]["alteracoes"]
+
+
+def test_resume_skips_companies_already_completed(portfolio, services):
+    _run(portfolio)
+    calls = services.counters["receita"]
+
+    pipeline = _run(portfolio, resume=True)
+
+    assert services.counters["receita"] == calls
+    assert len(list(pipeline.journal.iter_results())) == len(portfolio)
+
+
+def test_differential_run_only_updates_companies_changed_on_the_receita(portfolio, services):
+    # o Domínio tem a sua própria cópia do cadastro
+    dominio = copy.deepcopy(portfolio)
+    _run(dominio, differential=True)
+    assert services.counters["captcha_in"] == len(portfolio)
+
+    portfolio[2]["socios"].append("SOCIO QUE ENTROU")
+    pipeline = _run(dominio, differential=True)
+
+    statuses = {result["empresa"]: result["status"] for result in pipeline.journal.iter_results()}
+    changed = portfolio[2]["nome"]
+    assert statuses.pop(changed) == STATUS_SUCESSO
+    assert set(statuses.values()) == {STATUS_SEM_ALTERACOES}
+    assert len(statuses) == len(portfolio) - 1
+    # só a empresa alterada abriu a atualização e passou pelo captcha
+    assert services.counters["captcha_in"] == len(portfolio) + 1
+    assert pipeline.driver.dominio.actions["atualizar"] == 1
+
+
+def test_missing_company_and_selection_failure_are_told_apart(portfolio, services, monkeypatch):
+    monkeypatch.setenv("REPETIR_INTERFACE", "1,0")
+    names = [entry["nome"] for entry in portfolio[:2]]
+
+    pipeline = _run(
+        portfolio,
+        companies=names + ["EMPRESA QUE NÃO EXISTE"],
+        failure_rates={"selecionar": 1.0},
+    )
+
+    results = {result["empresa"]: result for result in pipeline.journal.iter_results()}
+    assert results["EMPRESA QUE NÃO EXISTE"]["status"] == STATUS_NAO_ENCONTRADA
+    for name in names:
+        # a falha da interface foi repetida uma vez e continua registrada como tal
+        assert results[name]["status"] == STATUS_ERRO_SELECAO
+        assert "selecionar" in results[name]["observacoes"]
+    assert pipeline.driver.dominio.actions["selecionar"] == 2 * len(names)
+    assert pipeline.retries.exhausted["interface"] == len(names)
+
+
+def test_lookup_error_is_kept_apart_and_cleared_on_retry(portfolio, services, monkeypatch):
+    monkeypatch.setenv("REPETIR_RECEITA", "1,0")
+    # sem pausar o provedor: todas as consultas da passada falham
+    monkeypatch.setenv("CNPJ_FALHAS_PARA_PAUSAR", str(len(portfolio) + 1))
+    services.outages.add("receita")
+    errors = {}
+    retry_company = DominioPipeline.retry_company
+
+    def retry_after_outage(self, company, kind, payload):
+        # a consulta volta a responder antes das novas tentativas
+        errors[company] = (payload["erro_consulta"], payload["status_consulta"])
+        services.outages.discard("receita")
+        retry_company(self, company, kind, payload)
+
+    monkeypatch.setattr(DominioPipeline, "retry_company", retry_after_outage)
+    pipeline = _run(portfolio)
+
+    assert set(errors) == {entry["nome"] for entry in portfolio}
+    for error, status in errors.values():
+        assert error == "receitaws: HTTP 503 (receitaws)"
+        assert status == STATUS_ERRO_CONSULTA
+    for result in pipeline.journal.iter_results():
+        assert "erro_consulta" not in result
+        assert result["observacoes"] == ""
+        assert result["status_consulta"] == STATUS_CONSULTADA
+
+
+def test_paused_2captcha_defers_companies_until_the_pause_ends(portfolio, services, monkeypatch):
+    monkeypatch.setenv("CAPTCHA_FALHAS_PARA_PAUSAR", "1")
+    monkeypatch.setenv("CAPTCHA_PAUSA", "2")
+    monkeypatch.setenv("REPETIR_CAPTCHA", "1,0")
+    services.outages.add("captcha")
+    deferred = []
+    defer, retry_company = DominioPipeline.defer, DominioPipeline.retry_company
+
+    def record_defer(self, company, kind, payload=None, delay=0.0):
+        deferred.append((company, kind, delay))
+        defer(self, company, kind, payload, delay)
+
+    def retry_after_outage(self, company, kind, payload):
+        services.outages.discard("captcha")
+        retry_company(self, company, kind, payload)
+
+    monkeypatch.setattr(DominioPipeline, "defer", record_defer)
+    monkeypatch.setattr(DominioPipeline, "retry_company", retry_after_outage)
+    pipeline = _run(portfolio)
+
+    # a primeira empresa esgota o tempo do captcha e pausa o 2Captcha; as
+    # seguintes são adiadas até o fim da pausa, sem enviar imagens
+    assert [company for company, _, _ in deferred] == [entry["nome"] for entry in portfolio]
+    assert {kind for _, kind, _ in deferred} == {"captcha"}
+    assert all(0 < delay <= 2 for _, _, delay in deferred)
+    assert services.counters["captcha_in"] == len(portfolio) + 1
+    statuses = {result["status"] for result in pipeline.journal.iter_results()}
+    assert statuses == {STATUS_SUCESSO}
@@ -0,0 +1,121 @@
+"""Limitador de taxa e disjuntor (``rate_limit.py``) com um relógio controlado."""
+
+import multiprocessing
+
+import pytest
+
+from rate_limit import CircuitBreaker, SharedTokenBucket, TokenBucket
+
+
+class FakeClock:
+    """Relógio manual; ``sleep`` só avança o tempo."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_bucket_spaces_calls_evenly(clock):
+    bucket = TokenBucket(3, per=60.0, clock=clock, sleep=clock.sleep)
+
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == pytest.approx(20.0)
+    clock.now += 5
+    assert bucket.try_acquire() == pytest.approx(15.0)
+    clock.now += 15
+    assert bucket.try_acquire() == 0.0
+
+
+def test_bucket_never_allows_more_than_rate_per_window(clock):
+    bucket = TokenBucket(3, per=60.0, clock=clock, sleep=clock.sleep)
+    started = clock()
+    for _ in range(7):
+        bucket.acquire()
+    # 7 chamadas com capacidade 1: a última sai 6 intervalos de 20s depois da primeira
+    assert clock() - started == pytest.approx(120.0)
+    assert sum(clock.slept) == pytest.approx(120.0)
+
+
+def test_bucket_capacity_limits_the_burst_after_idle_time(clock):
+    bucket = TokenBucket(10, per=60.0, capacity=2.0, clock=clock, sleep=clock.sleep)
+    clock.now += 3600
+
+    assert bucket.available() == pytest.approx(2.0)
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == pytest.approx(6.0)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=120.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 100
+    assert breaker.retry_after() == pytest.approx(20.0)
+
+
+def test_half_open_breaker_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 60
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.retry_after() == 0.0
+    breaker.begin()
+    # enquanto a chamada de teste não termina, nenhuma outra é liberada
+    assert breaker.retry_after() > 0
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() == 0.0
+
+
+def test_failed_probe_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    breaker.begin()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(60.0)
+
+
+def _consume(bucket: SharedTokenBucket, waits) -> None:
+    waits.put(bucket.try_acquire())
+
+
+def test_shared_bucket_is_one_quota_for_every_process():
+    ctx = multiprocessing.get_context()
+    bucket = SharedTokenBucket(3, per=3600.0, capacity=2.0, ctx=ctx)
+    waits = ctx.Queue()
+    sessions = [ctx.Process(target=_consume, args=(bucket, waits)) for _ in range(2)]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join(timeout=30)
+
+    # as duas fichas foram gastas pelas sessões filhas; o pai precisa esperar
+    assert [waits.get(timeout=5), waits.get(timeout=5)] == [0.0, 0.0]
+    assert bucket.try_acquire() > 1000
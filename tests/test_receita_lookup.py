@@ -0,0 +1,104 @@
+"""Consulta de CNPJ com vários provedores (``receita_lookup.py``) contra os serviços falsos."""
+
+import pytest
+
+from providers import BrasilAPIProvider, CnpjNotFound, ReceitaWSProvider, providers_from_env
+from rate_limit import CircuitBreaker, TokenBucket
+from receita_lookup import ReceitaLookupWorker
+from simulator import FakeServices, generate_portfolio
+
+
+@pytest.fixture
+def services():
+    services = FakeServices(
+        generate_portfolio(4, seed=7), receita_quota=100, brasilapi_quota=100, time_scale=0.01
+    ).start()
+    yield services
+    services.stop()
+
+
+@pytest.fixture
+def worker(services):
+    base = services.base_url
+    worker = ReceitaLookupWorker(
+        providers=[
+            ReceitaWSProvider(
+                base + "/v1/cnpj/{cnpj}", TokenBucket(100, per=1.0), CircuitBreaker(2, 60.0)
+            ),
+            BrasilAPIProvider(base + "/api/cnpj/v1/{cnpj}", TokenBucket(100, per=1.0)),
+        ]
+    )
+    worker.start()
+    yield worker
+    worker.stop()
+
+
+def test_first_provider_answers_in_the_common_format(services, worker):
+    entry = next(iter(services.by_cnpj.values()))
+
+    data = worker.submit(entry["cnpj"]).result(timeout=10)
+
+    assert data["fonte"] == "receitaws"
+    assert [socio["nome"] for socio in data["qsa"]] == entry["socios"]
+    assert services.counters["brasilapi"] == 0
+
+
+def test_failed_lookup_moves_to_the_next_provider(services, worker):
+    services.outages.add("receita")
+    entry = next(iter(services.by_cnpj.values()))
+
+    data = worker.submit(entry["cnpj"]).result(timeout=10)
+
+    assert data["fonte"] == "brasilapi"
+    assert [socio["nome"] for socio in data["qsa"]] == entry["socios"]
+    assert data["qsa"][0]["qual"] == "49-Sócio-Administrador"
+    assert services.counters["receita_503"] == 1
+
+
+def test_open_breaker_skips_the_provider_that_is_down(services, worker):
+    services.outages.add("receita")
+    for entry in services.by_cnpj.values():
+        assert worker.submit(entry["cnpj"]).result(timeout=10)["fonte"] == "brasilapi"
+
+    # o disjuntor abriu após 2 falhas: as demais consultas nem chegaram à ReceitaWS
+    assert services.counters["receita"] == 2
+    receitaws = worker.providers[0]
+    assert receitaws.health()["disjuntor"] == CircuitBreaker.OPEN
+    assert receitaws.health()["falhas"] == 2
+
+
+def test_unknown_cnpj_is_not_retried_elsewhere(services, worker):
+    future = worker.submit("00000000000000")
+
+    with pytest.raises(CnpjNotFound):
+        future.result(timeout=10)
+    assert services.counters["brasilapi"] == 0
+
+
+def test_error_when_every_provider_fails(services, worker):
+    services.outages.update({"receita", "brasilapi"})
+    entry = next(iter(services.by_cnpj.values()))
+
+    with pytest.raises(RuntimeError, match="503"):
+        worker.submit(entry["cnpj"]).result(timeout=10)
+
+
+def test_repeated_cnpj_reuses_the_same_lookup(services, worker):
+    cnpj = next(iter(services.by_cnpj))
+
+    assert worker.submit(cnpj) is worker.submit(cnpj, empresa="EMPRESA")
+    worker.drain(timeout=10)
+    assert services.counters["receita"] == 1
+
+
+def test_each_provider_limit_comes_from_env(monkeypatch):
+    monkeypatch.setenv("CNPJ_PROVEDORES", "receitaws,brasilapi")
+    monkeypatch.setenv("BRASILAPI_CONSULTAS_POR_MINUTO", "30")
+    monkeypatch.setenv("BRASILAPI_PERIODO", "90")
+    monkeypatch.delenv("RECEITAWS_CONSULTAS_POR_MINUTO", raising=False)
+    monkeypatch.delenv("RECEITAWS_PERIODO", raising=False)
+
+    receitaws, brasilapi = providers_from_env()
+
+    assert (receitaws.limiter.rate, receitaws.limiter.per) == (3, 61.0)
+    assert (brasilapi.limiter.rate, brasilapi.limiter.per) == (30, 90)
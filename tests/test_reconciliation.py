@@ -0,0 +1,84 @@
+"""Conciliação do Domínio com a Receita (``reconciliation.py``)."""
+
+from reconciliation import reconcile, reconcile_stream, result_annotator, results_frame
+
+
+def _result(empresa, capital, socios, capital_receita="50000.00", socios_receita=("ANA",), **extra):
+    return {
+        "empresa": empresa,
+        "cnpj": f"{empresa}000100",
+        "capital_social_dominio": capital,
+        "socios_dominio": list(socios),
+        "capital_social_receita": capital_receita,
+        "socios_receita": list(socios_receita),
+        **extra,
+    }
+
+
+RESULTS = [
+    # iguais, com formatos de número e grafias diferentes
+    _result("A", "50.000,00", ["Aná "]),
+    _result("B", "10.000,00", ["ANA"]),
+    _result("C", "50.000,00", ["ANA", "BRUNO"], socios_receita=["ANA", "CARLA"]),
+    # sem resposta da Receita: fora da comparação
+    _result("D", "1,00", ["ZÉ"], capital_receita=None, socios_receita=[]),
+]
+
+
+def test_field_and_partner_differences():
+    fields, people = reconcile(results_frame(RESULTS))
+
+    assert fields[["empresa", "campo", "de", "para"]].values.tolist() == [
+        ["B", "Capital Social", "10.000,00", "50000.00"],
+        ["C", "Sócios", "ANA | BRUNO", "ANA | CARLA"],
+    ]
+    assert sorted(people[["empresa", "socio", "onde"]].values.tolist()) == [
+        ["C", "BRUNO", "só no Domínio"],
+        ["C", "CARLA", "só na Receita"],
+    ]
+    assert set(fields["momento"]) == set(people["momento"]) == {"antes"}
+
+
+def test_reread_after_saving_is_compared_separately():
+    results = [
+        _result("A", "1,00", ["ANA"], capital_social_apos="50.000,00", socios_apos=["ANA", "RUI"])
+    ]
+
+    fields, people = reconcile(results_frame(results))
+
+    assert sorted(fields[["momento", "campo"]].values.tolist()) == [
+        ["antes", "Capital Social"],
+        ["depois", "Sócios"],
+    ]
+    assert people[["momento", "socio", "onde"]].values.tolist() == [
+        ["depois", "RUI", "só no Domínio"]
+    ]
+
+
+def test_chunks_give_the_same_differences_as_one_pass():
+    whole = reconcile(results_frame(RESULTS))
+    chunked = reconcile_stream(iter(RESULTS), chunk_size=1)
+
+    for expected, actual in zip(whole, chunked):
+        assert list(actual.columns) == list(expected.columns)
+        assert actual.values.tolist() == expected.values.tolist()
+
+
+def test_empty_journal_has_no_differences():
+    fields, people = reconcile_stream(iter([]))
+    assert fields.empty and people.empty
+    assert list(fields.columns) == ["empresa", "cnpj", "momento", "campo", "de", "para"]
+
+
+def test_annotator_fills_the_result_fields():
+    annotate = result_annotator(*reconcile_stream(RESULTS))
+    blank = {"alteracoes": None, "divergencia_societaria": None}
+
+    changed = annotate(dict(RESULTS[1], **blank))
+    divergent = annotate(dict(RESULTS[2], **blank))
+    same = annotate(dict(RESULTS[0], **blank))
+
+    assert changed["alteracoes"] == {"Capital Social": {"de": "10.000,00", "para": "50000.00"}}
+    assert changed["divergencia_societaria"] is False
+    assert divergent["divergencia_societaria"] is True
+    assert same["alteracoes"] == {} and same["divergencia_societaria"] is False
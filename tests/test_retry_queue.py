@@ -0,0 +1,55 @@
+"""Fila de novas tentativas (``retry_queue.py``) com um relógio controlado."""
+
+import pytest
+
+from retry_queue import RETRY_POLICIES, RetryQueue
+
+
+@pytest.fixture
+def now():
+    return [100.0]
+
+
+@pytest.fixture
+def retries(now):
+    return RetryQueue({"captcha": (2, 60.0), "interface": (1, 15.0)}, clock=lambda: now[0])
+
+
+def test_wait_doubles_at_each_attempt_until_exhausted(retries, now):
+    assert retries.push("A", "captcha")
+    assert retries.pop() == ("A", "captcha", None, 60.0)
+    assert retries.push("A", "captcha", payload={"x": 1})
+    now[0] += 30
+    assert retries.pop() == ("A", "captcha", {"x": 1}, 90.0)
+
+    assert not retries.push("A", "captcha")
+    assert retries.exhausted == {"captcha": 1}
+    assert retries.pop() is None
+    # cada classe de erro tem as suas próprias tentativas
+    assert retries.push("A", "interface")
+
+
+def test_requested_delay_wins_over_a_shorter_backoff(retries):
+    retries.push("A", "captcha", delay=300.0)
+    retries.push("B", "captcha", delay=10.0)
+    retries.push("C", "interface")
+
+    waits = [(company, wait) for company, _, _, wait in (retries.pop() for _ in range(3))]
+    assert waits == [("C", 15.0), ("B", 60.0), ("A", 300.0)]
+
+
+def test_unknown_kind_is_not_deferred(retries):
+    assert not retries.push("A", "receita")
+    assert len(retries) == 0
+    assert not retries.exhausted
+
+
+def test_policies_from_env(monkeypatch):
+    monkeypatch.setenv("REPETIR_FALHAS", "true")
+    monkeypatch.setenv("REPETIR_CAPTCHA", "5,1.5")
+    monkeypatch.delenv("REPETIR_RECEITA", raising=False)
+    monkeypatch.delenv("REPETIR_INTERFACE", raising=False)
+    assert RetryQueue.from_env().policies == {**RETRY_POLICIES, "captcha": (5, 1.5)}
+
+    monkeypatch.setenv("REPETIR_FALHAS", "false")
+    assert not RetryQueue.from_env().push("A", "captcha")
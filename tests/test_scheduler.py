@@ -0,0 +1,59 @@
+"""Prazo e ordem da fila (``scheduler.py``)."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from scheduler import CompanyScheduler, parse_deadline
+
+NOW = datetime(2026, 10, 16, 22, 30)
+
+
+def test_time_later_today():
+    assert parse_deadline("23:45", now=NOW) == datetime(2026, 10, 16, 23, 45)
+
+
+def test_time_already_past_means_tomorrow():
+    assert parse_deadline("06:00", now=NOW) == datetime(2026, 10, 17, 6, 0)
+    assert parse_deadline("22:30", now=NOW) == datetime(2026, 10, 17, 22, 30)
+
+
+def test_iso_datetime_without_offset_is_kept():
+    assert parse_deadline("2026-10-18T05:30", now=NOW) == datetime(2026, 10, 18, 5, 30)
+
+
+def test_iso_datetime_with_offset_becomes_local_naive_time():
+    deadline = parse_deadline("2026-10-17T06:00-03:00", now=NOW)
+
+    expected = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc).astimezone()
+    assert deadline.tzinfo is None
+    assert deadline == expected.replace(tzinfo=None)
+    # comparável com datetime.now(), como no planejamento
+    assert deadline - NOW > timedelta(0)
+
+
+def test_invalid_deadline_has_a_clear_message():
+    with pytest.raises(ValueError, match="Prazo inválido"):
+        parse_deadline("amanhã cedo", now=NOW)
+
+
+def test_plan_keeps_only_what_fits_before_the_deadline(tmp_path):
+    scheduler = CompanyScheduler(
+        deadline=datetime.now() + timedelta(minutes=10),
+        priorities=["C"],
+        carryover_path=str(tmp_path / "pendentes.json"),
+        history_path=str(tmp_path / "historico.db"),
+        margin=1.0,
+    )
+
+    planned = scheduler.plan(["A", "B", "C", "D"], "atualizacao")
+
+    # sem histórico cada empresa estima 60s: 10 minutos comportam as 4
+    assert planned == ["C", "A", "B", "D"]
+
+    scheduler.deadline = datetime.now() + timedelta(seconds=150)
+    assert scheduler.plan(["A", "B", "C", "D"], "atualizacao") == ["C", "A"]
+
+    scheduler.save_carryover(["C", "A"])
+    # as que ficaram de fora vão para a frente da próxima fila
+    assert scheduler.order(["A", "B", "C", "D"]) == ["C", "B", "D", "A"]
@@ -0,0 +1,50 @@
+"""Latências das esperas da interface (``waits.py``) gravadas entre execuções."""
+
+import json
+
+from waits import HISTORY_SIZE, Waiter
+
+
+def _waiter(path, seconds: float) -> Waiter:
+    """Waiter cuja etapa ``lista_empresas`` fica pronta após ``seconds``."""
+    now = [0.0]
+
+    def sleep(interval: float) -> None:
+        now[0] += interval
+
+    waiter = Waiter(str(path), clock=lambda: now[0], sleep=sleep)
+    waiter.until("lista_empresas", lambda: now[0] >= seconds)
+    return waiter
+
+
+def test_sessions_saving_the_same_file_keep_each_others_latencies(tmp_path):
+    path = tmp_path / "wait_stats.json"
+    path.write_text(json.dumps({"login_concluido": [3.0]}), "utf-8")
+    # as duas sessões leram o arquivo antes de qualquer uma gravar
+    first = _waiter(path, 1.0)
+    second = _waiter(path, 2.0)
+
+    first.save()
+    second.save()
+    second.save()
+
+    stats = json.loads(path.read_text("utf-8"))
+    assert stats["login_concluido"] == [3.0]
+    assert len(stats["lista_empresas"]) == 2
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_history_is_trimmed_and_a_torn_file_is_replaced(tmp_path):
+    path = tmp_path / "wait_stats.json"
+    path.write_text(json.dumps({"lista_empresas": [0.5] * HISTORY_SIZE}), "utf-8")
+    waiter = _waiter(path, 1.0)
+    waiter.save()
+    stats = json.loads(path.read_text("utf-8"))
+    assert len(stats["lista_empresas"]) == HISTORY_SIZE
+    assert stats["lista_empresas"][-1] >= 1.0
+
+    # um arquivo cortado no meio é descartado na leitura e regravado inteiro
+    path.write_text('{"lista_empresas": [0.5, 0.', "utf-8")
+    assert Waiter(str(path)).latencies == {}
+    _waiter(path, 1.0).save()
+    assert len(json.loads(path.read_text("utf-8"))["lista_empresas"]) == 1
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from waits import percentile
+
+
+class Tracer:
+    """Registra a duração de cada fase do processamento (spans).
+
+    Os spans podem ser exportados no formato Chrome trace-event (abrir em
+    ``chrome://tracing`` ou no Perfetto), resumidos em p50/p95/máximo por fase
+    e somados por empresa para as colunas de tempo do CSV.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self._origin = clock()
+        self._lock = threading.Lock()
+        self.events: List[Dict] = []
+        self.durations: Dict[str, List[float]] = {}
+        self._by_company: Dict[str, Dict[str, float]] = {}
+        # spans em andamento por thread: (fase, empresa, início)
+        self._active: Dict[int, List[Tuple[str, Optional[str], float]]] = {}
+
+    @contextmanager
+    def span(self, name: str, empresa: Optional[str] = None, **args) -> Iterator[None]:
+        start = self._clock()
+        thread = threading.get_ident()
+        with self._lock:
+            self._active.setdefault(thread, []).append((name, empresa, start))
+        try:
+            yield
+        finally:
+            with self._lock:
+                stack = self._active[thread]
+                stack.pop()
+                if not stack:
+                    del self._active[thread]
+            self.add(name, start, self._clock() - start, empresa, **args)
+
+    def active(self) -> List[Dict]:
+        """Fase mais interna em andamento em cada thread, da mais longa à mais curta."""
+        now = self._clock()
+        with self._lock:
+            current = [stack[-1] for stack in self._active.values()]
+        spans = [
+            {"fase": name, "empresa": empresa, "segundos": round(now - start, 3)}
+            for name, empresa, start in current
+        ]
+        return sorted(spans, key=lambda span: -span["segundos"])
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        empresa: Optional[str] = None,
+        **args,
+    ) -> None:
+        """Registra um span já medido (``start`` no relógio do tracer)."""
+        if empresa:
+            args["empresa"] = empresa
+        event = {
+            "name": name,
+            "cat": "dominio",
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6),
+            "dur": round(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+            self.durations.setdefault(name, []).append(duration)
+            if empresa:
+                totals = self._by_company.setdefault(empresa, {})
+                totals[name] = totals.get(name, 0.0) + duration
+
+    def company_totals(self, empresa: str) -> Dict[str, float]:
+        """Tempo acumulado por fase de uma empresa, em segundos."""
+        with self._lock:
+            return {k: round(v, 3) for k, v in self._by_company.get(empresa, {}).items()}
+
+    def export_chrome_trace(self, path: str) -> None:
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {"origin": self._origin},
+                },
+                trace_file,
+            )
+
+    def load_chrome_trace(self, path: str) -> None:
+        """Incorpora os spans de um trace exportado por outro processo.
+
+        Os instantes são convertidos para a origem deste tracer, o que vale
+        para processos da mesma máquina (``perf_counter`` é comum a todos).
+        """
+        with open(path, encoding="utf-8") as trace_file:
+            data = json.load(trace_file)
+        origin = data.get("otherData", {}).get("origin", self._origin)
+        shift = round((origin - self._origin) * 1e6)
+        with self._lock:
+            for event in data["traceEvents"]:
+                event["ts"] += shift
+                self.events.append(event)
+                duration = event["dur"] / 1e6
+                self.durations.setdefault(event["name"], []).append(duration)
+                empresa = event.get("args", {}).get("empresa")
+                if empresa:
+                    totals = self._by_company.setdefault(empresa, {})
+                    totals[event["name"]] = totals.get(event["name"], 0.0) + duration
+
+    def phase_durations(self) -> Dict[str, List[float]]:
+        """Cópia das durações registradas por fase, em segundos."""
+        with self._lock:
+            return {name: list(values) for name, values in self.durations.items()}
+
+    def summary(self) -> List[Dict]:
+        """Estatísticas por fase: quantidade, p50, p95 e máximo (segundos)."""
+        items = self.phase_durations()
+        return [
+            {
+                "fase": name,
+                "n": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+                "total": sum(values),
+            }
+            for name, values in sorted(items.items(), key=lambda kv: -sum(kv[1]))
+        ]
+
+    def format_summary(self) -> str:
+        lines = [f"{'Fase':<24}{'n':>6}{'p50 (s)':>10}{'p95 (s)':>10}{'máx (s)':>10}{'total (s)':>11}"]
+        for row in self.summary():
+            lines.append(
+                f"{row['fase']:<24}{row['n']:>6}{row['p50']:>10.2f}{row['p95']:>10.2f}"
+                f"{row['max']:>10.2f}{row['total']:>11.1f}"
+            )
+        return "\n".join(lines)
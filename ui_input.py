@@ -0,0 +1,109 @@
+"""Entrada na interface do Domínio sem trocar o foco da área de trabalho.
+
+Cliques e textos vão como mensagens diretas ao handle do controle
+(``click`` e ``set_edit_text`` do pywinauto), e os atalhos são postados no
+controle com foco da thread da interface (``send_keystrokes``), sem
+``set_focus`` nem teclado global. Assim o Domínio pode ficar minimizado ou
+atrás de outras janelas, e várias sessões não disputam o foco.
+
+Cada envio é seguido da condição que mostra que ele surtiu efeito (janela
+aberta, janela fechada, campo preenchido). O teclado com foco só é usado
+quando a mensagem não pôde ser enviada (controle não encontrado ou erro no
+envio), e aquele atalho passa a usar o teclado até o fim da execução. Uma
+mensagem entregue nunca é repetida pelo teclado: se a condição não for
+atingida, o tempo esgotado é levantado como em qualquer espera, pois o
+atalho pode ter sido processado com atraso e repeti-lo fecharia (ou abriria)
+a janela errada. Com ``INTERFACE_SEM_FOCO=false`` todas as ações usam o
+teclado, como antes.
+"""
+
+import logging
+import os
+from collections import Counter
+from typing import Callable, Optional, Set
+
+from waits import Waiter
+
+
+class ControlInput:
+    """Cliques, textos e atalhos enviados aos controles sem foco.
+
+    ``fallbacks`` conta, por ação, quantas vezes foi preciso o teclado.
+    """
+
+    def __init__(
+        self,
+        waiter: Waiter,
+        enabled: bool = True,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.waiter = waiter
+        self.enabled = enabled
+        self.logger = logger or logging.getLogger(__name__)
+        self.fallbacks: Counter = Counter()
+        # atalhos que não surtiram efeito como mensagem nesta execução
+        self._keyboard_only: Set[str] = set()
+
+    @classmethod
+    def from_env(
+        cls, waiter: Waiter, logger: Optional[logging.Logger] = None
+    ) -> "ControlInput":
+        enabled = os.getenv("INTERFACE_SEM_FOCO", "true").lower() in ("1", "true", "yes")
+        return cls(waiter, enabled=enabled, logger=logger)
+
+    def _fallback(self, action: str, exc: Exception) -> None:
+        self.fallbacks[action] += 1
+        self.logger.warning("%s sem foco não surtiu efeito (%s); usando o teclado", action, exc)
+
+    def click(self, control) -> None:
+        """Clica com mensagens ao handle; sem elas, com o mouse."""
+        if self.enabled:
+            try:
+                control.click()
+                return
+            except Exception as exc:
+                self._fallback("clique", exc)
+        control.click_input()
+
+    def set_text(self, control, text: str) -> bool:
+        """Preenche o campo com ``WM_SETTEXT``; ``False`` se o texto não ficou gravado."""
+        if not self.enabled:
+            return False
+        try:
+            control.set_edit_text(text)
+            if control.window_text() == text:
+                return True
+            raise ValueError("texto não gravado no campo")
+        except Exception as exc:
+            self._fallback("texto", exc)
+            return False
+
+    def post_keys(self, target: Callable[[], object], keys: str) -> bool:
+        """Posta ``keys`` no controle devolvido por ``target``, sem verificar o efeito."""
+        if not self.enabled or keys in self._keyboard_only:
+            return False
+        try:
+            target().send_keystrokes(keys)
+            return True
+        except Exception as exc:
+            self._fallback(keys, exc)
+            self._keyboard_only.add(keys)
+            return False
+
+    def send(
+        self,
+        target: Callable[[], object],
+        keys: str,
+        step: str,
+        done: Callable[[], object],
+        keyboard: Callable[[], None],
+    ) -> object:
+        """Envia ``keys`` e aguarda ``done``; se o envio falhar, usa ``keyboard``.
+
+        Uma sequência (ex.: ``{ESC}{ESC}``) vai numa única chamada e tem uma só
+        condição de término. Devolve o valor de ``done``; se a mensagem foi
+        entregue e ``done`` não ocorreu, levanta ``WaitTimeout`` sem reenviar.
+        """
+        if not self.post_keys(target, keys):
+            keyboard()
+        return self.waiter.until(step, done)
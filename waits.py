@@ -0,0 +1,186 @@
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_STATS_PATH = "wait_stats.json"
+
+# tempo máximo de cada etapa da interface, em segundos
+STEP_TIMEOUTS: Dict[str, float] = {
+    "app_aberto": 60,
+    "login_concluido": 60,
+    "lista_empresas": 15,
+    "empresa_selecionada": 15,
+    "dados_abertos": 15,
+    "atualizacao_aberta": 30,
+    "importacao_concluida": 60,
+    "gravacao_concluida": 30,
+    "janela_fechada": 10,
+}
+
+# quantas latências por etapa são mantidas entre execuções
+HISTORY_SIZE = 200
+
+
+class WaitTimeout(TimeoutError):
+    """Condição de espera não satisfeita dentro do tempo da etapa."""
+
+
+def percentile(values: Iterable[float], q: float) -> float:
+    """Percentil ``q`` (0-100) por interpolação linear."""
+    data = sorted(values)
+    if not data:
+        return 0.0
+    pos = (len(data) - 1) * q / 100
+    low = math.floor(pos)
+    high = math.ceil(pos)
+    return data[low] + (data[high] - data[low]) * (pos - low)
+
+
+class Waiter:
+    """Aguarda condições concretas da interface em vez de pausas fixas.
+
+    Cada chamada de :meth:`until` consulta a condição com intervalo crescente
+    (backoff) até ela ser verdadeira ou o tempo da etapa esgotar. As latências
+    observadas são gravadas em ``stats_path`` e, na execução seguinte, o
+    primeiro intervalo de cada etapa parte de uma fração da sua mediana.
+
+    Várias sessões do Domínio (``orchestrator.py``) gravam o mesmo arquivo:
+    cada uma soma as suas latências novas às que já estão no disco e troca o
+    arquivo de uma vez, sem apagar as das outras nem deixá-lo pela metade.
+    """
+
+    def __init__(
+        self,
+        stats_path: Optional[str] = DEFAULT_STATS_PATH,
+        default_timeout: float = 30,
+        min_interval: float = 0.05,
+        max_interval: float = 1.0,
+        backoff: float = 1.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.stats_path = stats_path
+        self.default_timeout = default_timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._clock = clock
+        self._sleep = sleep
+        self.latencies: Dict[str, List[float]] = self._load()
+        # latências medidas nesta sessão e ainda não gravadas
+        self._unsaved: Dict[str, List[float]] = {}
+
+    def _load(self) -> Dict[str, List[float]]:
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return {}
+        try:
+            with open(self.stats_path, encoding="utf-8") as stats_file:
+                return {k: list(v) for k, v in json.load(stats_file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self) -> None:
+        """Grava as latências recentes de cada etapa para a próxima execução.
+
+        As latências novas são somadas às do arquivo no momento da gravação,
+        que pode ter sido atualizado por outra sessão desde o início desta.
+        """
+        if not self.stats_path:
+            return
+        data = self._load()
+        for step, values in self._unsaved.items():
+            data[step] = (data.get(step, []) + values)[-HISTORY_SIZE:]
+        with tempfile.NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            delete=False,
+            dir=os.path.dirname(os.path.abspath(self.stats_path)),
+            suffix=".tmp",
+        ) as stats_file:
+            json.dump(data, stats_file, indent=2)
+        os.replace(stats_file.name, self.stats_path)
+        self.latencies = data
+        self._unsaved = {}
+
+    def percentiles(self, step: str) -> Dict[str, float]:
+        values = self.latencies.get(step, [])
+        return {
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "n": len(values),
+        }
+
+    def _initial_interval(self, step: str) -> float:
+        values = self.latencies.get(step)
+        if not values:
+            return self.min_interval
+        # começa consultando a uma fração da mediana conhecida da etapa
+        interval = percentile(values[-HISTORY_SIZE:], 50) / 4
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def until(
+        self,
+        step: str,
+        condition: Callable[[], object],
+        timeout: Optional[float] = None,
+    ) -> object:
+        """Aguarda ``condition()`` retornar um valor verdadeiro e o devolve.
+
+        Exceções levantadas pela condição contam como "ainda não pronto".
+        """
+        if timeout is None:
+            timeout = STEP_TIMEOUTS.get(step, self.default_timeout)
+        interval = self._initial_interval(step)
+        start = self._clock()
+        while True:
+            try:
+                value = condition()
+            except Exception:
+                value = None
+            elapsed = self._clock() - start
+            if value:
+                self.latencies.setdefault(step, []).append(round(elapsed, 4))
+                self._unsaved.setdefault(step, []).append(round(elapsed, 4))
+                return value
+            if elapsed >= timeout:
+                raise WaitTimeout(f"Tempo esgotado aguardando {step} ({timeout:g}s)")
+            self._sleep(min(interval, timeout - elapsed))
+            interval = min(interval * self.backoff, self.max_interval)
+
+
+# ----------------------------------------------------------------------
+# Condições de prontidão da interface (pywinauto)
+# ----------------------------------------------------------------------
+def window_closed(app, handle: int) -> Callable[[], bool]:
+    """A janela com o ``handle`` informado deixou de existir."""
+
+    def _check() -> bool:
+        return all(w.handle != handle for w in app.windows())
+
+    return _check
+
+
+def dialog_opened(app, previous_handle: int) -> Callable[[], object]:
+    """Uma nova janela passou a ser a janela ativa do aplicativo."""
+
+    def _check():
+        top = app.top_window()
+        return top if top.handle != previous_handle and top.is_enabled() else None
+
+    return _check
+
+
+def app_idle(app, cpu_threshold: float = 5.0) -> Callable[[], object]:
+    """Janela ativa habilitada e processo do aplicativo sem uso relevante de CPU."""
+
+    def _check():
+        top = app.top_window()
+        if not (top.is_visible() and top.is_enabled()):
+            return None
+        return top if app.cpu_usage(interval=0.1) < cpu_threshold else None
+
+    return _check